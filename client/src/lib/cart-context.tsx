@@ -10,6 +10,7 @@ import { getDecryptedProductList } from "@/lib/utils";
 import {
   useCartViewQuery,
   useCartPostMutation,
+  useCartSyncMutation,
   useCartDeleteMutation,
   useCartUpdateMutation,
 } from "@/lib/store/Service/api";
@@ -55,6 +56,8 @@ export const CartProvider: React.FC<{ children: React.ReactNode }> = ({
   const [postCartItem, { isLoading: postLoading }] = useCartPostMutation();
   const [deleteCart, { isLoading: deleteLoading }] = useCartDeleteMutation();
   const [updateCart, { isLoading: updateLoading }] = useCartUpdateMutation();
+  const [syncCart] = useCartSyncMutation();
+  const guestCartMerged = useRef(false);
   const { data: serverCart }: { data?: CartProduct[] } = useCartViewQuery(
     { token: accessToken },
     { skip: !status }
@@ -68,9 +71,23 @@ export const CartProvider: React.FC<{ children: React.ReactNode }> = ({
     }
   }, [status, serverCart]);
 
-  const [loading, setLoading] = useState(false);
+  // Carry the guest cart over at login with one merge request
+  useEffect(() => {
+    if (!status || !accessToken || guestCartMerged.current) return;
+    guestCartMerged.current = true;
+    const guestCart = getDecryptedProductList();
+    if (guestCart.length === 0) return;
+    syncCart({
+      actualData: { items: guestCart, mode: "merge" },
+      token: accessToken,
+    }).then((res) => {
+      if ("data" in res) {
+        localStorage.removeItem("cart-items");
+      }
+    });
+  }, [status, accessToken, syncCart]);
 
-  // Removed merging logic and compareCartData
+  const [loading, setLoading] = useState(false);
 
   const HandleAction = async ({
     action,
@@ -509,6 +509,16 @@ export const userAuthapi = createApi({
       invalidatesTags: ["Cart"],
     }),
 
+    cartSync: builder.mutation({
+      query: ({ actualData, token }) => ({
+        url: `api/products/cart/sync/`,
+        method: "POST",
+        body: actualData,
+        headers: createHeaders(token),
+      }),
+      invalidatesTags: ["Cart"],
+    }),
+
     cartUpdate: builder.mutation({
       query: ({ actualData, token }) => ({
         url: `api/products/cart/12/`,
@@ -1291,6 +1301,7 @@ export const {
   // Cart
   useCartViewQuery,
   useCartPostMutation,
+  useCartSyncMutation,
   useCartUpdateMutation,
   useCartDeleteMutation,
   useClearCartMutation,
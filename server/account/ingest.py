@@ -0,0 +1,181 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import SearchHistory
+from .trending import normalize_keyword, record_keyword
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, f"SEARCH_HISTORY_{name}", default)
+
+
+class SearchEventBuffer:
+    """
+    Per-worker queue of search events written to SearchHistory in batches.
+
+    ``add`` only appends to memory. A background thread flushes the queue
+    with one bulk INSERT every FLUSH_INTERVAL seconds, or as soon as
+    FLUSH_SIZE events are waiting, and folds the same events into the
+    keyword trend counters. Every TRIM_INTERVAL seconds it trims the users
+    it wrote for down to SearchHistory.PER_USER_LIMIT rows with one
+    set-based DELETE. The queue holds at most MAX_QUEUE events; past that
+    the oldest are dropped and counted. Whatever is left is flushed when
+    the process exits.
+    """
+
+    def __init__(self):
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.touched_users = set()
+        self.next_trim = 0
+        self.stats = Counter()
+        self.last_flush_at = None
+
+    def add(self, user_id, keyword, when=None):
+        with self.lock:
+            if len(self.events) >= _setting("MAX_QUEUE", 10000):
+                self.events.popleft()
+                self.stats["dropped"] += 1
+            self.events.append((user_id, keyword, when or timezone.now()))
+            self.stats["enqueued"] += 1
+            depth = len(self.events)
+            if self.thread is None:
+                self._start()
+        if depth >= _setting("FLUSH_SIZE", 100):
+            self.wake.set()
+
+    def _start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="search-history-flush", daemon=True
+        )
+        self.thread.start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(_setting("FLUSH_INTERVAL", 5))
+            self.wake.clear()
+            if self.stopping.is_set():
+                break
+            try:
+                self.flush()
+            finally:
+                # This thread's connections would otherwise stay open
+                connections.close_all()
+
+    def shutdown(self):
+        self.stopping.set()
+        self.wake.set()
+        self.flush(trim=True)
+
+    def flush(self, trim=False):
+        """Write every queued event; return how many were written."""
+        with self.flush_lock:
+            with self.lock:
+                batch = list(self.events)
+                self.events.clear()
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception:
+                    logger.exception("Search history flush failed")
+                    self.stats["flush_errors"] += 1
+                    self._requeue(batch)
+                    return 0
+            if trim or time.monotonic() >= self.next_trim:
+                try:
+                    self._trim()
+                except Exception:
+                    logger.exception("Search history trim failed")
+            return len(batch)
+
+    @transaction.atomic
+    def _write(self, batch):
+        # All or nothing, so a failed batch can be queued again as is
+        SearchHistory.objects.bulk_create(
+            [
+                SearchHistory(user_id=user_id, keyword=keyword, search_date=when)
+                for user_id, keyword, when in batch
+            ]
+        )
+        trends = {}
+        for _, keyword, when in batch:
+            key = (timezone.localdate(when), normalize_keyword(keyword))
+            trends.setdefault(key, [when, 0])[1] += 1
+        for (_, keyword), (when, count) in trends.items():
+            record_keyword(keyword, when=when, count=count)
+        self.touched_users.update(user_id for user_id, _, _ in batch)
+        self.stats["flushed"] += len(batch)
+        self.stats["flushes"] += 1
+        self.last_flush_at = timezone.now().isoformat()
+
+    def _requeue(self, batch):
+        with self.lock:
+            room = _setting("MAX_QUEUE", 10000) - len(self.events)
+            kept = batch[-room:] if room > 0 else []
+            self.stats["dropped"] += len(batch) - len(kept)
+            self.events.extendleft(reversed(kept))
+
+    def _trim(self):
+        self.next_trim = time.monotonic() + _setting("TRIM_INTERVAL", 60)
+        users = self.touched_users
+        if not users:
+            return
+        self.touched_users = set()
+        scope = Q(user_id__in=[user_id for user_id in users if user_id is not None])
+        if None in users:
+            scope |= Q(user__isnull=True)
+        # Anonymous searches share one NULL partition, as in SearchHistory.save
+        excess = (
+            SearchHistory.objects.filter(scope)
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=[F("user_id")],
+                    order_by=[F("search_date").desc(), F("id").desc()],
+                )
+            )
+            .filter(position__gt=SearchHistory.PER_USER_LIMIT)
+            .values_list("id", flat=True)
+        )
+        excess_ids = list(excess)
+        if excess_ids:
+            SearchHistory.objects.filter(id__in=excess_ids).delete()
+            self.stats["trimmed"] += len(excess_ids)
+
+    def metrics(self):
+        with self.lock:
+            depth = len(self.events)
+        return {
+            "queue_depth": depth,
+            "max_queue": _setting("MAX_QUEUE", 10000),
+            "enqueued": self.stats["enqueued"],
+            "flushed": self.stats["flushed"],
+            "flushes": self.stats["flushes"],
+            "dropped": self.stats["dropped"],
+            "flush_errors": self.stats["flush_errors"],
+            "trimmed": self.stats["trimmed"],
+            "last_flush_at": self.last_flush_at,
+        }
+
+
+search_events = SearchEventBuffer()
+
+
+def record_search(user, keyword):
+    search_events.add(user.pk if user else None, keyword)
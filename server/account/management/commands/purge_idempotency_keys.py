@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from server.utils.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete idempotency keys past IDEMPOTENCY_KEY_TTL. Run it hourly or "
+        "daily; expired keys are otherwise only replaced when reused."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency keys"))
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-16 22:58
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_trends(apps, schema_editor):
+    SearchHistory = apps.get_model('account', 'SearchHistory')
+    KeywordTrend = apps.get_model('account', 'KeywordTrend')
+    counts = Counter()
+    for keyword, search_date in SearchHistory.objects.values_list(
+        'keyword', 'search_date'
+    ).iterator():
+        keyword = re.sub(r'\s+', ' ', keyword or '').strip().casefold()[:255]
+        if keyword:
+            counts[(timezone.localdate(search_date), keyword)] += 1
+    KeywordTrend.objects.bulk_create(
+        [
+            KeywordTrend(day=day, keyword=keyword, count=count)
+            for (day, keyword), count in counts.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_alter_searchhistory_search_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordTrend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('keyword', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('error', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'count'], name='account_key_day_270e6a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'keyword'), name='unique_keyword_trend_day')],
+            },
+        ),
+        migrations.RunPython(backfill_trends, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:12
+
+from django.db import migrations
+
+
+def requeue_renditions(apps, schema_editor):
+    # Renditions stored before placeholders existed are rendered again
+    # by ``manage.py process_images``
+    User = apps.get_model('account', 'User')
+    User.objects.filter(profile_status='ready').update(
+        profile_status='pending', profile_renditions={}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0007_user_profile_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(requeue_renditions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:15
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def fill_owner(apps, schema_editor):
+    IdempotencyKey = apps.get_model('account', 'IdempotencyKey')
+    IdempotencyKey.objects.filter(user__isnull=False).update(
+        owner=Cast('user_id', models.CharField(max_length=20))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0009_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='idempotencykey',
+            name='unique_idempotency_key',
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='owner',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(fill_owner, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('scope', 'owner', 'key'), name='unique_idempotency_key'),
+        ),
+    ]
@@ -1,33 +1,17 @@
-import sys
-from io import BytesIO
-
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.core.exceptions import ValidationError
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import FileExtensionValidator
 from django.db import models
 from django.utils import timezone
 from django.utils.crypto import get_random_string
-from PIL import Image
-
 
-def compress_image(image, format="PNG", quality=85):
-    image_temporary = Image.open(image)
-    image_temporary = image_temporary.convert("RGBA" if format == "PNG" else "RGB")
-    output_io_stream = BytesIO()
-    image_temporary.save(
-        output_io_stream, format=format, optimize=True, quality=quality
-    )
-    output_io_stream.seek(0)
-    image = InMemoryUploadedFile(
-        output_io_stream,
-        "ImageField",
-        "%s.%s" % (image.name.split(".")[0], format.lower()),
-        "image/%s" % format.lower(),
-        sys.getsizeof(output_io_stream),
-        None,
-    )
-    return image
+from server.utils.renditions import (
+    PENDING,
+    STATUS_CHOICES,
+    queue_renditions,
+    verify_image,
+)
 
 
 class UserManager(BaseUserManager):
@@ -68,6 +52,10 @@ class User(AbstractBaseUser):
         blank=True,
         validators=[FileExtensionValidator(allowed_extensions=["jpg", "jpeg", "png"])],
     )
+    profile_status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    profile_renditions = models.JSONField(default=dict, blank=True)
     dob = models.CharField(max_length=10, null=True, blank=True)
     gender = models.CharField(max_length=10, null=True, blank=True)
     role = models.CharField(
@@ -103,12 +91,16 @@ class User(AbstractBaseUser):
                 if not User.objects.filter(username=potential_username).exists():
                     self.username = potential_username
                     break
-        # Only compress when a new image file is being uploaded, not on every save.
+        # Only process when a new image file is being uploaded, not on every save.
         # _committed is False when a new file has been assigned but not yet saved to storage.
-        if self.profile and not self.profile._committed:
-            format = "PNG" if self.profile.name.lower().endswith("png") else "JPEG"
-            self.profile = compress_image(self.profile, format=format, quality=85)
+        uploaded = bool(self.profile) and not self.profile._committed
+        if uploaded:
+            verify_image(self.profile)
+            self.profile_status = PENDING
+            self.profile_renditions = {}
         super(User, self).save(*args, **kwargs)
+        if uploaded:
+            queue_renditions(self, "profile")
 
     class Meta:
         indexes = [
@@ -175,6 +167,9 @@ class DeliveryAddress(models.Model):
 
 
 class SearchHistory(models.Model):
+    # Rows kept per user; anonymous searches share one allowance
+    PER_USER_LIMIT = 25
+
     user = models.ForeignKey(
         User,
         related_name="search_history",
@@ -183,21 +178,45 @@ class SearchHistory(models.Model):
         blank=True,
     )
     keyword = models.CharField(max_length=255)
-    search_date = models.DateTimeField(default=timezone.now)
+    search_date = models.DateTimeField(default=timezone.now, db_index=True)
 
     def __str__(self):
         return f"{self.user.email if self.user else 'No User'} - {self.keyword}"
 
     def save(self, *args, **kwargs):
         user_search_history = SearchHistory.objects.filter(user=self.user)
-        if user_search_history.count() >= 25:
+        if user_search_history.count() >= self.PER_USER_LIMIT:
             oldest_entries = user_search_history.order_by("search_date")[
-                : user_search_history.count() - 24
+                : user_search_history.count() - (self.PER_USER_LIMIT - 1)
             ]
             oldest_entries.delete()
         super().save(*args, **kwargs)
 
 
+class KeywordTrend(models.Model):
+    """
+    Daily Space-Saving counters of normalized search keywords, kept by
+    account.trending. Each day holds at most TRENDING_KEYWORD_SLOTS rows;
+    ``error`` is the most ``count`` can overstate the real number.
+    """
+
+    day = models.DateField()
+    keyword = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+    error = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "keyword"], name="unique_keyword_trend_day"
+            )
+        ]
+        indexes = [models.Index(fields=["day", "count"])]
+
+    def __str__(self):
+        return f"{self.day} - {self.keyword} ({self.count})"
+
+
 class UserDevice(models.Model):
     user = models.ForeignKey(User, related_name="devices", on_delete=models.CASCADE)
     device_type = models.CharField(max_length=50)
@@ -232,3 +251,34 @@ class NewLetter(models.Model):
 
     def __str__(self):
         return self.email
+
+
+class IdempotencyKey(models.Model):
+    """
+    First response to a POST sent with an ``Idempotency-Key``, replayed for
+    retries of the same request until ``expires_at``. A row without a
+    ``response_status`` is a request still being processed. Keys are
+    unique per ``owner``, the user's pk (empty for anonymous requests), so
+    one user's key never collides with another's. Written by
+    server.utils.idempotency.
+    """
+
+    scope = models.CharField(max_length=64)
+    owner = models.CharField(max_length=20, blank=True, default="")
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "owner", "key"], name="unique_idempotency_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.scope} - {self.key}"
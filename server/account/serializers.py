@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import *
+from server.utils.renditions import rendition_set
 
 class NewsLetterSerializer(serializers.ModelSerializer):
     class Meta:
@@ -36,12 +37,19 @@ class UserDataSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class UserDetailSerializer(serializers.ModelSerializer):
+    profile_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = [
             'id','email', 'profile', 'username', 
-            'last_name', 'first_name', 'role', 'gender', 'dob'
+            'last_name', 'first_name', 'role', 'gender', 'dob',
+            'profile_status', 'profile_renditions'
         ]
+        read_only_fields = ['profile_status']
+
+    def get_profile_renditions(self, obj):
+        return rendition_set(obj.profile_renditions, self.context.get('request'))
         
 class SocialLoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
@@ -65,6 +73,7 @@ class UserChangePasswordSerializer(serializers.Serializer):
 
 class AdminUserDataSerializer(serializers.ModelSerializer):
     profile = serializers.SerializerMethodField()
+    profile_renditions = serializers.SerializerMethodField()
     provider = serializers.SerializerMethodField()  # Add this line
 
     class Meta:
@@ -75,6 +84,8 @@ class AdminUserDataSerializer(serializers.ModelSerializer):
         if obj.profile and hasattr(obj.profile, 'url'):
             return request.build_absolute_uri(obj.profile.url)
         return None
+    def get_profile_renditions(self, obj):
+        return rendition_set(obj.profile_renditions, self.context.get('request'))
     def get_provider(self, obj):  # Add this method
         return obj.account.provider if hasattr(obj, 'account') else None
 
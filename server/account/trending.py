@@ -0,0 +1,94 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import KeywordTrend
+
+TOP_KEYWORDS_PREFIX = "trending:keywords:"
+
+
+def _slots():
+    return getattr(settings, "TRENDING_KEYWORD_SLOTS", 500)
+
+
+def _retention_days():
+    return getattr(settings, "TRENDING_KEYWORD_RETENTION_DAYS", 90)
+
+
+def _top_keywords_ttl():
+    return getattr(settings, "TRENDING_KEYWORD_CACHE_TTL", 60)
+
+
+def normalize_keyword(keyword):
+    """Case- and whitespace-folded form keywords are counted under."""
+    return re.sub(r"\s+", " ", keyword or "").strip().casefold()[:255]
+
+
+def record_keyword(keyword, when=None, count=1):
+    """
+    Count ``count`` searches for ``keyword`` in the day bucket of ``when``.
+
+    Known keywords are a single UPDATE. A new keyword gets its own row
+    while the day has free slots; after that it takes over the day's
+    smallest counter, as in Space-Saving, so a bucket never grows past
+    TRENDING_KEYWORD_SLOTS rows however many distinct keywords come in.
+    """
+    keyword = normalize_keyword(keyword)
+    if not keyword:
+        return
+    day = timezone.localdate(when)
+    bucket = KeywordTrend.objects.filter(day=day)
+    if bucket.filter(keyword=keyword).update(count=F("count") + count):
+        return
+
+    try:
+        with transaction.atomic():
+            used = bucket.count()
+            if used == 0:
+                # First keyword of the day; drop buckets past retention
+                KeywordTrend.objects.filter(
+                    day__lt=day - timezone.timedelta(days=_retention_days())
+                ).delete()
+            if used < _slots():
+                KeywordTrend.objects.create(day=day, keyword=keyword, count=count)
+                return
+            smallest = bucket.select_for_update().order_by("count", "id").first()
+            smallest.keyword = keyword
+            smallest.error = smallest.count
+            smallest.count += count
+            smallest.save(update_fields=["keyword", "count", "error"])
+    except IntegrityError:
+        # Another request added the keyword first
+        bucket.filter(keyword=keyword).update(count=F("count") + count)
+
+
+def top_keywords(days, limit, fallback=False):
+    """
+    The ``limit`` most searched normalized keywords over the last ``days``
+    day buckets. With ``fallback``, an empty window falls back to every
+    retained bucket. Results are cached for TRENDING_KEYWORD_CACHE_TTL.
+    """
+    key = f"{TOP_KEYWORDS_PREFIX}{days}:{limit}:{int(fallback)}"
+    keywords = cache.get(key)
+    if keywords is not None:
+        return keywords
+
+    since = timezone.localdate() - timezone.timedelta(days=days)
+    keywords = _ranked(KeywordTrend.objects.filter(day__gte=since), limit)
+    if not keywords and fallback:
+        keywords = _ranked(KeywordTrend.objects.all(), limit)
+    cache.set(key, keywords, _top_keywords_ttl())
+    return keywords
+
+
+def _ranked(queryset, limit):
+    rows = (
+        queryset.values("keyword")
+        .annotate(total=Sum("count"))
+        .order_by("-total", "keyword")[:limit]
+    )
+    return [row["keyword"] for row in rows]
@@ -23,10 +23,13 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from server.utils.encryption import encrypt_response
+from server.utils.pagination import CursorOnlyPagination, CursorOptInMixin
 
 from .models import *
 from .renderers import UserRenderer
 from .serializers import *
+from .ingest import record_search, search_events
+from .trending import top_keywords
 from .utils import generate_otp, generate_token, is_otp_valid, send_email
 
 logger = logging.getLogger(__name__)
@@ -41,7 +44,7 @@ def get_tokens_for_user(user):
     }
 
 
-class CustomPagination(PageNumberPagination):
+class CustomPagination(CursorOptInMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
@@ -53,7 +56,7 @@ class CustomPagination(PageNumberPagination):
                     "next": self.get_next_link(),
                     "previous": self.get_previous_link(),
                 },
-                "count": self.page.paginator.count,
+                "count": self.get_count(),
                 "page_size": self.get_page_size(self.request),
                 "results": data,
             }
@@ -587,6 +590,7 @@ class SiteViewLogViewSet(viewsets.ModelViewSet):
     queryset = SiteViewLog.objects.all().order_by("-timestamp")
     serializer_class = SiteViewLogSerializer
     renderer_classes = [UserRenderer]
+    pagination_class = CursorOnlyPagination
 
     def get_permissions(self):
         if self.action == "create":
@@ -729,30 +733,17 @@ class SearchView(viewsets.ModelViewSet):
                 {"error": "Keyword is invalid"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        search_history = SearchHistory.objects.create(
-            user=user,
-            keyword=keyword,
-        )
+        # Buffered and written in batches by account.ingest
+        record_search(user, keyword)
+        return Response({"keyword": keyword}, status=status.HTTP_202_ACCEPTED)
 
-        serializer = self.get_serializer(search_history)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=["get"], url_path="ingest-metrics")
+    def ingest_metrics(self, request):
+        return Response(search_events.metrics(), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["get"], url_path="popular-keywords")
     def popular_keywords(self, request):
-        past_month = timezone.now() - timezone.timedelta(days=30)
-        keywords = (
-            SearchHistory.objects.filter(search_date__gte=past_month)
-            .values("keyword")
-            .annotate(count=Count("keyword"))
-            .order_by("-count")[:10]
-        )
-        if not keywords:
-            keywords = (
-                SearchHistory.objects.values("keyword")
-                .annotate(count=Count("keyword"))
-                .order_by("-count")[:10]
-            )
-        keyword_list = [entry["keyword"] for entry in keywords]
+        keyword_list = top_keywords(days=30, limit=10, fallback=True)
         return Response(keyword_list, status=status.HTTP_200_OK)
 
 
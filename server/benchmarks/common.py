@@ -0,0 +1,174 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Each script runs against a throwaway test database, created and dropped
+the way ``manage.py test`` does it, so the configured database is never
+touched. Run them from the server directory, e.g.::
+
+    python -m benchmarks.search --products 10000
+
+DJANGO_SETTINGS_MODULE defaults to server.settings; numbers are only
+meaningful on the production engine (MySQL).
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "server.settings")
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.runner import DiscoverRunner  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+BULK_SIZE = 2000
+
+
+def parser(description):
+    return argparse.ArgumentParser(description=description)
+
+
+@contextlib.contextmanager
+def test_database():
+    runner = DiscoverRunner(verbosity=0, interactive=False)
+    setup_test_environment()
+    databases = runner.setup_databases()
+    try:
+        yield
+    finally:
+        runner.teardown_databases(databases)
+        teardown_test_environment()
+
+
+def measure(func, repeat=20):
+    """Run ``func`` ``repeat`` times; returns (p50 ms, p95 ms, queries per run)."""
+    func()  # warm caches and lazy indexes
+    # The query log is a bounded deque; a full one would count nothing
+    connection.queries_log.clear()
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return statistics.median(timings), p95, len(queries) / repeat
+
+
+def report(label, p50, p95, queries):
+    print(f"{label:<40} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  {queries:6.1f} queries")
+
+
+def seed_catalog(products, variants_per_product=4, reviews_per_product=2):
+    """
+    Bulk-insert ``products`` products with variants, an image and reviews,
+    then build the summary and rating read models. Returns (user, admin).
+    """
+    from account.models import User
+    from product.models import (
+        Category,
+        Product,
+        ProductColor,
+        ProductImage,
+        ProductVariant,
+        Review,
+    )
+    from product.ratings import rebuild_ratings
+    from product.summary import refresh_product_summaries
+
+    user = User.objects.create_user("bench@example.com", "Bench", "User", "pw")
+    admin = User.objects.create_superuser("admin@example.com", "Bench", "Admin", "pw")
+    categories = Category.objects.bulk_create(
+        [Category(name=name) for name in ("Suits", "Shirts", "Coats", "Trousers")]
+    )
+    colors = ProductColor.objects.bulk_create(
+        [
+            ProductColor(color_code=code, color_name=name)
+            for code, name in (
+                ("#000000", "Black"),
+                ("#FFFFFF", "White"),
+                ("#000080", "Navy"),
+                ("#808080", "Grey"),
+            )
+        ]
+    )
+    words = ["wool", "linen", "slim", "classic", "navy", "tailored", "cotton"]
+    # Filler vocabulary so description terms are as selective as real copy
+    vocabulary = words + [f"term{n}" for n in range(2000)]
+    rng = random.Random(products)
+    sizes = ["S", "M", "L", "XL"]
+    for start in range(0, products, BULK_SIZE):
+        batch = Product.objects.bulk_create(
+            [
+                Product(
+                    product_name=f"{words[i % 7].title()} {words[(i // 7) % 7]} {i}",
+                    productslug=f"bench-product-{i}",
+                    description=" ".join(rng.choices(vocabulary, k=30)),
+                    category=categories[i % len(categories)],
+                )
+                for i in range(start, min(start + BULK_SIZE, products))
+            ]
+        )
+        ProductVariant.objects.bulk_create(
+            [
+                ProductVariant(
+                    product=product,
+                    color=colors[j % len(colors)],
+                    color_code=colors[j % len(colors)].color_code,
+                    color_name=colors[j % len(colors)].color_name,
+                    size=sizes[j % len(sizes)],
+                    price=50 + product.pk % 200 + j,
+                    stock=(product.pk + j) % 9,
+                )
+                for product in batch
+                for j in range(variants_per_product)
+            ]
+        )
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product=product, image="product_images/bench.webp")
+                for product in batch
+            ]
+        )
+        Review.objects.bulk_create(
+            [
+                Review(
+                    product=product,
+                    user=user,
+                    rating=1 + (product.pk + r) % 5,
+                    title="Bench",
+                    content="Benchmark review",
+                    verified=True,
+                )
+                for product in batch
+                for r in range(reviews_per_product)
+            ]
+        )
+        product_ids = [product.pk for product in batch]
+        refresh_product_summaries(product_ids)
+        rebuild_ratings(product_ids)
+    return user, admin
+
+
+def api_client(user=None):
+    """Test client that passes the Origin check and authenticates ``user``."""
+    from django.conf import settings
+    from django.test import Client
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    headers = {"HTTP_ORIGIN": settings.FRONTEND_URL}
+    if user is not None:
+        token = RefreshToken.for_user(user).access_token
+        headers["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return Client(**headers)
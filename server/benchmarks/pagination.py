@@ -0,0 +1,93 @@
+"""
+Review listing latency by depth, page numbers versus ?cursor=.
+
+Fills one product with reviews, then requests a page at increasing
+depths through /api/products/reviews/<slug>/data/, once with ?page= and
+once with a cursor pointing at the same row. ``-rating`` is the
+non-unique ordering: every page of it ties on rating and relies on the
+primary key tiebreaker to seek.
+
+    python -m benchmarks.pagination --reviews 100000
+"""
+
+from base64 import b64encode
+from urllib.parse import urlencode
+
+from benchmarks.common import (
+    BULK_SIZE,
+    api_client,
+    measure,
+    parser,
+    report,
+    seed_catalog,
+    test_database,
+)
+
+PAGE_SIZE = 10
+ORDERINGS = {"": ("-id",), "rating": ("-rating", "-id")}
+
+
+def cursor_at(queryset, ordering, depth):
+    """An opaque cursor whose page starts ``depth`` rows into ``queryset``."""
+    from server.utils.pagination import KeysetPagination
+
+    row = queryset.order_by(*ordering)[depth - 1]
+    position = KeysetPagination()._get_position_from_instance(row, ordering)
+    return b64encode(urlencode({"p": position}).encode()).decode()
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0])
+    args.add_argument("--reviews", type=int, default=100000)
+    args.add_argument("--repeat", type=int, default=10)
+    options = args.parse_args()
+
+    with test_database():
+        from product.models import Product, Review
+
+        user, _ = seed_catalog(1, reviews_per_product=0)
+        product = Product.objects.get()
+        for start in range(0, options.reviews, BULK_SIZE):
+            Review.objects.bulk_create(
+                [
+                    Review(
+                        product=product,
+                        user=user,
+                        rating=1 + n % 5,
+                        title="Bench",
+                        content="Benchmark review",
+                        verified=True,
+                    )
+                    for n in range(start, min(start + BULK_SIZE, options.reviews))
+                ]
+            )
+        reviews = Review.objects.filter(product=product, verified=True)
+        client = api_client()
+        url = f"/api/products/reviews/{product.productslug}/data/"
+
+        depths = [1] + [
+            depth
+            for depth in (1000, 10000, 50000, 90000)
+            if depth < options.reviews - PAGE_SIZE
+        ]
+        for name, ordering in ORDERINGS.items():
+            label = ",".join(ordering)
+            for depth in depths:
+                page = depth // PAGE_SIZE + 1
+                cursor = cursor_at(reviews, ordering, depth) if depth > 1 else ""
+
+                def by_page():
+                    client.get(url, {"filter": name, "page": page})
+
+                def by_cursor():
+                    client.get(url, {"filter": name, "cursor": cursor})
+
+                report(f"{label} row {depth} ?page=", *measure(by_page, options.repeat))
+                report(
+                    f"{label} row {depth} ?cursor=",
+                    *measure(by_cursor, options.repeat),
+                )
+
+
+if __name__ == "__main__":
+    main()
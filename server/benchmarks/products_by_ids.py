@@ -0,0 +1,179 @@
+"""
+Cart and checkout product lookups by id, and what sparse fieldsets save.
+
+Serializes 50 products the old way, one round of variant, color and
+image queries per product, and then through the bulk-loading
+ProductByIdsSerializer. Requests the same ids through
+get_products_by_ids (the cart's default payload and ``all=true``) and
+checkout_products, then the product list in full and trimmed with
+``?profile=card`` and ``?fields=``. Reports latency, queries and
+response size.
+
+    python -m benchmarks.products_by_ids --ids 50
+"""
+
+from benchmarks.common import (
+    api_client,
+    measure,
+    parser,
+    report,
+    seed_catalog,
+    test_database,
+)
+
+
+def legacy_serializer():
+    """ProductByIdsSerializer as it was before the bulk prefetch."""
+    from rest_framework import serializers
+
+    from product.models import Product, ProductColor
+    from product.serializers import (
+        ImageDataSerializer,
+        ProductColorSerializer,
+        ProductVariantSerializer,
+    )
+
+    class LegacyProductByIdsSerializer(serializers.ModelSerializer):
+        categoryname = serializers.SerializerMethodField()
+        colors = serializers.SerializerMethodField()
+
+        class Meta:
+            model = Product
+            fields = "__all__"
+
+        def get_categoryname(self, obj):
+            return obj.category.name if obj.category else None
+
+        def get_colors(self, obj):
+            color_values = (
+                obj.productvariant_set.exclude(color_code__isnull=True)
+                .exclude(color_code="")
+                .values("color_code", "color_name")
+                .distinct()
+            )
+            colors = []
+            for color in color_values:
+                color_obj = ProductColor.objects.filter(
+                    color_code=color["color_code"]
+                ).first()
+                colors.append(
+                    {
+                        "color_code": color["color_code"],
+                        "color_name": color["color_name"],
+                        "image": ProductColorSerializer(
+                            color_obj, context=self.context
+                        ).data.get("image")
+                        if color_obj
+                        else None,
+                    }
+                )
+            return colors
+
+        def to_representation(self, instance):
+            representation = super().to_representation(instance)
+            variants_data = ProductVariantSerializer(
+                instance.productvariant_set.all(), many=True
+            ).data
+            if len(variants_data) == 1:
+                representation["variants"] = variants_data[0]
+            else:
+                representation["variants"] = variants_data
+            representation["images"] = ImageDataSerializer(
+                instance.images.first(), context=self.context
+            ).data
+            return representation
+
+    return LegacyProductByIdsSerializer
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0])
+    args.add_argument("--products", type=int, default=1000)
+    args.add_argument("--ids", type=int, default=50)
+    args.add_argument("--repeat", type=int, default=20)
+    options = args.parse_args()
+
+    with test_database():
+        from product.models import Product
+
+        user, _ = seed_catalog(options.products)
+        ids = list(
+            Product.objects.order_by("?").values_list("id", flat=True)[: options.ids]
+        )
+
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+
+        from product.serializers import ProductByIdsSerializer
+
+        request = Request(APIRequestFactory().get("/"))
+        context = {"request": request, "is_detail": False}
+        for label, serializer_class in (
+            ("before: per-product queries", legacy_serializer()),
+            ("after: bulk prefetch", ProductByIdsSerializer),
+        ):
+
+            def serialize():
+                products = Product.objects.filter(id__in=ids)
+                return serializer_class(products, many=True, context=context).data
+
+            report(
+                f"by ids, {label}",
+                *measure(serialize, options.repeat),
+            )
+
+        ids = ",".join(map(str, ids))
+        page_size = options.ids
+        anonymous = api_client()
+        signed_in = api_client(user)
+
+        requests = [
+            (
+                f"by ids, {options.ids} ids",
+                anonymous,
+                "/api/products/products/get_products_by_ids/",
+                {"ids": ids, "page_size": page_size},
+            ),
+            (
+                f"by ids, {options.ids} ids, all=true",
+                anonymous,
+                "/api/products/products/get_products_by_ids/",
+                {"ids": ids, "page_size": page_size, "all": "true"},
+            ),
+            (
+                f"checkout, {options.ids} ids",
+                signed_in,
+                "/api/products/products/checkout_products/",
+                {"ids": ids, "page_size": page_size},
+            ),
+            (
+                f"list, {page_size} per page",
+                anonymous,
+                "/api/products/products/",
+                {"page_size": page_size},
+            ),
+            (
+                "list, ?profile=card",
+                anonymous,
+                "/api/products/products/",
+                {"page_size": page_size, "profile": "card"},
+            ),
+            (
+                "list, ?fields=id,product_name",
+                anonymous,
+                "/api/products/products/",
+                {"page_size": page_size, "fields": "id,product_name"},
+            ),
+        ]
+        for label, client, url, params in requests:
+            response = client.get(url, params)
+            assert response.status_code == 200, (label, response.status_code)
+            size = len(response.content) / 1024
+            report(
+                f"{label}, {size:.0f} KB",
+                *measure(lambda: client.get(url, params), options.repeat),
+            )
+
+
+if __name__ == "__main__":
+    main()
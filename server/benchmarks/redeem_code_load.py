@@ -0,0 +1,116 @@
+"""
+Checkout throughput with one hot redeem code versus none.
+
+Several threads place orders through the API at once, first without a
+code and then all with the same code, and the script reports orders per
+second and latency for each run. With the sharded counters the two should
+be close; a single ``used += 1`` row would serialize the second run.
+SQLite locks the whole database on write, so only ``--threads 1`` runs
+cleanly there.
+
+    python -m benchmarks.redeem_code_load --threads 16 --orders 50
+"""
+
+import json
+import statistics
+import threading
+import time
+import uuid
+
+from benchmarks.common import api_client, parser, seed_catalog, test_database
+
+
+def place_orders(user, address, variants, code, threads, orders):
+    from django.db import OperationalError, connection
+
+    timings = []
+    failed = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        client = api_client(user)
+        for n in range(orders):
+            variant = variants[(offset + n) % len(variants)]
+            payload = {
+                "products": [
+                    {"product": variant.product_id, "variant": variant.pk, "pcs": 1}
+                ],
+                "sub_total": 100,
+                "total_amt": 100,
+                "transactionuid": uuid.uuid4().hex,
+                "shipping": address.pk,
+                "payment_method": "COD",
+            }
+            if code is not None:
+                payload["redeemData"] = {"id": code.pk}
+            start = time.perf_counter()
+            try:
+                response = client.post(
+                    "/api/sales/sales/",
+                    json.dumps(payload),
+                    content_type="application/json",
+                )
+                ok = response.status_code == 201
+            except OperationalError:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                (timings if ok else failed).append(elapsed)
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - start
+    return timings, len(failed), wall
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0])
+    args.add_argument("--threads", type=int, default=16)
+    args.add_argument("--orders", type=int, default=50, help="orders per thread")
+    args.add_argument("--products", type=int, default=200)
+    options = args.parse_args()
+
+    with test_database():
+        from django.utils import timezone
+
+        from account.models import DeliveryAddress
+        from product.models import ProductVariant
+        from sales.models import Redeem_Code
+
+        user, _ = seed_catalog(options.products)
+        ProductVariant.objects.update(stock=10**6)
+        variants = list(ProductVariant.objects.order_by("pk"))
+        address = DeliveryAddress.objects.create(
+            user=user, address="Bench", country="NP", city="Kathmandu", zipcode="1"
+        )
+        code = Redeem_Code.objects.create(
+            name="Bench",
+            code="BENCH",
+            type="amount",
+            discount=1,
+            minimum=0,
+            limit=None,
+            valid_until=timezone.now().date() + timezone.timedelta(days=30),
+            is_active=True,
+        )
+
+        for label, used in (("no code", None), ("one hot code", code)):
+            timings, failed, wall = place_orders(
+                user, address, variants, used, options.threads, options.orders
+            )
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95)] if timings else 0
+            print(
+                f"{label:<14} {len(timings) / wall:8.1f} orders/s  "
+                f"p50 {statistics.median(timings) if timings else 0:8.2f} ms  "
+                f"p95 {p95:8.2f} ms  {failed} failed"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+?search= latency and query count, before and after the BM25 index.
+
+"before" runs the listing's old filter, ``product_name__icontains |
+description__icontains``, as a page of 20 with its COUNT. "after" runs
+the same page over the ids the index ranks, then the whole API request.
+
+    python -m benchmarks.search --products 10000
+    python -m benchmarks.search --products 100000
+"""
+
+import os
+import tempfile
+
+from benchmarks.common import (
+    api_client,
+    measure,
+    parser,
+    report,
+    seed_catalog,
+    test_database,
+)
+
+QUERIES = ["wool", "navy classic", "tailored cotton", "slim 4242", "term17 term1800"]
+PAGE_SIZE = 20
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0])
+    args.add_argument("--products", type=int, default=10000)
+    args.add_argument("--repeat", type=int, default=20)
+    options = args.parse_args()
+
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        from django.db.models import Q
+        from django.test import override_settings
+
+        from product.models import Product
+        from product.search import rebuild_search_index, search_products
+
+        seed_catalog(options.products)
+        index_path = os.path.join(directory, "search_index.bin")
+        with override_settings(SEARCH_INDEX_PATH=index_path):
+            documents = rebuild_search_index()
+            print(
+                f"{options.products} products, {documents} indexed, "
+                f"{os.path.getsize(index_path) / 1e6:.1f} MB index file"
+            )
+            client = api_client()
+            for query in QUERIES:
+
+                def before():
+                    matches = Product.objects.filter(
+                        Q(product_name__icontains=query)
+                        | Q(description__icontains=query)
+                    )
+                    matches.count()
+                    list(matches.values_list("id", flat=True)[:PAGE_SIZE])
+
+                def after():
+                    matches = Product.objects.filter(id__in=search_products(query))
+                    matches.count()
+                    list(matches.values_list("id", flat=True)[:PAGE_SIZE])
+
+                def request():
+                    client.get(
+                        "/api/products/products/",
+                        {"search": query, "page_size": PAGE_SIZE},
+                    )
+
+                report(f"{query!r} before", *measure(before, options.repeat))
+                report(f"{query!r} after", *measure(after, options.repeat))
+                report(f"{query!r} after, API", *measure(request, options.repeat))
+
+
+if __name__ == "__main__":
+    main()
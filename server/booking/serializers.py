@@ -1,5 +1,7 @@
 from rest_framework import serializers
 
+from server.utils.fieldsets import SparseFieldsetMixin
+
 from .models import Booking
 
 
@@ -23,7 +25,7 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         ]
 
 
-class BookingListSerializer(serializers.ModelSerializer):
+class BookingListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Lightweight serializer for list view"""
 
     has_measurements = serializers.SerializerMethodField()
@@ -47,6 +49,10 @@ class BookingListSerializer(serializers.ModelSerializer):
             "has_bill",
             "created_at",
         ]
+        field_profiles = {
+            "card": ["id", "name", "status", "preferred_date", "preferred_time"],
+            "admin": fields,
+        }
 
     def get_has_measurements(self, obj):
         return obj.has_measurements()
@@ -55,7 +61,7 @@ class BookingListSerializer(serializers.ModelSerializer):
         return bool(obj.bill_data)
 
 
-class BookingDetailSerializer(serializers.ModelSerializer):
+class BookingDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Full serializer for booking details with measurements"""
 
     has_measurements = serializers.SerializerMethodField()
@@ -99,6 +105,24 @@ class BookingDetailSerializer(serializers.ModelSerializer):
             "measurement_completed_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+        field_profiles = {
+            "detail": [
+                "id",
+                "name",
+                "email",
+                "phone_number",
+                "location",
+                "measurement_type",
+                "preferred_date",
+                "preferred_time",
+                "customer_notes",
+                "status",
+                "delivery_date",
+                "has_measurements",
+                "created_at",
+            ],
+            "admin": fields,
+        }
 
     def get_has_measurements(self, obj):
         return obj.has_measurements()
@@ -3,6 +3,7 @@ import logging
 import random
 import string
 
+from django.db import transaction
 from django.db.models import Q
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -15,6 +16,7 @@ logger = logging.getLogger(__name__)
 from rest_framework.views import APIView
 
 from account.utils import send_email
+from server.utils.idempotency import idempotent
 
 from .models import Booking
 from .serializers import (
@@ -231,14 +233,15 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    @idempotent("booking.create")
     def create(self, request, *args, **kwargs):
         """Create a new booking (public access) and send confirmation email"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         booking = serializer.save(status="pending")
 
-        # Send confirmation email
-        send_booking_confirmation_email(booking)
+        # Send confirmation email once the booking is committed
+        transaction.on_commit(lambda: send_booking_confirmation_email(booking))
 
         # Return full booking info
         response_serializer = BookingDetailSerializer(booking)
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from server.utils.cache import invalidate_tags
+
+from . import snapshots  # noqa: F401  (connects snapshot invalidation)
+from .models import Layout
+
+
+@receiver(post_save, sender=Layout)
+@receiver(post_delete, sender=Layout)
+def layout_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_tags("layout"))
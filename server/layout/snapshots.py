@@ -0,0 +1,5 @@
+from server.utils.snapshot import TableSnapshot
+
+from .models import Layout
+
+layout_snapshot = TableSnapshot(Layout, keys=("pk", "slug"))
@@ -1,8 +1,17 @@
+from django.http import Http404
 from rest_framework import viewsets
-from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    AllowAny,
+    IsAdminUser,
+    IsAuthenticated,
+)
+
+from server.utils.cache import cached_response, conditional_response, tagged_versions
 
 from .models import Layout
 from .serializers import LayoutSerializer
+from .snapshots import layout_snapshot
 
 
 class LayoutViewSet(viewsets.ModelViewSet):
@@ -20,3 +29,21 @@ class LayoutViewSet(viewsets.ModelViewSet):
         if self.action in ["list", "retrieve"]:
             return [AllowAny()]
         return [IsAuthenticated(), IsAdminUser()]
+
+    def get_object(self):
+        if self.request.method not in SAFE_METHODS:
+            return super().get_object()
+        layout = layout_snapshot.get(self.kwargs[self.lookup_field], key="slug")
+        if layout is None:
+            raise Http404("Layout not found")
+        return layout
+
+    @conditional_response(tagged_versions("layout"))
+    @cached_response(tags=["layout"])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(tagged_versions("layout"))
+    @cached_response(tags=["layout"])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
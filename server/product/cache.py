@@ -0,0 +1,104 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from server.utils.cache import invalidate_tags, tag_versions
+
+VERSION_PREFIX = "product:version:"
+SLUG_PREFIX = "product:slug:"
+DETAIL_PREFIX = "product:detail:"
+# Tag for cached responses that list products (trending and the like)
+CATALOG_TAG = "catalog"
+CATEGORY_TAG = "categories"
+# Trending also moves with search history, which is too busy to version
+TRENDING_WINDOW = 60 * 5
+
+# Query parameters that change the rendered detail payload
+DETAIL_VARY_PARAMS = ("fields", "omit", "profile")
+
+
+def _detail_ttl():
+    return getattr(settings, "PRODUCT_DETAIL_CACHE_TTL", 60 * 15)
+
+
+def _new_version():
+    # A clock-based token never repeats, so an evicted version key can't
+    # bring an older cached payload back to life.
+    return time.time_ns()
+
+
+def product_version(product_id):
+    key = f"{VERSION_PREFIX}{product_id}"
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_product_versions(product_ids):
+    """Invalidate every cached representation of ``product_ids``."""
+    version = _new_version()
+    cache.set_many(
+        {f"{VERSION_PREFIX}{product_id}": version for product_id in product_ids},
+        None,
+    )
+    invalidate_tags(CATALOG_TAG)
+
+
+def _detail_key(product_id, request):
+    vary = [request.scheme, request.get_host()]
+    vary += [request.query_params.get(param, "") for param in DETAIL_VARY_PARAMS]
+    digest = hashlib.md5("|".join(vary).encode()).hexdigest()
+    return f"{DETAIL_PREFIX}{product_id}:{product_version(product_id)}:{digest}"
+
+
+def get_cached_detail(request, productslug=None, pk=None):
+    """Return the cached detail payload for a slug or primary key, if any."""
+    if productslug is not None:
+        pk = cache.get(f"{SLUG_PREFIX}{productslug}")
+    if pk is None:
+        return None
+    entry = cache.get(_detail_key(pk, request))
+    if entry is None:
+        return None
+    slug, data = entry
+    # The slug mapping outlives a rename; the entry tells us if it still fits
+    if productslug is not None and slug != productslug:
+        return None
+    return data
+
+
+def set_cached_detail(request, instance, data):
+    ttl = _detail_ttl()
+    if instance.productslug:
+        cache.set(f"{SLUG_PREFIX}{instance.productslug}", instance.pk, ttl)
+    entry = (instance.productslug, dict(data))
+    cache.set(_detail_key(instance.pk, request), entry, ttl)
+
+
+def detail_versions(view, request, *args, **kwargs):
+    """Version tokens behind a product detail response, if known."""
+    productslug = request.query_params.get("productslug")
+    if productslug:
+        pk = cache.get(f"{SLUG_PREFIX}{productslug}")
+    else:
+        pk = kwargs.get(view.lookup_field)
+    if pk is None:
+        return None
+    return [product_version(pk)]
+
+
+def catalog_versions(view, request, *args, **kwargs):
+    if request.query_params.get("productslug"):
+        return detail_versions(view, request, *args, **kwargs)
+    return list(tag_versions([CATALOG_TAG]).values())
+
+
+def trending_versions(view, request, *args, **kwargs):
+    window = TRENDING_WINDOW * 1_000_000_000
+    catalog = tag_versions([CATALOG_TAG])[CATALOG_TAG]
+    return [catalog, time.time_ns() // window * window]
@@ -0,0 +1,156 @@
+from django.db import connection, transaction
+
+from account.models import User
+
+from .models import Cart, ProductVariant
+
+SET = "set"
+MERGE = "merge"
+REPLACE = "replace"
+MODES = (SET, MERGE, REPLACE)
+
+
+class CartSyncError(Exception):
+    pass
+
+
+def _lines(items):
+    """
+    ``{variant_id: (product_id, pcs)}`` in first-seen order, adding up
+    lines that repeat a variant. Takes the cart's ``product``/``variant``
+    keys or the older ``id``/``variantId`` ones.
+    """
+    lines = {}
+    for item in items:
+        try:
+            variant_id = int(item.get("variant", item.get("variantId")))
+            product_id = int(item.get("product", item.get("id")))
+            pcs = int(item.get("pcs", 1))
+        except (AttributeError, TypeError, ValueError):
+            raise CartSyncError("Every item needs a product, a variant and pcs.")
+        if pcs < 0:
+            raise CartSyncError("Quantities can't be negative.")
+        previous = lines.get(variant_id, (product_id, 0))[1]
+        lines[variant_id] = (product_id, previous + pcs)
+    return lines
+
+
+def sync_cart(user, items, mode=SET):
+    """
+    Bring ``user``'s cart in line with ``items`` in a fixed number of
+    queries, however many lines there are: one to load the variants, two
+    to lock the user and read their current lines, one bulk
+    insert-or-update on the (user, variant) key and one delete.
+
+    ``set`` makes each listed line hold the given pcs (0 removes it),
+    ``merge`` adds them to what is already in the cart (a guest cart
+    carried over at login) and ``replace`` also drops every line that
+    isn't listed. Quantities are capped at the variant's available
+    stock. Returns one entry per line with its ``status``: added,
+    updated, unchanged, removed, out_of_stock or not_found; ``limited``
+    is set when fewer pcs than asked for were kept.
+    """
+    if mode not in MODES:
+        raise CartSyncError(f"mode must be one of {', '.join(MODES)}.")
+    lines = _lines(items)
+
+    variants = {
+        pk: (product_id, max(stock - held, 0), deactive)
+        for pk, product_id, stock, held, deactive in ProductVariant.objects.filter(
+            pk__in=lines
+        ).values_list("pk", "product_id", "stock", "held", "product__deactive")
+    }
+
+    with transaction.atomic():
+        # Concurrent syncs for one user (two tabs merging at login) queue
+        # here. The user row covers lines neither of them has inserted yet
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list("pk"))
+        existing = Cart.objects.select_for_update().filter(user=user)
+        if mode != REPLACE:
+            existing = existing.filter(variant_id__in=lines)
+        current = {
+            variant_id: (product_id, pcs)
+            for variant_id, product_id, pcs in existing.filter(
+                variant__isnull=False
+            ).values_list("variant_id", "product_id", "pcs")
+        }
+        result, upserts, kept_ids, removed = _plan(
+            user, lines, variants, current, mode
+        )
+
+        if upserts:
+            upsert = {"update_conflicts": True, "update_fields": ["product", "pcs"]}
+            # MySQL upserts on any unique key and rejects an explicit target
+            if connection.features.supports_update_conflicts_with_target:
+                upsert["unique_fields"] = ["user", "variant"]
+            Cart.objects.bulk_create(upserts, **upsert)
+        if mode == REPLACE:
+            # Also clears lines whose variant has since been deleted
+            Cart.objects.filter(user=user).exclude(variant_id__in=kept_ids).delete()
+        elif removed:
+            Cart.objects.filter(user=user, variant_id__in=removed).delete()
+    return result
+
+
+def _plan(user, lines, variants, current, mode):
+    """
+    Work out each line's new pcs and status in memory. Returns the result
+    entries, the rows to upsert, the variants kept and the ones removed.
+    """
+    result = []
+    upserts = []
+    kept_ids = set()
+    removed = []
+    for variant_id, (product_id, pcs) in lines.items():
+        entry = {"product": product_id, "variant": variant_id, "requested": pcs}
+        variant = variants.get(variant_id)
+        if variant is None or variant[0] != product_id or variant[2]:
+            result.append(dict(entry, pcs=0, available=0, status="not_found"))
+            continue
+        available = variant[1]
+        had = current.get(variant_id, (None, None))[1]
+        wanted = pcs + (had or 0) if mode == MERGE else pcs
+        entry["requested"] = wanted
+        kept = min(wanted, available)
+        if wanted and not kept:
+            status = "out_of_stock"
+            kept = had or 0
+        elif not kept:
+            status = "removed" if had else "unchanged"
+            if had:
+                removed.append(variant_id)
+        elif had is None:
+            status = "added"
+        else:
+            status = "updated" if kept != had else "unchanged"
+        if kept:
+            kept_ids.add(variant_id)
+        if kept and kept != had:
+            upserts.append(
+                Cart(user=user, product_id=product_id, variant_id=variant_id, pcs=kept)
+            )
+        result.append(
+            dict(
+                entry,
+                pcs=kept,
+                available=available,
+                status=status,
+                limited=kept < wanted,
+            )
+        )
+    if mode == REPLACE:
+        for variant_id, (product_id, _) in current.items():
+            if variant_id not in lines:
+                result.append(
+                    {
+                        "product": product_id,
+                        "variant": variant_id,
+                        "requested": 0,
+                        "pcs": 0,
+                        "available": None,
+                        "status": "removed",
+                        "limited": False,
+                    }
+                )
+
+    return result, upserts, kept_ids, removed
@@ -0,0 +1,496 @@
+import csv
+import io
+import json
+import random
+import re
+import string
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.text import slugify
+
+from server.utils.cache import invalidate_tags
+
+from .cache import CATEGORY_TAG
+from .models import Category, Product, ProductColor, ProductVariant
+from .signals import (
+    facet_batch,
+    search_batch,
+    suggest_batch,
+    summary_batch,
+    version_batch,
+)
+from .snapshots import category_snapshot, color_snapshot
+from .suggest import publish_changes
+from .utils import generate_slug
+
+# One row per variant; product columns repeat on every row of a product
+COLUMNS = [
+    "productslug",
+    "product_name",
+    "description",
+    "category",
+    "deactive",
+    "color_code",
+    "color_name",
+    "size",
+    "price",
+    "discount",
+    "stock",
+]
+PRODUCT_FIELDS = ["product_name", "description", "category", "deactive"]
+VARIANT_FIELDS = ["color", "color_name", "price", "discount", "stock"]
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+COLOR_CODE = re.compile(r"^#[0-9A-F]{6}$")
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+SLUG_CHARS = string.ascii_letters + string.digits + "-_"
+
+
+def catalog_format(requested=None, filename=""):
+    """``csv`` or ``jsonl`` from an explicit choice or the file extension."""
+    file_format = (requested or filename.rsplit(".", 1)[-1]).lower()
+    if file_format in ("ndjson", "json"):
+        file_format = "jsonl"
+    return file_format if file_format in FORMATS else None
+
+
+def read_rows(fh, file_format):
+    """Yield ``(line, row)`` from a text stream; ``row`` is None if unreadable."""
+    if file_format == "csv":
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line, text in enumerate(fh, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError:
+            row = None
+        yield line, row if isinstance(row, dict) else None
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return value.strip() if isinstance(value, str) else str(value)
+
+
+def _normalize_color(value):
+    value = value.strip().upper()
+    return value if value.startswith("#") else f"#{value}"
+
+
+def clean_row(row):
+    """
+    Validate one row the way ProductVariant.clean and the variant
+    serializer would, without touching the database.
+    Returns ``(cleaned, errors)``.
+    """
+    if row is None:
+        return None, {"row": "Could not parse this row."}
+    value = {name: _text(row.get(name)) for name in COLUMNS}
+    errors = {}
+    cleaned = {
+        "productslug": value["productslug"] or None,
+        "product_name": value["product_name"],
+        "description": value["description"],
+        "category": value["category"] or None,
+        "deactive": None,
+        "color_code": None,
+        "color_name": value["color_name"] or None,
+        "size": value["size"] or None,
+        "discount": None,
+    }
+    if not cleaned["productslug"] and not cleaned["product_name"]:
+        errors["productslug"] = "Provide a productslug or a product_name."
+    if cleaned["productslug"] and len(cleaned["productslug"]) > 100:
+        errors["productslug"] = "Ensure this field has no more than 100 characters."
+    if len(cleaned["product_name"]) > 255:
+        errors["product_name"] = "Ensure this field has no more than 255 characters."
+    if cleaned["category"] and len(cleaned["category"]) > 255:
+        errors["category"] = "Ensure this field has no more than 255 characters."
+
+    deactive = value["deactive"].lower()
+    if deactive in TRUE_VALUES:
+        cleaned["deactive"] = True
+    elif deactive in FALSE_VALUES:
+        cleaned["deactive"] = False
+    elif deactive:
+        errors["deactive"] = "Must be true or false."
+
+    if value["color_code"]:
+        cleaned["color_code"] = _normalize_color(value["color_code"])
+        if not COLOR_CODE.match(cleaned["color_code"]):
+            errors["color_code"] = "Invalid color code. Use #RRGGBB."
+    if not cleaned["color_code"] and not cleaned["size"]:
+        errors["color_code"] = "Provide a color_code or a size for the variant."
+    if cleaned["color_name"] and len(cleaned["color_name"]) > 50:
+        errors["color_name"] = "Ensure this field has no more than 50 characters."
+    if cleaned["size"] and len(cleaned["size"]) > 50:
+        errors["size"] = "Ensure this field has no more than 50 characters."
+
+    try:
+        price = Decimal(value["price"])
+        if not price.is_finite() or price < 0:
+            raise InvalidOperation
+        cleaned["price"] = price.quantize(Decimal("0.01"))
+        if len(cleaned["price"].as_tuple().digits) > 10:
+            raise InvalidOperation
+    except InvalidOperation:
+        errors["price"] = "A non-negative number with at most 10 digits is required."
+    try:
+        cleaned["stock"] = int(value["stock"])
+        if cleaned["stock"] < 0:
+            raise ValueError
+    except ValueError:
+        errors["stock"] = "A non-negative integer is required."
+    if value["discount"]:
+        try:
+            cleaned["discount"] = int(value["discount"])
+            if not 0 <= cleaned["discount"] <= 100:
+                raise ValueError
+        except ValueError:
+            errors["discount"] = "An integer between 0 and 100 is required."
+    return cleaned, errors
+
+
+def _slug_candidate(name):
+    suffix = "".join(random.choices(SLUG_CHARS, k=10))
+    return f"{slugify(name)[:20]}-{suffix}"[:35]
+
+
+def _new_slugs(names):
+    """Unique product slugs shaped like generate_unique_slug, checked in bulk."""
+    slugs = {}
+    pending = set(names)
+    while pending:
+        candidates = {name: _slug_candidate(name) for name in pending}
+        taken = set(
+            Product.objects.filter(productslug__in=candidates.values()).values_list(
+                "productslug", flat=True
+            )
+        )
+        taken.update(slugs.values())
+        for name, slug in candidates.items():
+            if slug not in taken:
+                slugs[name] = slug
+                taken.add(slug)
+                pending.discard(name)
+    return slugs
+
+
+class CatalogImport:
+    """
+    Upsert categories, products, colors and variants from catalog rows.
+
+    Rows are validated in memory and written CHUNK_SIZE at a time, each
+    chunk in one transaction with a fixed number of queries: bulk lookups
+    of what exists, then bulk_create for new rows and bulk_update for
+    changed ones. Rows are matched on productslug (or product_name for new
+    products without one), color_code and size. Blank product columns
+    leave an existing product as it is. Invalid rows are reported and
+    skipped; the rest of the chunk is still written. Bulk writes bypass
+    model signals, so the derived catalog data is refreshed explicitly.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, dry_run=False):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.stats = Counter()
+        self.errors = []
+        # product_name -> slug of products created without a slug
+        self.named_slugs = {}
+
+    def run(self, rows):
+        chunk = []
+        for line, row in rows:
+            chunk.append((line, row))
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self.report()
+
+    def report(self):
+        return {
+            "dry_run": self.dry_run,
+            **{
+                key: self.stats[key]
+                for key in (
+                    "rows",
+                    "categories_created",
+                    "colors_created",
+                    "products_created",
+                    "products_updated",
+                    "variants_created",
+                    "variants_updated",
+                    "errors",
+                )
+            },
+            "row_errors": self.errors,
+        }
+
+    def _error(self, line, errors):
+        self.stats["errors"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, "errors": errors})
+
+    def _import_chunk(self, chunk):
+        valid = []
+        for line, row in chunk:
+            self.stats["rows"] += 1
+            cleaned, errors = clean_row(row)
+            if errors:
+                self._error(line, errors)
+            else:
+                valid.append((line, cleaned))
+        if not valid:
+            return
+        with transaction.atomic():
+            self._write(valid)
+            if self.dry_run:
+                transaction.set_rollback(True)
+
+    def _product_key(self, row):
+        slug = row["productslug"] or self.named_slugs.get(row["product_name"])
+        return ("slug", slug) if slug else ("name", row["product_name"])
+
+    def _write(self, rows):
+        categories = self._categories(rows)
+
+        # First row of each product carries its product columns
+        first_rows = {}
+        for line, row in rows:
+            first_rows.setdefault(self._product_key(row), row)
+        slugs = [key[1] for key in first_rows if key[0] == "slug"]
+        products = Product.objects.in_bulk(slugs, field_name="productslug")
+
+        new_products = []
+        missing = set()
+        changed = {}
+        moved = False
+        for key, row in first_rows.items():
+            product = products.get(key[1]) if key[0] == "slug" else None
+            if product is None:
+                if not row["product_name"] or not row["description"]:
+                    missing.add(key)
+                else:
+                    new_products.append((key, row))
+                continue
+            category = categories.get(row["category"])
+            updates = {
+                "product_name": row["product_name"],
+                "description": row["description"],
+                "category_id": category.pk if category else None,
+                "deactive": row["deactive"],
+            }
+            for field, value in updates.items():
+                if value not in (None, "") and value != getattr(product, field):
+                    setattr(product, field, value)
+                    changed[product.pk] = product
+                    moved = moved or field == "category_id"
+
+        if new_products:
+            named = _new_slugs(
+                {row["product_name"] for key, row in new_products if key[0] == "name"}
+            )
+            self.named_slugs.update(named)
+            created = []
+            for key, row in new_products:
+                category = categories.get(row["category"])
+                created.append(
+                    Product(
+                        productslug=key[1] if key[0] == "slug" else named[key[1]],
+                        product_name=row["product_name"],
+                        description=row["description"],
+                        category=category,
+                        deactive=bool(row["deactive"]),
+                    )
+                )
+            Product.objects.bulk_create(created)
+            # MySQL doesn't return primary keys from bulk_create
+            products.update(
+                Product.objects.in_bulk(
+                    [product.productslug for product in created],
+                    field_name="productslug",
+                )
+            )
+            self.stats["products_created"] += len(created)
+        if changed:
+            Product.objects.bulk_update(changed.values(), PRODUCT_FIELDS)
+            self.stats["products_updated"] += len(changed)
+
+        colors = self._colors(rows)
+        product_ids = self._variants(rows, products, missing, colors)
+
+        summary_batch.add(*product_ids)
+        search_batch.add(*product_ids)
+        facet_batch.add(*product_ids)
+        version_batch.add(*product_ids)
+        suggest_batch.add(*product_ids)
+        # Category product counts feed the category listing and suggestions
+        if new_products or moved:
+            transaction.on_commit(lambda: invalidate_tags(CATEGORY_TAG))
+            transaction.on_commit(lambda: publish_changes(categories=True))
+
+    def _categories(self, rows):
+        names = {row["category"] for _, row in rows if row["category"]}
+        categories = Category.objects.in_bulk(names, field_name="name")
+        new = [
+            Category(name=name, categoryslug=generate_slug(name))
+            for name in names - categories.keys()
+        ]
+        if new:
+            Category.objects.bulk_create(new)
+            categories.update(
+                (category.name, category)
+                for category in Category.objects.filter(
+                    name__in=[category.name for category in new]
+                )
+            )
+            self.stats["categories_created"] += len(new)
+            transaction.on_commit(category_snapshot.invalidate)
+        return categories
+
+    def _colors(self, rows):
+        names = {}
+        for _, row in rows:
+            if row["color_code"]:
+                # Like _ensure_color_reference, a named row renames the color
+                if row["color_name"] or row["color_code"] not in names:
+                    names[row["color_code"]] = row["color_name"]
+        colors = ProductColor.objects.in_bulk(names.keys())
+        new = [
+            ProductColor(color_code=code, color_name=name or "Color")
+            for code, name in names.items()
+            if code not in colors
+        ]
+        renamed = []
+        for code, color in colors.items():
+            if names[code] and color.color_name != names[code]:
+                color.color_name = names[code]
+                renamed.append(color)
+        if new:
+            ProductColor.objects.bulk_create(new)
+            colors.update((color.color_code, color) for color in new)
+            self.stats["colors_created"] += len(new)
+        if renamed:
+            ProductColor.objects.bulk_update(renamed, ["color_name"])
+        if new or renamed:
+            transaction.on_commit(color_snapshot.invalidate)
+        return colors
+
+    def _variants(self, rows, products, missing, colors):
+        product_ids = {}
+        for key in {self._product_key(row) for _, row in rows}:
+            if key not in missing:
+                slug = key[1] if key[0] == "slug" else self.named_slugs[key[1]]
+                product_ids[key] = products[slug].pk
+        existing = {
+            (variant.product_id, variant.color_code, variant.size): variant
+            for variant in ProductVariant.objects.filter(
+                product_id__in=product_ids.values()
+            )
+        }
+
+        new = []
+        updated = {}
+        seen = set()
+        for line, row in rows:
+            key = self._product_key(row)
+            if key in missing:
+                self._error(
+                    line,
+                    {
+                        "product_name": "New products need a product_name and a "
+                        "description."
+                    },
+                )
+                continue
+            variant_key = (product_ids[key], row["color_code"], row["size"])
+            if variant_key in seen:
+                self._error(line, {"row": "Duplicate variant in this import."})
+                continue
+            seen.add(variant_key)
+            color = colors.get(row["color_code"])
+            values = {
+                "color": color,
+                "color_name": color.color_name if color else row["color_name"],
+                "price": row["price"],
+                "discount": row["discount"],
+                "stock": row["stock"],
+            }
+            variant = existing.get(variant_key)
+            if variant is None:
+                new.append(
+                    ProductVariant(
+                        product_id=variant_key[0],
+                        color_code=row["color_code"],
+                        size=row["size"],
+                        **values,
+                    )
+                )
+            elif any(
+                getattr(variant, field) != value for field, value in values.items()
+            ):
+                for field, value in values.items():
+                    setattr(variant, field, value)
+                updated[variant.pk] = variant
+        if new:
+            ProductVariant.objects.bulk_create(new)
+            self.stats["variants_created"] += len(new)
+        if updated:
+            ProductVariant.objects.bulk_update(updated.values(), VARIANT_FIELDS)
+            self.stats["variants_updated"] += len(updated)
+        return {variant_key[0] for variant_key in seen}
+
+
+def export_rows():
+    """Every variant with its product columns, streamed from the database."""
+    variants = ProductVariant.objects.order_by("product_id", "id").values_list(
+        "product__productslug",
+        "product__product_name",
+        "product__description",
+        "product__category__name",
+        "product__deactive",
+        "color_code",
+        "color_name",
+        "size",
+        "price",
+        "discount",
+        "stock",
+    )
+    for values in variants.iterator(chunk_size=2000):
+        yield dict(zip(COLUMNS, values))
+
+
+def export_chunks(file_format, rows=None):
+    """Encode ``rows`` (the whole catalog by default) in buffered text chunks."""
+    rows = export_rows() if rows is None else rows
+    buffer = io.StringIO()
+    writer = None
+    if file_format == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+        writer.writeheader()
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, cls=DjangoJSONEncoder))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
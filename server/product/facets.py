@@ -0,0 +1,232 @@
+import re
+import threading
+from collections import defaultdict
+
+from server.utils.cache import ChangeFeed, broadcast, invalidate_tags, tag_versions
+
+from .cache import CATALOG_TAG
+
+TAG_RE = re.compile(r"#([\w-]+)")
+
+FACETS = ("category", "color", "size", "tag", "stock")
+# Change feed channel carrying the ids of products to re-read
+CHANNEL = "facets"
+
+
+def normalize_color(value):
+    normalized = value.strip().upper()
+    if not normalized.startswith("#") and len(normalized) in (3, 6):
+        normalized = f"#{normalized}"
+    return normalized
+
+
+def bitmap_ids(bitmap):
+    """Expand an int bitmap into the sorted list of set bit positions."""
+    bits = bin(bitmap)[:1:-1]  # least significant bit first
+    ids = []
+    position = bits.find("1")
+    while position != -1:
+        ids.append(position)
+        position = bits.find("1", position + 1)
+    return ids
+
+
+def ids_bitmap(ids):
+    bitmap = 0
+    for pk in ids:
+        bitmap |= 1 << pk
+    return bitmap
+
+
+class FacetIndex:
+    """
+    Product ids per facet value stored as int bitmaps (bit N = product id N).
+    Selections are OR-ed within a facet and AND-ed across facets; counts
+    for a facet ignore that facet's own selection so a sidebar can show
+    how many products each alternative would match.
+    """
+
+    def __init__(self):
+        self.bitmaps = {facet: defaultdict(int) for facet in FACETS}
+        self.color_names = defaultdict(set)  # lower-case name -> color codes
+        self.labels = {}  # (facet, value) -> display label
+        self.active = 0
+        self.all = 0
+        self.product_values = {}  # product_id -> [(facet, value), ...]
+
+    def add(self, product_id, active, values):
+        self.remove(product_id)
+        bit = 1 << product_id
+        self.all |= bit
+        if active:
+            self.active |= bit
+        keys = []
+        for facet, value, label in values:
+            self.bitmaps[facet][value] |= bit
+            self.labels.setdefault((facet, value), label)
+            if facet == "color" and label:
+                self.color_names[label.lower()].add(value)
+            keys.append((facet, value))
+        self.product_values[product_id] = keys
+
+    def remove(self, product_id):
+        keys = self.product_values.pop(product_id, None)
+        if keys is None:
+            return
+        mask = ~(1 << product_id)
+        self.all &= mask
+        self.active &= mask
+        for facet, value in keys:
+            bitmaps = self.bitmaps[facet]
+            bitmaps[value] &= mask
+            if not bitmaps[value]:
+                del bitmaps[value]
+
+    def _values_for(self, facet, raw_value):
+        if facet == "color":
+            codes = set(self.color_names.get(raw_value.strip().lower(), ()))
+            codes.add(normalize_color(raw_value))
+            return codes
+        return {raw_value.strip().lower()}
+
+    def _facet_bitmap(self, facet, raw_values):
+        bitmap = 0
+        for raw_value in raw_values:
+            for value in self._values_for(facet, raw_value):
+                bitmap |= self.bitmaps[facet].get(value, 0)
+            if facet in ("color", "size"):
+                # Older listings carry colors/sizes as description hashtags
+                bitmap |= self.bitmaps["tag"].get(raw_value.strip().lower(), 0)
+        return bitmap
+
+    def match(self, selections, base=None):
+        """Return the bitmap of products matching every selected facet."""
+        bitmap = self.all if base is None else base
+        for facet, raw_values in selections.items():
+            if raw_values:
+                bitmap &= self._facet_bitmap(facet, raw_values)
+        return bitmap
+
+    def counts(self, selections, base=None):
+        base = self.all if base is None else base
+        result = {}
+        for facet in FACETS:
+            others = {f: v for f, v in selections.items() if f != facet}
+            scope = self.match(others, base)
+            entries = []
+            for value, bitmap in self.bitmaps[facet].items():
+                count = (scope & bitmap).bit_count()
+                if count:
+                    entries.append(
+                        {
+                            "value": value,
+                            "label": self.labels.get((facet, value)) or value,
+                            "count": count,
+                        }
+                    )
+            entries.sort(key=lambda entry: (-entry["count"], entry["value"]))
+            result[facet] = entries
+        return result
+
+
+def product_facet_values(product_ids=None):
+    """Yield ``(product_id, active, values)`` built with two queries."""
+    from .models import Product, ProductVariant
+
+    products = Product.objects.all()
+    variants = ProductVariant.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        variants = variants.filter(product_id__in=product_ids)
+
+    variant_values = defaultdict(list)
+    stock = defaultdict(int)
+    for product_id, color_code, color_name, size, qty in variants.values_list(
+        "product_id", "color_code", "color_name", "size", "stock"
+    ).iterator():
+        if color_code:
+            variant_values[product_id].append(("color", color_code, color_name))
+        if size:
+            variant_values[product_id].append(("size", size.strip().lower(), size))
+        stock[product_id] += qty
+
+    for product_id, deactive, description, category_slug, category_name in (
+        products.values_list(
+            "id",
+            "deactive",
+            "description",
+            "category__categoryslug",
+            "category__name",
+        ).iterator()
+    ):
+        values = list(variant_values[product_id])
+        if category_slug:
+            values.append(("category", category_slug.lower(), category_name))
+        for tag in TAG_RE.findall(description or ""):
+            values.append(("tag", tag.lower(), tag))
+        values.append(("stock", "in" if stock[product_id] > 0 else "out", None))
+        yield product_id, not deactive, values
+
+
+def build_facet_index():
+    index = FacetIndex()
+    for product_id, active, values in product_facet_values():
+        index.add(product_id, active, values)
+    return index
+
+
+class _FacetHolder:
+    """
+    Per-process facet index, kept current from the facets change feed.
+    Listings go out under an ETag of the catalog version, so the index
+    is checked against that version before every use: once it moves,
+    the products broadcast since are re-read before anything matches.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.feed = ChangeFeed(CHANNEL)
+        self.lock = threading.Lock()
+
+    def _rebuild(self):
+        self.feed.start()
+        self.index = build_facet_index()
+
+    def _update(self, product_ids):
+        seen = set()
+        for product_id, active, values in product_facet_values(product_ids):
+            self.index.add(product_id, active, values)
+            seen.add(product_id)
+        for product_id in set(product_ids) - seen:
+            self.index.remove(product_id)
+
+    def get(self):
+        version = tag_versions([CATALOG_TAG])[CATALOG_TAG]
+        if self.index is not None and version == self.version:
+            return self.index
+        with self.lock:
+            if self.index is None:
+                self._rebuild()
+            elif version != self.version:
+                changes = self.feed.changes()
+                if changes is None:
+                    self._rebuild()
+                elif changes:
+                    self._update(changes)
+            self.version = version
+        return self.index
+
+
+_holder = _FacetHolder()
+
+
+def get_facet_index():
+    return _holder.get()
+
+
+def refresh_facets(product_ids):
+    broadcast(CHANNEL, product_ids)
+    # Bumped after the broadcast, so a worker that sees the new catalog
+    # version finds these products in the feed.
+    invalidate_tags(CATALOG_TAG)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from product.reservations import SWEEP_BATCH_SIZE, expire_holds, reconcile_held
+
+
+class Command(BaseCommand):
+    help = (
+        "Release stock holds past their expiry. Run it every minute or so; "
+        "checkouts also drop expired holds on the variants they touch. "
+        "--reconcile recounts every variant's held units from its holds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument("--reconcile", action="store_true")
+
+    def handle(self, *args, **options):
+        released = expire_holds(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
+        if options["reconcile"]:
+            corrected = reconcile_held(options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Corrected held units of {corrected} variants")
+            )
@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from product.catalog import FORMATS, export_chunks
+
+
+class Command(BaseCommand):
+    help = "Write every variant with its product columns as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-")
+        parser.add_argument("--format", choices=list(FORMATS), default="csv")
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            self._write(sys.stdout, options["format"])
+            return
+        with open(options["path"], "w", encoding="utf-8", newline="") as fh:
+            self._write(fh, options["format"])
+
+    def _write(self, fh, file_format):
+        for chunk in export_chunks(file_format):
+            fh.write(chunk)
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.catalog import CHUNK_SIZE, CatalogImport, catalog_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert products, colors and variants from a CSV or JSON Lines file "
+        "with one row per variant (see product.catalog.COLUMNS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        file_format = catalog_format(options["format"], options["path"])
+        if file_format is None:
+            raise CommandError("Pass --format csv or --format jsonl")
+        importer = CatalogImport(
+            chunk_size=options["chunk_size"], dry_run=options["dry_run"]
+        )
+        with open(options["path"], encoding="utf-8-sig", newline="") as fh:
+            report = importer.run(read_rows(fh, file_format))
+        for error in report.pop("row_errors"):
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(json.dumps(report)))
@@ -0,0 +1,42 @@
+from concurrent.futures import wait
+
+from django.core.management.base import BaseCommand
+
+from account.models import User
+from product.models import ProductColor, ProductImage, ReviewImage
+from server.utils.renditions import FAILED, PENDING, PROCESSING, pool
+
+TARGETS = [
+    (ProductImage, "image"),
+    (ReviewImage, "image"),
+    (ProductColor, "image"),
+    (User, "profile"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Render image renditions that are missing: new rows, rows left behind "
+        "by a crashed worker and failed ones. --all re-renders every image."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true")
+
+    def handle(self, *args, **options):
+        statuses = [PENDING, PROCESSING, FAILED]
+        futures = []
+        total = 0
+        for model, field in TARGETS:
+            rows = model._default_manager.exclude(**{field: ""}).exclude(
+                **{f"{field}__isnull": True}
+            )
+            if not options["all"]:
+                rows = rows.filter(**{f"{field}_status__in": statuses})
+            for pk in rows.values_list("pk", flat=True).iterator():
+                future = pool.submit(model, pk, field)
+                if future is not None:
+                    futures.append(future)
+                total += 1
+        wait(futures)
+        self.stdout.write(self.style.SUCCESS(f"Rendered {total} images"))
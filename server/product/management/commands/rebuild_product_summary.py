@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from product.models import Product
+from product.ratings import rebuild_ratings
+from product.summary import refresh_product_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the ProductSummary and ProductRating read models from variants, "
+        "sales, reviews and images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        product_ids = Product.objects.order_by("id").values_list("id", flat=True)
+        chunk = []
+        total = 0
+        for product_id in product_ids.iterator(chunk_size=chunk_size):
+            chunk.append(product_id)
+            if len(chunk) >= chunk_size:
+                refresh_product_summaries(chunk)
+                rebuild_ratings(chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            refresh_product_summaries(chunk)
+            rebuild_ratings(chunk)
+            total += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} product summaries"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from product.recommendations import model_path, rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = "Rebuild the co-purchase recommendation model from sales."
+
+    def handle(self, *args, **options):
+        total = rebuild_recommendations()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Stored neighbours for {total} products in {model_path()}"
+            )
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from product.search import index_path, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the on-disk product search index from the database."
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index()
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {total} products into {index_path()}")
+        )
@@ -0,0 +1,107 @@
+# Generated by Django 5.1.4 on 2026-10-16 22:35
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+
+CHUNK_SIZE = 500
+
+
+def summarize(apps, product_ids):
+    ProductVariant = apps.get_model('product', 'ProductVariant')
+    ProductImage = apps.get_model('product', 'ProductImage')
+    ProductSummary = apps.get_model('product', 'ProductSummary')
+    Review = apps.get_model('product', 'Review')
+    Saled_Products = apps.get_model('sales', 'Saled_Products')
+
+    summaries = {
+        pid: ProductSummary(product_id=pid, colors=[], sizes=[])
+        for pid in product_ids
+    }
+    prices = {pid: [] for pid in product_ids}
+    variants = ProductVariant.objects.filter(product_id__in=product_ids).values_list(
+        'product_id', 'price', 'discount', 'stock', 'color_code', 'color_name', 'size'
+    )
+    for pid, price, discount, stock, color_code, color_name, size in variants:
+        summary = summaries[pid]
+        if discount:
+            price = (price * (100 - discount) / 100).quantize(Decimal('0.01'))
+        prices[pid].append(price)
+        summary.total_stock += stock
+        if color_code:
+            color = {'color_code': color_code, 'color_name': color_name}
+            if color not in summary.colors:
+                summary.colors.append(color)
+        if size and size not in summary.sizes:
+            summary.sizes.append(size)
+    for pid, values in prices.items():
+        if values:
+            summaries[pid].min_price = min(values)
+            summaries[pid].max_price = max(values)
+
+    sold = (
+        Saled_Products.objects.filter(variant__product_id__in=product_ids)
+        .values('variant__product_id')
+        .annotate(sold=Sum('qty'))
+    )
+    for row in sold:
+        summaries[row['variant__product_id']].units_sold = row['sold'] or 0
+
+    ratings = (
+        Review.objects.filter(product_id__in=product_ids, verified=True)
+        .values('product_id')
+        .annotate(avg=Avg('rating'), total=Count('id'))
+    )
+    for row in ratings:
+        summaries[row['product_id']].rating_avg = row['avg']
+        summaries[row['product_id']].rating_count = row['total']
+
+    images = (
+        ProductImage.objects.filter(product_id__in=product_ids)
+        .order_by('product_id', 'id')
+        .values_list('product_id', 'image')
+    )
+    for pid, image in images:
+        if summaries[pid].first_image is None:
+            summaries[pid].first_image = image
+    ProductSummary.objects.bulk_create(summaries.values())
+
+
+def build_summaries(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        summarize(apps, product_ids[start:start + CHUNK_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_alter_productimage_color'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='product.product')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('total_stock', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.FloatField(default=0)),
+                ('rating_avg', models.FloatField(blank=True, null=True)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('colors', models.JSONField(blank=True, default=list)),
+                ('sizes', models.JSONField(blank=True, default=list)),
+                ('first_image', models.CharField(blank=True, max_length=255, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['min_price'], name='product_pro_min_pri_da4f2d_idx'), models.Index(fields=['units_sold'], name='product_pro_units_s_d78fab_idx'), models.Index(fields=['total_stock'], name='product_pro_total_s_89004a_idx')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
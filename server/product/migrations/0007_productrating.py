@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-16 22:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_ratings(apps, schema_editor):
+    Review = apps.get_model('product', 'Review')
+    ProductRating = apps.get_model('product', 'ProductRating')
+    ratings = {}
+    rows = (
+        Review.objects.filter(verified=True, rating__in=range(1, 6))
+        .values('product_id', 'rating')
+        .annotate(total=Count('id'))
+    )
+    for row in rows:
+        rating = ratings.setdefault(
+            row['product_id'], ProductRating(product_id=row['product_id'])
+        )
+        field = 'star_%d' % row['rating']
+        setattr(rating, field, getattr(rating, field) + row['total'])
+        rating.rating_sum += row['rating'] * row['total']
+        rating.rating_count += row['total']
+    ProductRating.objects.bulk_create(ratings.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_alter_review_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ratings', serialize=False, to='product.product')),
+                ('star_1', models.PositiveIntegerField(default=0)),
+                ('star_2', models.PositiveIntegerField(default=0)),
+                ('star_3', models.PositiveIntegerField(default=0)),
+                ('star_4', models.PositiveIntegerField(default=0)),
+                ('star_5', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_ratings, migrations.RunPython.noop),
+    ]
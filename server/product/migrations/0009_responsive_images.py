@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:09
+
+from django.db import migrations, models
+
+
+def requeue_renditions(apps, schema_editor):
+    # Renditions stored before placeholders existed are rendered again
+    # by ``manage.py process_images``
+    for name in ('ProductImage', 'ReviewImage'):
+        model = apps.get_model('product', name)
+        model.objects.filter(image_status='ready').update(
+            image_status='pending', image_renditions={}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcolor',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='productcolor',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='productsummary',
+            name='first_image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(requeue_renditions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_responsive_images'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='held',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=225)),
+                ('qty', models.PositiveIntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='product.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='product_sto_expires_18d39f_idx'), models.Index(fields=['variant', 'expires_at'], name='product_sto_variant_97ca85_idx')],
+                'constraints': [models.UniqueConstraint(fields=('token', 'variant'), name='unique_stock_hold_per_checkout')],
+            },
+        ),
+    ]
@@ -11,6 +11,13 @@ from django.db import models
 from django.db.models import Q
 
 from account.models import User
+from server.utils.renditions import (
+    PENDING,
+    STATUS_CHOICES,
+    delete_renditions,
+    queue_renditions,
+    verify_image,
+)
 
 from .utils import *
 
@@ -59,6 +66,10 @@ class ProductColor(models.Model):
     color_code = models.CharField(max_length=7, primary_key=True)
     color_name = models.CharField(max_length=50)
     image = models.ImageField(upload_to="product_colors/", null=True, blank=True)
+    image_status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    image_renditions = models.JSONField(default=dict, blank=True)
 
     class Meta:
         indexes = [
@@ -72,7 +83,14 @@ class ProductColor(models.Model):
         if self.color_code:
             normalized = self._normalize_color(self.color_code)
             self.color_code = normalized
+        uploaded = bool(self.image) and not self.image._committed
+        if uploaded:
+            verify_image(self.image)
+            self.image_status = PENDING
+            self.image_renditions = {}
         super().save(*args, **kwargs)
+        if uploaded:
+            queue_renditions(self, "image")
 
     def _normalize_color(self, value):
         value = value.strip().upper()
@@ -104,6 +122,8 @@ class ProductVariant(models.Model):
         null=True, blank=True, validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
     stock = models.PositiveIntegerField(validators=[MinValueValidator(0)])
+    # Units set aside by open checkouts (StockHold), see product.reservations
+    held = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -174,8 +194,20 @@ class ProductVariant(models.Model):
                     "A variant with this color already exists for this product."
                 )
 
+    @property
+    def available(self):
+        """Stock that no open checkout is holding."""
+        return max(self.stock - self.held, 0)
+
     def save(self, *args, **kwargs):
         self.full_clean()
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            # held only moves through relative UPDATEs, never a stale copy
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "held"
+            ]
         return super().save(*args, **kwargs)
 
     def _normalize_color(self, value):
@@ -199,6 +231,10 @@ class ProductImage(models.Model):
     )
     index = models.IntegerField(null=True, blank=True)
     image = models.ImageField(upload_to="product_images/")
+    image_status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    image_renditions = models.JSONField(default=dict, blank=True)
 
     def delete(self, *args, **kwargs):
         # use storage.delete to support remote storage backends
@@ -207,6 +243,7 @@ class ProductImage(models.Model):
                 self.image.storage.delete(self.image.name)
         except Exception:
             pass
+        delete_renditions(self.image_renditions)
         super().delete(*args, **kwargs)
 
     def save(self, *args, **kwargs):
@@ -216,9 +253,15 @@ class ProductImage(models.Model):
                 "You can only upload a maximum of 5 images per product."
             )
 
-        if self.image:
-            self.image = compress_image(self.image)
+        # The original is stored as uploaded; renditions follow in the background
+        uploaded = bool(self.image) and not self.image._committed
+        if uploaded:
+            verify_image(self.image)
+            self.image_status = PENDING
+            self.image_renditions = {}
         super().save(*args, **kwargs)
+        if uploaded:
+            queue_renditions(self, "image")
 
 
 class NotifyUser(models.Model):
@@ -248,7 +291,7 @@ class Review(models.Model):
     recommended = models.BooleanField(default=True)
     delivery = models.BooleanField(default=True)
     favoutare = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
 
@@ -265,11 +308,20 @@ class ReviewImage(models.Model):
         null=True,
         validators=[FileExtensionValidator(allowed_extensions=["jpg", "jpeg", "png"])],
     )
+    image_status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING
+    )
+    image_renditions = models.JSONField(default=dict, blank=True)
 
     def save(self, *args, **kwargs):
-        if self.image:
-            self.image = compress_image(self.image, quality=85)
+        uploaded = bool(self.image) and not self.image._committed
+        if uploaded:
+            verify_image(self.image)
+            self.image_status = PENDING
+            self.image_renditions = {}
         super().save(*args, **kwargs)
+        if uploaded:
+            queue_renditions(self, "image")
 
 
 class Cart(models.Model):
@@ -291,9 +343,102 @@ class Cart(models.Model):
             raise ValidationError("pcs must be a positive integer")
         if self.variant is None:
             raise ValidationError("variant must be specified")
-        if self.pcs > self.variant.stock:
+        if self.pcs > self.variant.available:
             raise ValidationError("Not enough stock available")
         super().save(*args, **kwargs)
 
     class Meta:
         unique_together = ("user", "variant")
+
+
+class ProductSummary(models.Model):
+    """
+    Denormalized per-product catalog figures. Kept in sync by
+    product.signals and rebuilt with ``manage.py rebuild_product_summary``.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="summary"
+    )
+    min_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    max_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    total_stock = models.PositiveIntegerField(default=0)
+    units_sold = models.FloatField(default=0)
+    rating_avg = models.FloatField(null=True, blank=True)
+    rating_count = models.PositiveIntegerField(default=0)
+    colors = models.JSONField(default=list, blank=True)
+    sizes = models.JSONField(default=list, blank=True)
+    first_image = models.CharField(max_length=255, null=True, blank=True)
+    first_image_renditions = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["min_price"]),
+            models.Index(fields=["units_sold"]),
+            models.Index(fields=["total_stock"]),
+        ]
+
+
+class ProductRating(models.Model):
+    """
+    Verified review counts per star for a product. Adjusted in place by
+    product.signals on every review change and rebuilt with
+    ``manage.py rebuild_product_summary``.
+    """
+
+    STARS = range(1, 6)
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="ratings"
+    )
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def average(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    @property
+    def histogram(self):
+        return {star: getattr(self, f"star_{star}") for star in self.STARS}
+
+
+class StockHold(models.Model):
+    """
+    Units of a variant set aside for one checkout until the order is
+    placed, the hold is released or it expires. Each hold is also counted
+    in ProductVariant.held; product.reservations keeps the two in step.
+    """
+
+    variant = models.ForeignKey(
+        ProductVariant, on_delete=models.CASCADE, related_name="holds"
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # The checkout's transactionuid, which the order is later placed with
+    token = models.CharField(max_length=225)
+    qty = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["token", "variant"], name="unique_stock_hold_per_checkout"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+            models.Index(fields=["variant", "expires_at"]),
+        ]
@@ -0,0 +1,81 @@
+from django.db import connection
+from django.db.models import Count, F
+
+from .models import Product, ProductRating, Review
+
+RATING_FIELDS = [f"star_{star}" for star in ProductRating.STARS] + [
+    "rating_sum",
+    "rating_count",
+]
+
+
+def review_contribution(product_id, rating, verified):
+    """Field deltas one review adds to its product's ProductRating row."""
+    try:
+        rating = int(rating)
+    except (TypeError, ValueError):
+        return None, {}
+    if not verified or product_id is None or rating not in ProductRating.STARS:
+        return None, {}
+    return product_id, {f"star_{rating}": 1, "rating_sum": rating, "rating_count": 1}
+
+
+def apply_review_change(before, after):
+    """
+    Move a review's contribution from ``before`` to ``after``, each a
+    ``(product_id, rating, verified)`` tuple or None, with one UPDATE per
+    affected product so concurrent reviews never overwrite each other.
+    """
+    deltas = {}
+    for state, sign in ((before, -1), (after, 1)):
+        if state is None:
+            continue
+        product_id, fields = review_contribution(*state)
+        if product_id is None:
+            continue
+        product_deltas = deltas.setdefault(product_id, {})
+        for field, value in fields.items():
+            product_deltas[field] = product_deltas.get(field, 0) + sign * value
+
+    for product_id, fields in deltas.items():
+        fields = {field: value for field, value in fields.items() if value}
+        if not fields:
+            continue
+        updated = ProductRating.objects.filter(product_id=product_id).update(
+            **{field: F(field) + value for field, value in fields.items()}
+        )
+        # A product whose row was never built gets one from scratch, which
+        # already counts this review. Deletes skip it: the product itself
+        # may be going away in the same cascade.
+        if not updated and after is not None:
+            rebuild_ratings([product_id])
+
+
+def rebuild_ratings(product_ids):
+    """Recompute ProductRating rows for ``product_ids`` from the reviews."""
+    product_ids = set(
+        Product.objects.filter(id__in=set(product_ids)).values_list("id", flat=True)
+    )
+    if not product_ids:
+        return
+
+    ratings = {pid: ProductRating(product_id=pid) for pid in product_ids}
+    rows = (
+        Review.objects.filter(product_id__in=product_ids, verified=True)
+        .values("product_id", "rating")
+        .annotate(total=Count("id"))
+    )
+    for row in rows:
+        rating = ratings[row["product_id"]]
+        if row["rating"] not in ProductRating.STARS:
+            continue
+        field = f"star_{row['rating']}"
+        setattr(rating, field, getattr(rating, field) + row["total"])
+        rating.rating_sum += row["rating"] * row["total"]
+        rating.rating_count += row["total"]
+
+    upsert = {"update_conflicts": True, "update_fields": RATING_FIELDS}
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    if connection.features.supports_update_conflicts_with_target:
+        upsert["unique_fields"] = ["product"]
+    ProductRating.objects.bulk_create(ratings.values(), **upsert)
@@ -0,0 +1,165 @@
+import heapq
+import math
+import os
+import pickle
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from server.utils.artifacts import ArtifactHolder, dump_atomic
+
+MODEL_FORMAT_VERSION = 1
+# Neighbours kept per product and length of the popularity fallback
+NEIGHBOUR_LIMIT = 20
+POPULAR_LIMIT = 100
+# Orders that never went through don't say anything about taste
+EXCLUDED_SALE_STATUSES = ("unpaid", "cancelled")
+
+
+class CoPurchaseModel:
+    """
+    Item-to-item recommendations from orders: two products are similar
+    when they are bought together, scored with cosine similarity over the
+    orders that contain them. Only the top neighbours of each product and
+    a popularity ranking are kept, as flat arrays.
+    """
+
+    def __init__(self, neighbours=None, popular=None):
+        self.neighbours = neighbours or {}  # product_id -> (ids, scores)
+        self.popular = popular or array("q")
+
+    def __len__(self):
+        return len(self.neighbours)
+
+    def similar(self, product_id, limit=NEIGHBOUR_LIMIT):
+        ids, _ = self.neighbours.get(product_id, ((), ()))
+        return list(ids[:limit])
+
+    def recommend(self, seed_ids, limit, exclude=()):
+        """
+        Products most often bought with ``seed_ids``, summing similarity
+        over the seeds and topping up from the popularity list.
+        """
+        exclude = set(exclude) | set(seed_ids)
+        scores = defaultdict(float)
+        for seed_id in seed_ids:
+            ids, weights = self.neighbours.get(seed_id, ((), ()))
+            for product_id, weight in zip(ids, weights):
+                if product_id not in exclude:
+                    scores[product_id] += weight
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda x: (x[1], x[0]))
+        result = [product_id for product_id, _ in ranked]
+        return self._top_up(result, limit, exclude)
+
+    def popular_products(self, limit, exclude=()):
+        return self._top_up([], limit, set(exclude))
+
+    def _top_up(self, result, limit, exclude):
+        seen = set(result) | exclude
+        for product_id in self.popular:
+            if len(result) >= limit:
+                break
+            if product_id not in seen:
+                result.append(product_id)
+                seen.add(product_id)
+        return result
+
+    def dump(self, path):
+        payload = {
+            "version": MODEL_FORMAT_VERSION,
+            "neighbours": self.neighbours,
+            "popular": self.popular,
+        }
+        dump_atomic(payload, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+        if payload.get("version") != MODEL_FORMAT_VERSION:
+            raise ValueError("Unsupported recommendation model format")
+        return cls(payload["neighbours"], payload["popular"])
+
+
+def model_path():
+    return getattr(
+        settings,
+        "RECOMMENDATIONS_PATH",
+        os.path.join(settings.BASE_DIR, "recommendations.bin"),
+    )
+
+
+def build_model(neighbour_limit=NEIGHBOUR_LIMIT, popular_limit=POPULAR_LIMIT):
+    """Build the co-purchase model from every order with one query."""
+    from sales.models import Saled_Products
+
+    from .models import Product
+
+    rows = (
+        Saled_Products.objects.filter(product__isnull=False, transition__isnull=False)
+        .exclude(transition__status__in=EXCLUDED_SALE_STATUSES)
+        .values_list("transition_id", "product_id")
+        .distinct()
+    )
+    baskets = defaultdict(set)
+    for transition_id, product_id in rows.iterator():
+        baskets[transition_id].add(product_id)
+
+    orders = Counter()
+    pairs = Counter()
+    for products in baskets.values():
+        orders.update(products)
+        products = sorted(products)
+        for i, first in enumerate(products):
+            for second in products[i + 1 :]:
+                pairs[first, second] += 1
+
+    candidates = defaultdict(list)
+    for (first, second), together in pairs.items():
+        score = together / math.sqrt(orders[first] * orders[second])
+        candidates[first].append((score, second))
+        candidates[second].append((score, first))
+
+    neighbours = {}
+    for product_id, scored in candidates.items():
+        top = heapq.nlargest(neighbour_limit, scored)
+        neighbours[product_id] = (
+            array("q", [other for _, other in top]),
+            array("f", [score for score, _ in top]),
+        )
+
+    # Products never ordered still fill the popularity list, newest first
+    popular = [pid for pid, _ in sorted(orders.items(), key=lambda x: (-x[1], -x[0]))]
+    popular = popular[:popular_limit]
+    if len(popular) < popular_limit:
+        newest = Product.objects.exclude(id__in=popular).order_by("-id")
+        popular += newest.values_list("id", flat=True)[: popular_limit - len(popular)]
+    return CoPurchaseModel(neighbours, array("q", popular))
+
+
+class _ModelHolder(ArtifactHolder):
+    """
+    Per-process handle on the on-disk model, reloaded whenever the batch
+    job has written a new one. A missing file is built once on demand.
+    """
+
+    def path(self):
+        return model_path()
+
+    def build(self):
+        return build_model()
+
+    def read(self, path):
+        return CoPurchaseModel.load(path)
+
+
+_holder = _ModelHolder()
+
+
+def get_recommendation_model():
+    return _holder.get()
+
+
+def rebuild_recommendations():
+    return len(_holder.refresh())
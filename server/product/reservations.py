@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from .models import ProductVariant, StockHold
+from .signals import version_batch
+
+# Holds are counted into ProductVariant.held, so available-to-sell is a
+# column read (stock - held). Every change to a variant's holds happens
+# with that variant's row locked, which keeps the counter and the rows
+# in step.
+
+SWEEP_BATCH_SIZE = 500
+
+
+def hold_ttl():
+    return timezone.timedelta(seconds=getattr(settings, "STOCK_HOLD_TTL", 15 * 60))
+
+
+def lock_variants(variant_ids):
+    """SELECT ... FOR UPDATE in primary key order, so lockers never deadlock."""
+    return list(
+        ProductVariant.objects.select_for_update()
+        .filter(pk__in=variant_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+def _add_held(totals):
+    """Move ``held`` by ``{variant_id: delta}`` in one UPDATE, never below 0."""
+    if not totals:
+        return
+    whens = []
+    for variant_id, delta in totals.items():
+        if delta < 0:
+            # Unsigned columns reject a negative intermediate, so clamp first
+            whens.append(When(pk=variant_id, held__lt=-delta, then=Value(0)))
+        whens.append(When(pk=variant_id, then=F("held") + delta))
+    ProductVariant.objects.filter(pk__in=totals).update(
+        held=Case(
+            *whens,
+            default=F("held"),
+            output_field=ProductVariant._meta.get_field("held"),
+        )
+    )
+
+
+def _unhold(holds):
+    """Delete ``holds`` and take their units off the variants' counters."""
+    rows = list(holds.values_list("pk", "variant_id", "qty", "variant__product_id"))
+    if not rows:
+        return 0
+    totals = {}
+    for _, variant_id, qty, _ in rows:
+        totals[variant_id] = totals.get(variant_id, 0) - qty
+    StockHold.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    _add_held(totals)
+    version_batch.add(*{row[3] for row in rows})
+    return len(rows)
+
+
+def clear_holds(variant_ids, token=None, user=None):
+    """
+    Drop expired holds on ``variant_ids``, and every hold of ``token``
+    (limited to ``user``'s when given). The caller must hold the locks.
+    """
+    stale = StockHold.objects.filter(
+        variant_id__in=variant_ids, expires_at__lte=timezone.now()
+    )
+    if token is not None:
+        own = StockHold.objects.filter(token=token)
+        if user is not None:
+            own = own.filter(user=user)
+        stale = stale | own.filter(variant_id__in=variant_ids)
+    return _unhold(stale)
+
+
+def hold_stock(token, user, lines):
+    """
+    Hold ``{variant_id: (product_id, qty)}`` for ``token`` until hold_ttl()
+    from now. The caller must hold the locks and have checked availability.
+    """
+    expires_at = timezone.now() + hold_ttl()
+    StockHold.objects.bulk_create(
+        [
+            StockHold(
+                variant_id=variant_id,
+                user=user,
+                token=token,
+                qty=qty,
+                expires_at=expires_at,
+            )
+            for variant_id, (_, qty) in lines.items()
+        ]
+    )
+    _add_held({variant_id: qty for variant_id, (_, qty) in lines.items()})
+    version_batch.add(*{product_id for product_id, _ in lines.values()})
+    return expires_at
+
+
+def token_variants(token, user=None):
+    holds = StockHold.objects.filter(token=token)
+    if user is not None:
+        holds = holds.filter(user=user)
+    return set(holds.values_list("variant_id", flat=True))
+
+
+def release_holds(token, user=None):
+    """Give back every unit ``token`` holds. Returns the number of holds."""
+    with transaction.atomic():
+        variant_ids = lock_variants(token_variants(token, user))
+        return clear_holds(variant_ids, token, user)
+
+
+def expire_holds(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Release every hold past its expiry, ``batch_size`` variants per
+    transaction so the sweep never keeps many rows locked for long.
+    Returns the number of holds released.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            variant_ids = list(
+                StockHold.objects.filter(expires_at__lte=timezone.now())
+                .order_by("variant_id")
+                .values_list("variant_id", flat=True)
+                .distinct()[:batch_size]
+            )
+            if not variant_ids:
+                return released
+            released += clear_holds(lock_variants(variant_ids))
+
+
+def reconcile_held(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Recount ``held`` from the hold rows, for counters that drifted (rows
+    deleted by hand, a restored backup). Returns the variants corrected.
+    """
+    corrected = 0
+    variant_ids = ProductVariant.objects.order_by("pk").values_list("pk", flat=True)
+    chunk = list(variant_ids[:batch_size])
+    while chunk:
+        with transaction.atomic():
+            lock_variants(chunk)
+            counted = dict(
+                StockHold.objects.filter(variant_id__in=chunk)
+                .values_list("variant_id")
+                .annotate(total=Sum("qty"))
+            )
+            for variant_id, held in ProductVariant.objects.filter(
+                pk__in=chunk
+            ).values_list("pk", "held"):
+                if held != counted.get(variant_id, 0):
+                    ProductVariant.objects.filter(pk=variant_id).update(
+                        held=counted.get(variant_id, 0)
+                    )
+                    corrected += 1
+        chunk = list(variant_ids.filter(pk__gt=chunk[-1])[:batch_size])
+    return corrected
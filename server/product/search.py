@@ -0,0 +1,343 @@
+import glob
+import heapq
+import math
+import os
+import pickle
+import re
+import struct
+import uuid
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import suppress
+
+from django.conf import settings
+
+from server.utils.artifacts import ArtifactHolder, dump_atomic, file_lock
+
+INDEX_FORMAT_VERSION = 2
+SEARCH_RESULT_LIMIT = 500
+# Cap on vocabulary terms a trailing prefix may expand to
+PREFIX_EXPANSION_LIMIT = 50
+# Delta log records are length-prefixed pickles; past this many bytes the
+# next update writes a fresh snapshot instead
+LOG_HEADER = struct.Struct("<I")
+LOG_COMPACT_SIZE = 4 * 1024 * 1024
+
+# Field weights: a match in the product name counts more than one buried
+# in a long description.
+FIELD_WEIGHTS = {"name": 3, "category": 2, "variants": 1, "description": 1}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+def _rank_key(item):
+    # Higher score first; ties go to the newer (higher id) product
+    product_id, score = item
+    return score, product_id
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over product text, scored with Okapi BM25.
+    The final query token also matches as a prefix so partially typed
+    words still find results.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {product_id: weighted tf}
+        self.doc_lengths = {}  # product_id -> weighted token count
+        self.doc_terms = {}  # product_id -> tuple of terms, for removal
+        self.total_length = 0
+        # Names the delta log that goes with a snapshot of this index
+        self.generation = uuid.uuid4().hex
+        self._vocabulary = None
+        self._norms = None
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, product_id, fields):
+        """Index ``fields`` ({"name": ..., "description": ...}) for a product."""
+        self.remove(product_id)
+        counts = Counter()
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1)
+            for token in tokenize(text):
+                counts[token] += weight
+        if not counts:
+            return
+        for term, tf in counts.items():
+            if term not in self.postings:
+                self._vocabulary = None
+            self.postings[term][product_id] = tf
+        length = sum(counts.values())
+        self._norms = None
+        self.doc_lengths[product_id] = length
+        self.doc_terms[product_id] = tuple(counts)
+        self.total_length += length
+
+    def remove(self, product_id):
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(product_id)
+        self._norms = None
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(product_id, None)
+            if not docs:
+                del self.postings[term]
+                self._vocabulary = None
+
+    def _expand(self, token, prefix):
+        if not prefix:
+            return [token] if token in self.postings else []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        start = bisect_left(vocabulary, token)
+        matches = []
+        for term in vocabulary[start:]:
+            if not term.startswith(token) or len(matches) >= PREFIX_EXPANSION_LIMIT:
+                break
+            matches.append(term)
+        return matches
+
+    def _length_norms(self):
+        # BM25 length normalization only changes when documents change
+        if self._norms is None:
+            avg_length = self.total_length / len(self.doc_lengths)
+            self._norms = {
+                product_id: self.k1 * (1 - self.b + self.b * length / avg_length)
+                for product_id, length in self.doc_lengths.items()
+            }
+        return self._norms
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT):
+        """Return ``[(product_id, score), ...]`` ordered by descending score."""
+        tokens = tokenize(query)
+        if not tokens or not self.doc_lengths:
+            return []
+        doc_count = len(self.doc_lengths)
+        norms = self._length_norms()
+        tokens = list(dict.fromkeys(tokens))
+        scores = defaultdict(float)
+        for position, token in enumerate(tokens):
+            is_last = position == len(tokens) - 1
+            for term in self._expand(token, prefix=is_last):
+                docs = self.postings[term]
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                boost = idf * (self.k1 + 1)
+                for product_id, tf in docs.items():
+                    scores[product_id] += boost * tf / (tf + norms[product_id])
+        if limit:
+            return heapq.nlargest(limit, scores.items(), key=_rank_key)
+        return sorted(scores.items(), key=_rank_key, reverse=True)
+
+    def dump(self, path):
+        payload = {
+            "version": INDEX_FORMAT_VERSION,
+            "generation": self.generation,
+            "postings": dict(self.postings),
+            "doc_lengths": self.doc_lengths,
+        }
+        dump_atomic(payload, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError("Unsupported search index format")
+        index = cls()
+        index.generation = payload["generation"]
+        index.postings = defaultdict(dict, payload["postings"])
+        index.doc_lengths = payload["doc_lengths"]
+        index.total_length = sum(index.doc_lengths.values())
+        doc_terms = defaultdict(list)
+        for term, docs in index.postings.items():
+            for product_id in docs:
+                doc_terms[product_id].append(term)
+        index.doc_terms = {pid: tuple(terms) for pid, terms in doc_terms.items()}
+        return index
+
+
+def index_path():
+    return getattr(
+        settings,
+        "SEARCH_INDEX_PATH",
+        os.path.join(settings.BASE_DIR, "search_index.bin"),
+    )
+
+
+def product_documents(product_ids=None):
+    """Yield ``(product_id, fields)`` pairs built with two queries."""
+    from .models import Product, ProductVariant
+
+    products = Product.objects.all()
+    variants = ProductVariant.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+        variants = variants.filter(product_id__in=product_ids)
+
+    variant_text = defaultdict(list)
+    for product_id, color_name, size in variants.values_list(
+        "product_id", "color_name", "size"
+    ).iterator():
+        variant_text[product_id].extend(v for v in (color_name, size) if v)
+
+    for product_id, name, description, category in products.values_list(
+        "id", "product_name", "description", "category__name"
+    ).iterator():
+        yield product_id, {
+            "name": name,
+            "category": category,
+            "variants": " ".join(dict.fromkeys(variant_text[product_id])),
+            "description": description,
+        }
+
+
+def build_index():
+    index = SearchIndex()
+    for product_id, fields in product_documents():
+        index.add(product_id, fields)
+    return index
+
+
+def _log_records(data):
+    """Split appended log bytes into whole records and the bytes they use."""
+    records = []
+    offset = 0
+    while offset + LOG_HEADER.size <= len(data):
+        (size,) = LOG_HEADER.unpack_from(data, offset)
+        end = offset + LOG_HEADER.size + size
+        if end > len(data):
+            break  # the writer is still appending this one
+        records += pickle.loads(data[offset + LOG_HEADER.size : end])
+        offset = end
+    return records, offset
+
+
+class _IndexHolder(ArtifactHolder):
+    """
+    Per-process handle on the shared on-disk index. The file is a
+    snapshot; each product update appends its re-indexed documents to a
+    delta log named after the snapshot's generation instead of rewriting
+    the whole index. Workers replay new log records as they appear and
+    load the snapshot again when it is replaced. Once the log passes
+    LOG_COMPACT_SIZE the writer folds it into a new snapshot.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.log_offset = 0
+
+    def path(self):
+        return index_path()
+
+    def build(self):
+        return build_index()
+
+    def read(self, path):
+        index = SearchIndex.load(path)
+        self.log_offset = 0
+        return index
+
+    def _log_path(self, path):
+        return f"{path}.{self.value.generation}.log"
+
+    def _log_size(self, path):
+        try:
+            return os.stat(self._log_path(path)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def is_current(self, path):
+        return super().is_current(path) and self._log_size(path) == self.log_offset
+
+    def save(self, path):
+        super().save(path)
+        self.log_offset = 0
+        current = self._log_path(path)
+        for log_path in glob.glob(f"{glob.escape(path)}.*.log"):
+            if log_path != current:
+                with suppress(FileNotFoundError):
+                    os.unlink(log_path)
+
+    def _apply(self, records):
+        for product_id, fields in records:
+            if fields is None:
+                self.value.remove(product_id)
+            else:
+                self.value.add(product_id, fields)
+
+    def _catch_up(self, path, locked=False):
+        if not super().is_current(path):
+            self.load(path, locked)
+        try:
+            with open(self._log_path(path), "rb") as fh:
+                fh.seek(self.log_offset)
+                data = fh.read()
+        except FileNotFoundError:
+            # Nothing logged yet, or a newer snapshot replaced this one
+            return
+        records, size = _log_records(data)
+        self._apply(records)
+        self.log_offset += size
+
+    def get(self):
+        path = self.path()
+        if not self.is_current(path):
+            with self.lock:
+                if not self.is_current(path):
+                    self._catch_up(path)
+        return self.value
+
+    def update(self, product_ids):
+        """Re-index (or drop) ``product_ids`` and persist the change."""
+        path = self.path()
+        with self.lock, file_lock(path):
+            self._catch_up(path, locked=True)
+            records = list(product_documents(product_ids))
+            indexed = {product_id for product_id, _ in records}
+            records += [(pid, None) for pid in product_ids - indexed]
+            self._apply(records)
+            if self.log_offset >= LOG_COMPACT_SIZE:
+                self.value.generation = uuid.uuid4().hex
+                self.save(path)
+                return
+            data = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(self._log_path(path), "ab") as fh:
+                # Drop anything a writer that died mid-append left behind
+                fh.truncate(self.log_offset)
+                fh.write(LOG_HEADER.pack(len(data)) + data)
+            self.log_offset += LOG_HEADER.size + len(data)
+
+
+_holder = _IndexHolder()
+
+
+def get_search_index():
+    return _holder.get()
+
+
+def search_products(query, limit=SEARCH_RESULT_LIMIT):
+    """Return product ids matching ``query``, most relevant first."""
+    return [product_id for product_id, _ in get_search_index().search(query, limit)]
+
+
+def reindex_products(product_ids):
+    _holder.update(set(product_ids))
+
+
+def rebuild_search_index():
+    return len(_holder.refresh())
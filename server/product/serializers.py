@@ -1,7 +1,19 @@
-from django.db.models import Avg
+from django.db.models import prefetch_related_objects
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
 
+from server.utils.fieldsets import SparseFieldsetMixin
+from server.utils.renditions import rendition_set, rendition_url
+
 from .models import *
+from .snapshots import color_snapshot
+
+
+def default_rendition(context):
+    """Listings get card-sized images, detail views the larger size."""
+    return context.get("rendition") or (
+        "detail" if context.get("is_detail") else "card"
+    )
 
 
 class CategoryViewSerializer(serializers.ModelSerializer):
@@ -17,46 +29,64 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
         fields = "__all__"
+        read_only_fields = ["image_status"]
         extra_kwargs = {
             "color": {"required": False, "allow_null": True},
         }
 
+    def get_image_renditions(self, obj):
+        return rendition_set(obj.image_renditions, self.context.get("request"))
+
 
 class ProductColorSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductColor
-        fields = ["color_code", "color_name", "image"]
+        fields = ["color_code", "color_name", "image", "image_renditions"]
 
     def get_image(self, obj):
-        if obj.image:
-            request = self.context.get("request")
-            return (
-                request.build_absolute_uri(obj.image.url) if request else obj.image.url
-            )
-        return None
+        return rendition_url(
+            obj.image.name,
+            obj.image_renditions,
+            default_rendition(self.context),
+            self.context.get("request"),
+        )
+
+    def get_image_renditions(self, obj):
+        return rendition_set(obj.image_renditions, self.context.get("request"))
 
 
 class ImageDataSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     color = serializers.SerializerMethodField()
 
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image", "color"]
+        fields = ["id", "image", "color", "image_status", "image_renditions"]
 
     def get_image(self, obj):
-        request = self.context.get("request")
-        return request.build_absolute_uri(obj.image.url) if request else obj.image.url
+        return rendition_url(
+            obj.image.name,
+            obj.image_renditions,
+            default_rendition(self.context),
+            self.context.get("request"),
+        )
+
+    def get_image_renditions(self, obj):
+        return rendition_set(obj.image_renditions, self.context.get("request"))
 
     def get_color(self, obj):
-        if obj.color:
-            return obj.color.color_code
-        return None
+        # color is keyed by color_code, so the FK value is the code itself
+        return obj.color_id
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
@@ -66,6 +96,8 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         required=False,
         allow_null=True,
     )
+    # Stock less the units held by open checkouts
+    available = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = ProductVariant
@@ -79,6 +111,7 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             "price",
             "discount",
             "stock",
+            "available",
         ]
 
     def validate_color_code(self, value):
@@ -94,7 +127,98 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         return normalized
 
 
-class ProductSerializer(serializers.ModelSerializer):
+LISTING_PARTS = ("category", "variants", "images", "ratings", "summary")
+
+# Which listing data each rendered ProductSerializer key depends on
+FIELD_PARTS = {
+    "categoryname": "category",
+    "colors": "variants",
+    "has_colors": "variants",
+    "has_sizes": "variants",
+    "variants": "variants",
+    "images": "images",
+    "rating": "ratings",
+    "total_ratings": "ratings",
+    "price": "summary",
+    "image": "summary",
+    "image_renditions": "summary",
+}
+
+
+def prefetch_product_listing(products, parts=LISTING_PARTS):
+    """
+    Load what ProductSerializer renders for ``products`` in a fixed number
+    of queries: category, variants, images, the rating row and the summary
+    row. Colors come from the color snapshot. ``parts`` limits the work to
+    the data the requested fields need; parts already loaded are skipped.
+    """
+    parts = set(parts)
+    if not products or not parts:
+        return
+
+    lookups = {
+        "category": "category",
+        "variants": "productvariant_set",
+        "images": "images",
+        "ratings": "ratings",
+        "summary": "summary",
+    }
+    prefetch_related_objects(
+        products, *(lookup for part, lookup in lookups.items() if part in parts)
+    )
+
+    if "variants" in parts:
+        # Colors come from the per-worker snapshot instead of a join
+        color_field = ProductVariant.color.field
+        color_lookup = {}
+        for product in products:
+            if hasattr(product, "_color_lookup"):
+                continue
+            for variant in product.productvariant_set.all():
+                for code in (variant.color_id, variant.color_code):
+                    if code and code not in color_lookup:
+                        color_lookup[code] = color_snapshot.get(code)
+                if not color_field.is_cached(variant):
+                    color_field.set_cached_value(
+                        variant, color_lookup.get(variant.color_id)
+                    )
+            product._color_lookup = color_lookup
+
+
+def product_colors(product, context):
+    """Distinct variant colors of a product loaded by prefetch_product_listing."""
+    # dict keeps first-seen order while dropping duplicate pairs
+    color_values = dict.fromkeys(
+        (variant.color_code, variant.color_name)
+        for variant in product.productvariant_set.all()
+        if variant.color_code
+    )
+    colors = []
+    for color_code, color_name in color_values:
+        color_obj = product._color_lookup.get(color_code)
+        color_data = (
+            ProductColorSerializer(color_obj, context=context).data if color_obj else {}
+        )
+        colors.append(
+            {
+                "color_code": color_code,
+                "color_name": color_name,
+                "image": color_data.get("image"),
+                "image_renditions": color_data.get("image_renditions"),
+            }
+        )
+    return colors
+
+
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        products = list(iterable)
+        prefetch_product_listing(products, self.child.listing_parts())
+        return super().to_representation(products)
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     categoryname = serializers.SerializerMethodField()
     reviews = serializers.SerializerMethodField()
     rating = serializers.SerializerMethodField()
@@ -102,10 +226,59 @@ class ProductSerializer(serializers.ModelSerializer):
     colors = serializers.SerializerMethodField()
     has_colors = serializers.SerializerMethodField()
     has_sizes = serializers.SerializerMethodField()
+    price = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = "__all__"
+        list_serializer_class = ProductListSerializer
+        on_demand_fields = ["price", "image", "image_renditions"]
+        field_profiles = {
+            "card": [
+                "id",
+                "product_name",
+                "productslug",
+                "price",
+                "image",
+                "image_renditions",
+                "rating",
+                "total_ratings",
+            ],
+            "detail": [
+                "id",
+                "product_name",
+                "description",
+                "productslug",
+                "category",
+                "categoryname",
+                "reviews",
+                "rating",
+                "total_ratings",
+                "colors",
+                "has_colors",
+                "has_sizes",
+                "variants",
+                "images",
+            ],
+            "admin": [
+                "id",
+                "product_name",
+                "productslug",
+                "deactive",
+                "category",
+                "categoryname",
+                "price",
+                "rating",
+                "total_ratings",
+                "variants",
+                "images",
+            ],
+        }
+
+    def listing_parts(self):
+        return {part for name, part in FIELD_PARTS.items() if self.wants(name)}
 
     def get_categoryname(self, obj):
         return obj.category.name if obj.category else None
@@ -113,120 +286,124 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_reviews(self, obj):
         request = self.context.get("request")
         if request and request.method == "GET" and self.context.get("is_detail", False):
-            reviews = obj.reviews.all().filter(favoutare=True, verified=True)
-            return ReviewSerializer(reviews, many=True, context=self.context).data
+            reviews = (
+                obj.reviews.filter(favoutare=True, verified=True)
+                .select_related("user")
+                .prefetch_related("review_images")
+            )
+            return ReviewSerializer(
+                reviews, many=True, context={**self.context, "apply_fieldset": False}
+            ).data
+
+    def _ratings(self, obj):
+        try:
+            return obj.ratings
+        except ProductRating.DoesNotExist:
+            return None
 
     def get_rating(self, obj):
-        verified_reviews = obj.reviews.filter(verified=True)
-        if verified_reviews.exists():
-            average_rating = verified_reviews.aggregate(Avg("rating"))["rating__avg"]
-            return round(average_rating, 2) if average_rating is not None else None
-        return None
+        ratings = self._ratings(obj)
+        if ratings is None or ratings.average is None:
+            return None
+        return round(ratings.average, 2)
 
     def get_total_ratings(self, obj):
-        return obj.reviews.filter(verified=True).count()
+        ratings = self._ratings(obj)
+        return ratings.rating_count if ratings else 0
 
     def get_colors(self, obj):
-        color_values = (
-            obj.productvariant_set.exclude(color_code__isnull=True)
-            .exclude(color_code="")
-            .values("color_code", "color_name")
-            .distinct()
-        )
-        colors = []
-        for color in color_values:
-            color_obj = ProductColor.objects.filter(
-                color_code=color["color_code"]
-            ).first()
-            colors.append(
-                {
-                    "color_code": color["color_code"],
-                    "color_name": color["color_name"],
-                    "image": ProductColorSerializer(
-                        color_obj, context=self.context
-                    ).data.get("image")
-                    if color_obj
-                    else None,
-                }
-            )
-        return colors
+        return product_colors(obj, self.context)
 
     def get_has_colors(self, obj):
-        return (
-            obj.productvariant_set.exclude(color_code__isnull=True)
-            .exclude(color_code="")
-            .exists()
-        )
+        return any(v.color_code for v in obj.productvariant_set.all())
 
     def get_has_sizes(self, obj):
-        return (
-            obj.productvariant_set.exclude(size__isnull=True).exclude(size="").exists()
+        return any(v.size for v in obj.productvariant_set.all())
+
+    def _summary(self, obj):
+        try:
+            return obj.summary
+        except ProductSummary.DoesNotExist:
+            return None
+
+    def get_price(self, obj):
+        summary = self._summary(obj)
+        if summary is None or summary.min_price is None:
+            return None
+        return {"min": summary.min_price, "max": summary.max_price}
+
+    def get_image(self, obj):
+        summary = self._summary(obj)
+        if summary is None:
+            return None
+        return rendition_url(
+            summary.first_image,
+            summary.first_image_renditions,
+            default_rendition(self.context),
+            self.context.get("request"),
+        )
+
+    def get_image_renditions(self, obj):
+        summary = self._summary(obj)
+        if summary is None:
+            return None
+        return rendition_set(
+            summary.first_image_renditions, self.context.get("request")
         )
 
     def to_representation(self, instance):
+        prefetch_product_listing([instance], self.listing_parts())
         representation = super().to_representation(instance)
 
         request = self.context.get("request")
         if request and request.method == "GET":
-            variants = instance.productvariant_set.select_related("color").all()
-            images = instance.images.all()
-
-            variants_data = ProductVariantSerializer(variants, many=True).data
-            if len(variants_data) == 1:
-                representation["variants"] = variants_data[0]
-            else:
-                representation["variants"] = variants_data
-            representation["images"] = ImageDataSerializer(
-                images, many=True, context=self.context
-            ).data
-            representation["categoryname"] = self.get_categoryname(instance)
-            representation["colors"] = self.get_colors(instance)
+            if self.wants("variants"):
+                variants = instance.productvariant_set.all()
+                variants_data = ProductVariantSerializer(variants, many=True).data
+                if len(variants_data) == 1:
+                    representation["variants"] = variants_data[0]
+                else:
+                    representation["variants"] = variants_data
+            if self.wants("images"):
+                representation["images"] = ImageDataSerializer(
+                    instance.images.all(), many=True, context=self.context
+                ).data
 
         return representation
 
 
 class ProductByIdsSerializer(serializers.ModelSerializer):
+    """
+    Cart and checkout rendering of a product: every variant, its colors and
+    the first image, bulk-loaded through prefetch_product_listing.
+    """
+
     categoryname = serializers.SerializerMethodField()
     colors = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = "__all__"
+        list_serializer_class = ProductListSerializer
+
+    def listing_parts(self):
+        return {"category", "variants", "images"}
 
     def get_categoryname(self, obj):
         return obj.category.name if obj.category else None
 
     def get_colors(self, obj):
-        color_values = (
-            obj.productvariant_set.exclude(color_code__isnull=True)
-            .exclude(color_code="")
-            .values("color_code", "color_name")
-            .distinct()
-        )
-        colors = []
-        for color in color_values:
-            color_obj = ProductColor.objects.filter(
-                color_code=color["color_code"]
-            ).first()
-            colors.append(
-                {
-                    "color_code": color["color_code"],
-                    "color_name": color["color_name"],
-                    "image": ProductColorSerializer(
-                        color_obj, context=self.context
-                    ).data.get("image")
-                    if color_obj
-                    else None,
-                }
-            )
-        return colors
+        return product_colors(obj, self.context)
 
     def to_representation(self, instance):
+        prefetch_product_listing([instance], self.listing_parts())
         representation = super().to_representation(instance)
         request = self.context.get("request")
         if request and request.method == "GET":
             variants = instance.productvariant_set.all()
-            images = instance.images.first()
+            images = min(
+                instance.images.all(), key=lambda image: image.pk, default=None
+            )
             variants_data = ProductVariantSerializer(variants, many=True).data
             if len(variants_data) == 1:
                 representation["variants"] = variants_data[0]
@@ -235,8 +412,6 @@ class ProductByIdsSerializer(serializers.ModelSerializer):
             representation["images"] = ImageDataSerializer(
                 images, context=self.context
             ).data
-            representation["categoryname"] = self.get_categoryname(instance)
-            representation["colors"] = self.get_colors(instance)
         return representation
 
 
@@ -254,21 +429,25 @@ class ReviewImageWriteSerializer(serializers.ModelSerializer):
 
 class ReviewImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ReviewImage
         fields = "__all__"
 
+    def get_image_renditions(self, obj):
+        return rendition_set(obj.image_renditions, self.context.get("request"))
+
     def get_image(self, obj):
-        request = self.context.get("request")
-        if obj.image:
-            return (
-                request.build_absolute_uri(obj.image.url) if request else obj.image.url
-            )
-        return None
+        return rendition_url(
+            obj.image.name,
+            obj.image_renditions,
+            default_rendition(self.context),
+            self.context.get("request"),
+        )
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     review_images = ReviewImageSerializer(many=True, read_only=True)
     user = serializers.SerializerMethodField()
 
@@ -285,6 +464,10 @@ class ReviewSerializer(serializers.ModelSerializer):
             "review_images",
             "created_at",
         ]
+        field_profiles = {
+            "card": ["user", "rating", "title", "created_at"],
+            "detail": fields,
+        }
 
     def get_user(self, obj):
         return obj.user.first_name if obj.user else None
@@ -292,13 +475,28 @@ class ReviewSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         request = self.context.get("request")
-        if request and request.method == "GET":
+        if request and request.method == "GET" and self.wants("review_images"):
             representation["review_images"] = ReviewImageSerializer(
                 instance.review_images.all(), many=True, context=self.context
             ).data
         return representation
 
 
+class ProductRatingSerializer(serializers.ModelSerializer):
+    average = serializers.SerializerMethodField()
+    histogram = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductRating
+        fields = ["rating_count", "rating_sum", "average", "histogram"]
+
+    def get_average(self, obj):
+        return round(obj.average, 2) if obj.average is not None else None
+
+    def get_histogram(self, obj):
+        return {str(star): count for star, count in obj.histogram.items()}
+
+
 class NotifyUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = NotifyUser
@@ -306,12 +504,14 @@ class NotifyUserSerializer(serializers.ModelSerializer):
 
 
 class AddtoCartSerializer(serializers.ModelSerializer):
+    available = serializers.IntegerField(source="variant.available", read_only=True)
+
     class Meta:
         model = Cart
         fields = "__all__"
 
 
-class ReviewWithProductSerializer(serializers.ModelSerializer):
+class ReviewWithProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     product_name = serializers.SerializerMethodField()
     productslug = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
@@ -337,6 +537,10 @@ class ReviewWithProductSerializer(serializers.ModelSerializer):
             "category_name",
             "product_image",
         ]
+        field_profiles = {
+            "card": ["id", "rating", "title", "created_at", "product_name"],
+            "admin": fields,
+        }
 
     def get_product_name(self, obj):
         return obj.product.product_name if obj.product else None
@@ -360,7 +564,7 @@ class ReviewWithProductSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         request = self.context.get("request")
-        if request and request.method == "GET":
+        if request and request.method == "GET" and self.wants("review_images"):
             representation["review_images"] = ReviewImageSerializer(
                 instance.review_images.all(), many=True, context=self.context
             ).data
@@ -402,6 +606,7 @@ class LowStockVariantSerializer(serializers.ModelSerializer):
 class LowStockProductSerializer(serializers.ModelSerializer):
     low_stock_variants = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -412,6 +617,7 @@ class LowStockProductSerializer(serializers.ModelSerializer):
             "category",
             "productslug",
             "image",
+            "image_renditions",
             "low_stock_variants",
         ]
 
@@ -419,9 +625,25 @@ class LowStockProductSerializer(serializers.ModelSerializer):
         low_stock_variants = obj.productvariant_set.filter(stock__lt=5)
         return LowStockVariantSerializer(low_stock_variants, many=True).data
 
+    def _first_image(self, obj):
+        # images are prefetched by the view, so pick the first in Python
+        return min(obj.images.all(), key=lambda image: image.pk, default=None)
+
     def get_image(self, obj):
-        first_image = obj.images.first()
-        request = self.context.get("request")
-        return (
-            request.build_absolute_uri(first_image.image.url) if first_image else None
+        first_image = self._first_image(obj)
+        if first_image is None:
+            return None
+        return rendition_url(
+            first_image.image.name,
+            first_image.image_renditions,
+            "thumbnail",
+            self.context.get("request"),
+        )
+
+    def get_image_renditions(self, obj):
+        first_image = self._first_image(obj)
+        if first_image is None:
+            return None
+        return rendition_set(
+            first_image.image_renditions, self.context.get("request")
         )
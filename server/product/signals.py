@@ -0,0 +1,219 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from server.utils.cache import invalidate_tags
+from server.utils.renditions import renditions_ready
+
+from . import snapshots  # noqa: F401  (connects snapshot invalidation)
+from .cache import CATALOG_TAG, CATEGORY_TAG, bump_product_versions
+from .models import (
+    Category,
+    Product,
+    ProductColor,
+    ProductImage,
+    ProductVariant,
+    Review,
+    ReviewImage,
+)
+from .facets import refresh_facets
+from .ratings import apply_review_change
+from .search import reindex_products
+from .suggest import publish_changes
+from .summary import refresh_product_summaries
+
+
+class CommitBatch:
+    """
+    Collect product ids touched during a transaction and hand them to
+    ``handler`` once it commits, so several writes to one product cost a
+    single refresh. Ids left behind by a rollback go out with the next
+    flush, which is harmless because every handler recomputes from scratch.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.local = threading.local()
+
+    def add(self, *product_ids):
+        if not hasattr(self.local, "ids"):
+            self.local.ids = set()
+        self.local.ids.update(pid for pid in product_ids if pid is not None)
+        if self.local.ids and not self.registered():
+            connection = transaction.get_connection()
+            # Django swaps in a new hook list whenever it runs or drops
+            # hooks, so holding on to this one tells whether flush is
+            # still queued for the current transaction.
+            self.local.hooks = connection.run_on_commit
+            # Derived data can always be rebuilt, so a failing refresh is
+            # logged rather than failing the already-committed request.
+            transaction.on_commit(self.flush, robust=True)
+
+    def registered(self):
+        hooks = getattr(self.local, "hooks", None)
+        connection = transaction.get_connection()
+        return hooks is not None and hooks is connection.run_on_commit
+
+    def flush(self):
+        self.local.hooks = None
+        product_ids = getattr(self.local, "ids", None)
+        if not product_ids:
+            return
+        self.local.ids = set()
+        self.handler(product_ids)
+
+
+summary_batch = CommitBatch(refresh_product_summaries)
+search_batch = CommitBatch(reindex_products)
+facet_batch = CommitBatch(refresh_facets)
+version_batch = CommitBatch(bump_product_versions)
+suggest_batch = CommitBatch(publish_changes)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    if created:
+        summary_batch.add(instance.pk)
+    search_batch.add(instance.pk)
+    facet_batch.add(instance.pk)
+    version_batch.add(instance.pk)
+    suggest_batch.add(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    search_batch.add(instance.pk)
+    facet_batch.add(instance.pk)
+    version_batch.add(instance.pk)
+    suggest_batch.add(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    transaction.on_commit(lambda: invalidate_tags(CATEGORY_TAG))
+    transaction.on_commit(lambda: publish_changes(categories=True))
+    if not created:
+        product_ids = list(instance.product_set.values_list("id", flat=True))
+        search_batch.add(*product_ids)
+        facet_batch.add(*product_ids)
+        version_batch.add(*product_ids)
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    # Products are detached with a plain UPDATE, so collect them up front
+    product_ids = list(instance.product_set.values_list("id", flat=True))
+    search_batch.add(*product_ids)
+    facet_batch.add(*product_ids)
+    version_batch.add(*product_ids)
+    transaction.on_commit(lambda: invalidate_tags(CATEGORY_TAG))
+    transaction.on_commit(lambda: publish_changes(categories=True))
+
+
+@receiver(post_save, sender=ProductColor)
+@receiver(post_delete, sender=ProductColor)
+def color_changed(sender, instance, **kwargs):
+    product_ids = ProductVariant.objects.filter(
+        color_code=instance.color_code
+    ).values_list("product_id", flat=True)
+    version_batch.add(*set(product_ids))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def variant_changed(sender, instance, **kwargs):
+    summary_batch.add(instance.product_id)
+    search_batch.add(instance.product_id)
+    facet_batch.add(instance.product_id)
+    version_batch.add(instance.product_id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def product_child_changed(sender, instance, **kwargs):
+    summary_batch.add(instance.product_id)
+    version_batch.add(instance.product_id)
+
+
+@receiver(pre_save, sender=Review)
+def review_presave(sender, instance, **kwargs):
+    # Remember what the stored row contributed so post_save can move it
+    instance._rating_before = None
+    if instance.pk:
+        instance._rating_before = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list("product_id", "rating", "verified")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    apply_review_change(
+        getattr(instance, "_rating_before", None),
+        (instance.product_id, instance.rating, instance.verified),
+    )
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    apply_review_change(
+        (instance.product_id, instance.rating, instance.verified), None
+    )
+
+
+@receiver(post_save, sender=ReviewImage)
+@receiver(post_delete, sender=ReviewImage)
+def review_image_changed(sender, instance, **kwargs):
+    product_id = (
+        Review.objects.filter(pk=instance.review_id)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    version_batch.add(product_id)
+
+
+@receiver(renditions_ready, sender=ProductImage)
+def product_image_rendered(sender, instance_pk, **kwargs):
+    product_id = (
+        ProductImage.objects.filter(pk=instance_pk)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    # The summary carries the first image's renditions for listings
+    summary_batch.add(product_id)
+    version_batch.add(product_id)
+
+
+@receiver(renditions_ready, sender=ProductColor)
+def color_image_rendered(sender, instance_pk, **kwargs):
+    # Renditions are stored with a plain UPDATE, which the snapshot misses
+    snapshots.color_snapshot.invalidate()
+    product_ids = ProductVariant.objects.filter(color_code=instance_pk).values_list(
+        "product_id", flat=True
+    )
+    version_batch.add(*set(product_ids))
+
+
+@receiver(renditions_ready, sender=ReviewImage)
+def review_image_rendered(sender, instance_pk, **kwargs):
+    product_id = (
+        Review.objects.filter(review_images__pk=instance_pk)
+        .values_list("product_id", flat=True)
+        .first()
+    )
+    version_batch.add(product_id)
+
+
+@receiver(post_save, sender="sales.Saled_Products")
+@receiver(post_delete, sender="sales.Saled_Products")
+def saled_product_changed(sender, instance, **kwargs):
+    summary_batch.add(instance.product_id)
+    # Units sold rank typeahead suggestions
+    suggest_batch.add(instance.product_id)
+    # Units sold drive the bestselling order of product listings
+    transaction.on_commit(lambda: invalidate_tags(CATALOG_TAG))
@@ -0,0 +1,6 @@
+from server.utils.snapshot import TableSnapshot
+
+from .models import Category, ProductColor
+
+category_snapshot = TableSnapshot(Category, keys=("pk", "categoryslug"))
+color_snapshot = TableSnapshot(ProductColor)
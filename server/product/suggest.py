@@ -0,0 +1,278 @@
+import heapq
+import threading
+import time
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from server.utils.cache import ChangeFeed, broadcast
+
+from .search import tokenize
+
+SUGGESTION_LIMIT = 10
+# Deeper prefixes share one node; longer queries filter its entries
+MAX_PREFIX_DEPTH = 24
+KEYWORD_LIMIT = 1000
+KEYWORD_WINDOW_DAYS = 30
+KEYWORD_REFRESH_INTERVAL = 60 * 5
+POLL_INTERVAL = 1
+
+# Change feed channel; product ids and CATEGORIES travel on it
+CHANNEL = "suggest"
+CATEGORIES = "categories"
+
+
+def normalize(text):
+    return " ".join(tokenize(text))
+
+
+def _suffixes(text):
+    """Every word-start suffix, so "coat" also finds "Wool Coat"."""
+    tokens = tokenize(text)
+    return {" ".join(tokens[i:]) for i in range(len(tokens))}
+
+
+def _rank(item):
+    # Most popular first; on a tie the shorter, closer match wins
+    _, (score, text, _) = item
+    return score, -len(text)
+
+
+class _Node:
+    __slots__ = ("children", "terminal", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = {}  # key -> entry, for phrases ending at this node
+        self.top = []  # best (key, entry) pairs in this subtree
+
+
+class PrefixTrie:
+    """
+    Phrases indexed under every word start. Each node caches the best
+    SUGGESTION_LIMIT entries of its subtree, so a lookup is a walk down
+    the prefix and a slice, however many phrases share it.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.entries = {}  # key -> (score, text, payload)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _path(self, prefix, create=False):
+        node = self.root
+        path = [node]
+        for char in prefix[:MAX_PREFIX_DEPTH]:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = _Node()
+            node = child
+            path.append(node)
+        return path
+
+    def _retop(self, node):
+        candidates = dict(node.terminal)
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = heapq.nlargest(SUGGESTION_LIMIT, candidates.items(), key=_rank)
+
+    def _insert(self, key, entry):
+        self.entries[key] = entry
+        paths = []
+        for suffix in _suffixes(entry[1]):
+            path = self._path(suffix, create=True)
+            path[-1].terminal[key] = entry
+            paths.append(path)
+        return paths
+
+    def build(self, items):
+        """Load ``(key, text, score, payload)`` items in one pass."""
+        for key, text, score, payload in items:
+            self._insert(key, (score, text, payload))
+        stack = [(self.root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if visited:
+                self._retop(node)
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children.values())
+
+    def set(self, key, text, score, payload=None):
+        self.remove(key)
+        for path in self._insert(key, (score, text, payload)):
+            for node in reversed(path):
+                self._retop(node)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for suffix in _suffixes(entry[1]):
+            path = self._path(suffix)
+            if path is None:
+                continue
+            path[-1].terminal.pop(key, None)
+            for node in reversed(path):
+                self._retop(node)
+
+    def lookup(self, query, limit=SUGGESTION_LIMIT):
+        query = normalize(query)
+        if not query:
+            return []
+        path = self._path(query)
+        if path is None:
+            return []
+        node = path[-1]
+        if len(query) <= MAX_PREFIX_DEPTH:
+            return [entry for _, entry in node.top[:limit]]
+        matches = [
+            (key, entry)
+            for key, entry in list(node.terminal.items())
+            if any(suffix.startswith(query) for suffix in _suffixes(entry[1]))
+        ]
+        return [entry for _, entry in heapq.nlargest(limit, matches, key=_rank)]
+
+
+def _product_items(product_ids=None):
+    from .models import Product
+
+    products = Product.objects.filter(deactive=False)
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    for pk, name, slug, sold in products.values_list(
+        "id", "product_name", "productslug", "summary__units_sold"
+    ).iterator():
+        yield ("product", pk), name, sold or 0, slug
+
+
+def _category_items():
+    from .models import Category
+
+    categories = Category.objects.annotate(
+        products=Count("product", filter=Q(product__deactive=False))
+    ).values_list("id", "name", "categoryslug", "products")
+    for pk, name, slug, products in categories:
+        yield ("category", pk), name, products, slug
+
+
+def _keyword_items():
+    from account.models import KeywordTrend
+
+    since = timezone.localdate() - timezone.timedelta(days=KEYWORD_WINDOW_DAYS)
+    rows = (
+        KeywordTrend.objects.filter(day__gte=since)
+        .values("keyword")
+        .annotate(total=Sum("count"))
+        .order_by("-total")[:KEYWORD_LIMIT]
+    )
+    for row in rows:
+        yield ("keyword", row["keyword"]), row["keyword"], row["total"], None
+
+
+def _trie(items):
+    trie = PrefixTrie()
+    trie.build(items)
+    return trie
+
+
+class SuggestionIndex:
+    """Product, category and popular keyword tries, ranked by popularity."""
+
+    def __init__(self):
+        self.products = _trie(_product_items())
+        self.categories = _trie(_category_items())
+        self.keywords = _trie(_keyword_items())
+        self.keywords_at = time.monotonic()
+
+    def refresh_products(self, product_ids):
+        found = set()
+        for key, text, score, payload in _product_items(product_ids):
+            self.products.set(key, text, score, payload)
+            found.add(key[1])
+        for product_id in set(product_ids) - found:
+            self.products.remove(("product", product_id))
+
+    def refresh_categories(self):
+        self.categories = _trie(_category_items())
+
+    def refresh_keywords(self):
+        self.keywords = _trie(_keyword_items())
+        self.keywords_at = time.monotonic()
+
+    def suggest(self, query, limit=SUGGESTION_LIMIT):
+        return {
+            "products": [
+                {"product_name": text, "productslug": slug}
+                for _, text, slug in self.products.lookup(query, limit)
+            ],
+            "categories": [
+                {"name": text, "categoryslug": slug}
+                for _, text, slug in self.categories.lookup(query, limit)
+            ],
+            "keywords": [text for _, text, _ in self.keywords.lookup(query, limit)],
+        }
+
+
+def publish_changes(product_ids=(), categories=False):
+    """Tell every worker which products (or whether categories) changed."""
+    items = list(product_ids)
+    if categories:
+        items.append(CATEGORIES)
+    broadcast(CHANNEL, items)
+
+
+class _IndexHolder:
+    """
+    Per-process suggestion index. Built once, then kept current from the
+    suggest change feed; a worker that missed part of the feed rebuilds
+    from scratch. Popular keywords are reloaded every
+    KEYWORD_REFRESH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.feed = ChangeFeed(CHANNEL)
+        self.next_poll = 0
+        self.lock = threading.Lock()
+
+    def _rebuild(self):
+        self.feed.start()
+        self.index = SuggestionIndex()
+
+    def _catch_up(self):
+        changes = self.feed.changes()
+        if changes is None:
+            self._rebuild()
+            return
+        categories = CATEGORIES in changes
+        changes.discard(CATEGORIES)
+        if changes:
+            self.index.refresh_products(changes)
+        if categories:
+            self.index.refresh_categories()
+
+    def get(self):
+        now = time.monotonic()
+        if self.index is not None and now < self.next_poll:
+            return self.index
+        with self.lock:
+            if self.index is None:
+                self._rebuild()
+            elif now >= self.next_poll:
+                self._catch_up()
+                if now - self.index.keywords_at >= KEYWORD_REFRESH_INTERVAL:
+                    self.index.refresh_keywords()
+            self.next_poll = now + POLL_INTERVAL
+        return self.index
+
+
+_holder = _IndexHolder()
+
+
+def suggest(query, limit=SUGGESTION_LIMIT):
+    return _holder.get().suggest(query, limit)
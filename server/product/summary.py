@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Avg, Count, Sum
+
+from .models import Product, ProductImage, ProductSummary, ProductVariant, Review
+
+SUMMARY_FIELDS = [
+    "min_price",
+    "max_price",
+    "total_stock",
+    "units_sold",
+    "rating_avg",
+    "rating_count",
+    "colors",
+    "sizes",
+    "first_image",
+    "first_image_renditions",
+    "updated_at",
+]
+
+
+def effective_price(price, discount):
+    if not discount:
+        return price
+    return (price * (100 - discount) / 100).quantize(Decimal("0.01"))
+
+
+def refresh_product_summaries(product_ids):
+    """
+    Recompute ProductSummary rows for ``product_ids`` with one query per
+    source table and a single upsert, whatever the number of products.
+    """
+    product_ids = set(
+        Product.objects.filter(id__in=set(product_ids)).values_list("id", flat=True)
+    )
+    if not product_ids:
+        return
+
+    summaries = {
+        pid: ProductSummary(product_id=pid, colors=[], sizes=[])
+        for pid in product_ids
+    }
+    prices = {pid: [] for pid in product_ids}
+
+    variants = ProductVariant.objects.filter(product_id__in=product_ids).values_list(
+        "product_id", "price", "discount", "stock", "color_code", "color_name", "size"
+    )
+    for pid, price, discount, stock, color_code, color_name, size in variants:
+        summary = summaries[pid]
+        prices[pid].append(effective_price(price, discount))
+        summary.total_stock += stock
+        if color_code:
+            color = {"color_code": color_code, "color_name": color_name}
+            if color not in summary.colors:
+                summary.colors.append(color)
+        if size and size not in summary.sizes:
+            summary.sizes.append(size)
+
+    for pid, values in prices.items():
+        if values:
+            summaries[pid].min_price = min(values)
+            summaries[pid].max_price = max(values)
+
+    sold = (
+        ProductVariant.objects.filter(product_id__in=product_ids)
+        .values("product_id")
+        .annotate(sold=Sum("saled_products__qty"))
+    )
+    for row in sold:
+        summaries[row["product_id"]].units_sold = row["sold"] or 0
+
+    ratings = (
+        Review.objects.filter(product_id__in=product_ids, verified=True)
+        .values("product_id")
+        .annotate(avg=Avg("rating"), total=Count("id"))
+    )
+    for row in ratings:
+        summaries[row["product_id"]].rating_avg = row["avg"]
+        summaries[row["product_id"]].rating_count = row["total"]
+
+    images = (
+        ProductImage.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "id")
+        .values_list("product_id", "image", "image_renditions")
+    )
+    for pid, image, renditions in images:
+        if summaries[pid].first_image is None:
+            summaries[pid].first_image = image
+            summaries[pid].first_image_renditions = renditions
+
+    upsert = {"update_conflicts": True, "update_fields": SUMMARY_FIELDS}
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    if connection.features.supports_update_conflicts_with_target:
+        upsert["unique_fields"] = ["product"]
+    ProductSummary.objects.bulk_create(summaries.values(), **upsert)
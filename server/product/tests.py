@@ -1,3 +1,497 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.models import DeliveryAddress, SearchHistory, User
+from sales.models import Saled_Products, Sales
+
+from .cart import MERGE, REPLACE, sync_cart
+from .facets import FacetIndex, _FacetHolder, bitmap_ids
+from .models import (
+    Cart,
+    Category,
+    Product,
+    ProductColor,
+    ProductImage,
+    ProductVariant,
+    Review,
+)
+from .ratings import rebuild_ratings
+from .recommendations import rebuild_recommendations
+from .signals import CommitBatch
+from .summary import refresh_product_summaries
+
+CACHE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    CACHES={
+        "default": settings.CACHES["default"],
+        "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+    RECOMMENDATIONS_PATH=f"{CACHE_DIR}/recommendations.bin",
+    SEARCH_INDEX_PATH=f"{CACHE_DIR}/search_index.bin",
+)
+class ProductListingQueryCountTests(TestCase):
+    PRODUCTS = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("buyer@example.com", "Buy", "Er", "pw")
+        address = DeliveryAddress.objects.create(
+            user=cls.user, address="Street 1", country="NP", city="KTM", zipcode="1"
+        )
+        categories = [Category.objects.create(name=name) for name in ("Suits", "Coats")]
+        colors = [
+            ProductColor.objects.create(color_code=code, color_name=name)
+            for code, name in (("#000000", "Black"), ("#FFFFFF", "White"))
+        ]
+        cls.products = []
+        for i in range(cls.PRODUCTS):
+            product = Product.objects.create(
+                product_name=f"Wool Coat {i}",
+                description=f"A warm coat number {i}",
+                category=categories[i % 2],
+            )
+            cls.products.append(product)
+            for color in colors:
+                for size in ("S", "M"):
+                    ProductVariant.objects.create(
+                        product=product,
+                        color=color,
+                        color_code=color.color_code,
+                        color_name=color.color_name,
+                        size=size,
+                        price=100 + i,
+                        stock=3,
+                    )
+                ProductImage.objects.create(
+                    product=product, image="product_images/coat.webp", color=color
+                )
+            Review.objects.create(
+                product=product,
+                user=cls.user,
+                rating=1 + i % 5,
+                title="Warm",
+                content="Very warm",
+                verified=True,
+            )
+        # The user bought the first half of the catalog, three per order
+        for i in range(0, cls.PRODUCTS // 2, 3):
+            sale = Sales.objects.create(
+                costumer_name=cls.user,
+                transactionuid=f"order-{i}",
+                total_amt=1,
+                sub_total=1,
+                shipping=address,
+            )
+            for product in cls.products[i : i + 3]:
+                Saled_Products.objects.create(
+                    transition=sale,
+                    product=product,
+                    variant=product.productvariant_set.first(),
+                    price=1,
+                    qty=1,
+                    total=1,
+                )
+        SearchHistory.objects.create(user=cls.user, keyword="coat")
+        product_ids = [product.pk for product in cls.products]
+        refresh_product_summaries(product_ids)
+        rebuild_ratings(product_ids)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        rebuild_recommendations()
+        self.client.defaults["HTTP_ORIGIN"] = settings.FRONTEND_URL
+
+    def _get(self, url, queries, **headers):
+        """GET ``url`` from cold caches and check it took ``queries`` queries."""
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_product_list_queries_do_not_grow_with_page_size(self):
+        for page_size in (2, self.PRODUCTS):
+            data = self._get(f"/api/products/products/?page_size={page_size}", 6)
+            self.assertEqual(len(data["results"]), page_size)
+
+    def test_product_list_card_profile_queries(self):
+        for page_size in (2, self.PRODUCTS):
+            data = self._get(
+                f"/api/products/products/?page_size={page_size}&profile=card", 4
+            )
+            self.assertEqual(len(data["results"]), page_size)
+
+    def test_trending_queries(self):
+        data = self._get("/api/products/trending/", 8)
+        self.assertTrue(data)
+
+    def test_similar_products_queries(self):
+        product = self.products[0]
+        data = self._get(f"/api/products/recommendations/?product_id={product.pk}", 9)
+        self.assertTrue(data)
+
+    def test_recommended_products_queries(self):
+        token = RefreshToken.for_user(self.user).access_token
+        data = self._get(
+            "/api/products/recommendations/", 8, HTTP_AUTHORIZATION=f"Bearer {token}"
+        )
+        self.assertTrue(data)
+
+
+class ReviewCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("critic@example.com", "Cri", "Tic", "pw")
+        cls.product = Product.objects.create(
+            product_name="Wool Suit",
+            description="A wool suit",
+            category=Category.objects.create(name="Suits"),
+        )
+        Review.objects.bulk_create(
+            [
+                Review(
+                    product=cls.product,
+                    user=user,
+                    rating=1 + n % 3,
+                    title="Review",
+                    content=f"review {n}",
+                    verified=True,
+                )
+                for n in range(25)
+            ]
+        )
+
+    def _walk(self, **params):
+        url = f"/api/products/reviews/{self.product.productslug}/data/"
+        response = self.client.get(
+            url,
+            {"cursor": "", "page_size": 4, **params},
+            HTTP_ORIGIN=settings.FRONTEND_URL,
+        )
+        contents = []
+        while True:
+            data = response.json()
+            contents += [review["content"] for review in data["results"]]
+            if not data["next"]:
+                return contents
+            response = self.client.get(data["next"], HTTP_ORIGIN=settings.FRONTEND_URL)
+
+    def test_ties_on_a_non_unique_ordering_are_walked_by_primary_key(self):
+        expected = list(
+            Review.objects.filter(product=self.product)
+            .order_by("-rating", "-id")
+            .values_list("content", flat=True)
+        )
+        self.assertEqual(self._walk(filter="rating"), expected)
+
+    def test_walks_the_default_ordering(self):
+        expected = list(
+            Review.objects.filter(product=self.product)
+            .order_by("-id")
+            .values_list("content", flat=True)
+        )
+        self.assertEqual(self._walk(), expected)
+
+
+class FacetIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = FacetIndex()
+        products = [
+            (1, True, "#000000", "Black", "m", "suits", "in"),
+            (2, True, "#FFFFFF", "White", "m", "suits", "in"),
+            (3, True, "#000000", "Black", "l", "coats", "out"),
+            (4, False, "#FFFFFF", "White", "l", "coats", "in"),
+        ]
+        for pk, active, code, name, size, category, stock in products:
+            self.index.add(
+                pk,
+                active,
+                [
+                    ("color", code, name),
+                    ("size", size, size.upper()),
+                    ("category", category, category.title()),
+                    ("stock", stock, None),
+                ],
+            )
+
+    def _match(self, selections, base=None):
+        return bitmap_ids(self.index.match(selections, base))
+
+    def test_values_of_one_facet_are_ored(self):
+        self.assertEqual(self._match({"size": ["M"]}), [1, 2])
+        self.assertEqual(self._match({"color": ["black", "#ffffff"]}), [1, 2, 3, 4])
+
+    def test_facets_are_anded(self):
+        self.assertEqual(self._match({"color": ["black"], "size": ["l"]}), [3])
+        self.assertEqual(self._match({"category": ["coats"], "stock": ["in"]}), [4])
+        self.assertEqual(self._match({"color": ["black"], "stock": ["in"]}), [1])
+
+    def test_base_limits_the_match(self):
+        self.assertEqual(self._match({"size": ["l"]}, self.index.active), [3])
+
+    def test_removed_products_no_longer_match(self):
+        self.index.remove(3)
+        self.assertEqual(self._match({"color": ["black"]}), [1])
+        self.assertEqual(self._match({"category": ["coats"]}), [4])
+
+    def test_counts_ignore_the_facets_own_selection(self):
+        counts = self.index.counts({"color": ["black"], "size": ["m"]})
+
+        def values(facet):
+            return {entry["value"]: entry["count"] for entry in counts[facet]}
+
+        # Colors count within size M, sizes within black, the rest within both
+        self.assertEqual(values("color"), {"#000000": 1, "#FFFFFF": 1})
+        self.assertEqual(values("size"), {"m": 1, "l": 1})
+        self.assertEqual(values("category"), {"suits": 1})
+        self.assertEqual(counts["color"][0]["label"], "Black")
+
+
+@override_settings(
+    CACHES={
+        "default": settings.CACHES["default"],
+        "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+    SEARCH_INDEX_PATH=f"{CACHE_DIR}/search_index.bin",
+)
+class FacetFreshnessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            product_name="Wool Coat",
+            description="A warm coat",
+            category=Category.objects.create(name="Coats"),
+        )
+        cls.white = ProductColor.objects.create(
+            color_code="#FFFFFF", color_name="White"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_other_workers_see_a_write_under_the_new_catalog_version(self):
+        # Each holder stands in for the facet index of a separate worker
+        workers = [_FacetHolder(), _FacetHolder()]
+        for worker in workers:
+            self.assertEqual(worker.get().match({"color": ["white"]}), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductVariant.objects.create(
+                product=self.product,
+                color=self.white,
+                color_code=self.white.color_code,
+                color_name=self.white.color_name,
+                size="L",
+                price=100,
+                stock=1,
+            )
+        for worker in workers:
+            self.assertEqual(
+                bitmap_ids(worker.get().match({"color": ["white"], "size": ["l"]})),
+                [self.product.pk],
+            )
+
+    def test_a_worker_that_missed_the_feed_rebuilds(self):
+        worker = _FacetHolder()
+        worker.get()
+        ProductVariant.objects.create(
+            product=self.product,
+            color=self.white,
+            color_code=self.white.color_code,
+            color_name=self.white.color_name,
+            size="L",
+            price=100,
+            stock=1,
+        )
+        # The log was lost, but the catalog version still moved on
+        cache.clear()
+        self.assertEqual(
+            bitmap_ids(worker.get().match({"color": ["white"]})), [self.product.pk]
+        )
+
+
+class CartSyncTests(TransactionTestCase):
+    """sync_cart statuses per mode, capped at stock no checkout holds."""
+
+    STOCK = 5
+
+    def setUp(self):
+        self.user = User.objects.create_user("shopper@example.com", "Sho", "P", "pw")
+        self.product = Product.objects.create(
+            product_name="Wool Suit",
+            description="A wool suit",
+            category=Category.objects.create(name="Suits"),
+        )
+        color = ProductColor.objects.create(color_code="#000000", color_name="Black")
+        self.a, self.b, self.c = [
+            ProductVariant.objects.create(
+                product=self.product,
+                color=color,
+                color_code=color.color_code,
+                color_name=color.color_name,
+                size=size,
+                price=100,
+                stock=self.STOCK,
+            )
+            for size in ("S", "M", "L")
+        ]
+
+    def _line(self, variant, pcs):
+        return {"product": self.product.pk, "variant": variant.pk, "pcs": pcs}
+
+    def _sync(self, lines, mode="set"):
+        items = sync_cart(self.user, lines, mode)
+        return {item["variant"]: item for item in items}
+
+    def _cart(self):
+        return dict(
+            Cart.objects.filter(user=self.user).values_list("variant_id", "pcs")
+        )
+
+    def _statuses(self, result):
+        return {variant: item["status"] for variant, item in result.items()}
+
+    def test_set_reports_each_lines_status(self):
+        result = self._sync([self._line(self.a, 1), self._line(self.b, 0)])
+        self.assertEqual(
+            self._statuses(result), {self.a.pk: "added", self.b.pk: "unchanged"}
+        )
+
+        result = self._sync(
+            [
+                self._line(self.a, 2),
+                self._line(self.b, 1),
+                {"product": self.product.pk, "variant": 999999, "pcs": 1},
+            ]
+        )
+        self.assertEqual(
+            self._statuses(result),
+            {self.a.pk: "updated", self.b.pk: "added", 999999: "not_found"},
+        )
+        self.assertEqual(self._cart(), {self.a.pk: 2, self.b.pk: 1})
+
+        result = self._sync([self._line(self.a, 2), self._line(self.b, 0)])
+        self.assertEqual(
+            self._statuses(result), {self.a.pk: "unchanged", self.b.pk: "removed"}
+        )
+        self.assertEqual(self._cart(), {self.a.pk: 2})
+
+    def test_merge_adds_to_the_cart(self):
+        self._sync([self._line(self.a, 1)])
+
+        result = self._sync([self._line(self.a, 2), self._line(self.b, 1)], MERGE)
+
+        self.assertEqual(
+            self._statuses(result), {self.a.pk: "updated", self.b.pk: "added"}
+        )
+        self.assertEqual(result[self.a.pk]["requested"], 3)
+        self.assertEqual(self._cart(), {self.a.pk: 3, self.b.pk: 1})
+
+    def test_replace_drops_unlisted_lines(self):
+        self._sync([self._line(self.a, 1), self._line(self.b, 1)])
+
+        result = self._sync([self._line(self.b, 1), self._line(self.c, 2)], REPLACE)
+
+        self.assertEqual(
+            self._statuses(result),
+            {self.a.pk: "removed", self.b.pk: "unchanged", self.c.pk: "added"},
+        )
+        self.assertEqual(self._cart(), {self.b.pk: 1, self.c.pk: 2})
+
+    def test_quantities_are_capped_at_stock_less_held(self):
+        ProductVariant.objects.filter(pk=self.a.pk).update(held=2)
+        ProductVariant.objects.filter(pk=self.b.pk).update(held=self.STOCK)
+
+        result = self._sync([self._line(self.a, 10), self._line(self.b, 1)])
+
+        a, b = result[self.a.pk], result[self.b.pk]
+        self.assertEqual((a["status"], a["pcs"], a["available"]), ("added", 3, 3))
+        self.assertTrue(a["limited"])
+        self.assertEqual(
+            (b["status"], b["pcs"], b["available"]), ("out_of_stock", 0, 0)
+        )
+        self.assertEqual(self._cart(), {self.a.pk: 3})
+
+    def test_merge_is_capped_too(self):
+        ProductVariant.objects.filter(pk=self.a.pk).update(held=2)
+        self._sync([self._line(self.a, 2)])
+
+        result = self._sync([self._line(self.a, 2)], MERGE)
+
+        self.assertEqual(result[self.a.pk]["pcs"], 3)
+        self.assertTrue(result[self.a.pk]["limited"])
+        self.assertEqual(self._cart(), {self.a.pk: 3})
+
+    def test_concurrent_merges_add_up(self):
+        # Two tabs carrying a guest cart over at login
+        merges = 4
+        barrier = threading.Barrier(merges)
+
+        def merge():
+            try:
+                barrier.wait()
+                for _ in range(500):
+                    try:
+                        return self._sync([self._line(self.a, 1)], MERGE)
+                    except OperationalError:
+                        # SQLite turns a second writer away with its lock
+                        time.sleep(0.005)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=merge) for _ in range(merges)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self._cart(), {self.a.pk: merges})
+
+
+class CommitBatchTests(TransactionTestCase):
+    def setUp(self):
+        self.flushed = []
+        self.batch = CommitBatch(lambda ids: self.flushed.append(set(ids)))
+
+    def _hooks(self):
+        return [hook for _, hook, _ in connection.run_on_commit]
+
+    def test_registers_once_per_transaction(self):
+        with transaction.atomic():
+            for pid in range(1, 50):
+                self.batch.add(pid)
+            self.assertEqual(self._hooks().count(self.batch.flush), 1)
+
+        self.assertEqual(self.flushed, [set(range(1, 50))])
+
+    def test_reregisters_after_rollback(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.batch.add(1)
+            raise RuntimeError
+
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.batch.add(2)
+                raise RuntimeError
+            self.batch.add(3)
+
+        # The rolled back ids ride along with the next flush
+        self.assertEqual(self.flushed, [{1, 2, 3}])
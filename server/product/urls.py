@@ -24,6 +24,7 @@ urlpatterns = [
         name="admin-review-detail",
     ),
     path("recommendations/", RecommendationView.as_view(), name="recommendations"),
+    path("suggest/", SuggestView.as_view(), name="suggest"),
     path(
         "get_products_by_ids/",
         ProductViewSet.as_view({"get": "get_products_by_ids"}),
@@ -44,6 +45,11 @@ urlpatterns = [
         ReviewViewSet.as_view({"get": "get_user_reviews"}),
         name="user-reviews",
     ),
+    path(
+        "reviews/<str:product_slug>/summary/",
+        ReviewViewSet.as_view({"get": "summary"}),
+        name="review-summary",
+    ),
     path(
         "reviews/pending-reviews/",
         ReviewViewSet.as_view({"get": "pending_reviews"}),
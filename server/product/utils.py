@@ -1,8 +1,4 @@
 from django.core.exceptions import ValidationError
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-import sys
 import random
 import string
 from django.utils.text import slugify
@@ -11,19 +7,6 @@ def validate_image_format(image):
     if not image.name.lower().endswith('.png'):
         raise ValidationError('Only PNG images are allowed.')
 
-def compress_image(image, format='WEBP', quality=85):
-    try:
-        image_temporary = Image.open(image)
-        if image_temporary.mode != 'RGBA':
-            image_temporary = image_temporary.convert('RGBA')
-        output_io_stream = BytesIO()
-        image_temporary.save(output_io_stream, format=format, optimize=True, quality=quality, lossless=True)
-        output_io_stream.seek(0)
-        image = InMemoryUploadedFile(output_io_stream, 'ImageField', f"{image.name.split('.')[0]}.{format.lower()}", f'image/{format.lower()}', sys.getsizeof(output_io_stream), None)
-    except Exception as e:
-        raise ValidationError(f'Error processing image: {e}')
-    return image
-
 def remove_space(s):
     return "".join(s.split())
 
@@ -1,13 +1,11 @@
-from collections import Counter
+import io
 
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
-from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models import Case, Count, IntegerField, Q, When
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
-from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
@@ -17,18 +15,43 @@ from rest_framework.permissions import (
     SAFE_METHODS,
     AllowAny,
     BasePermission,
+    IsAdminUser,
     IsAuthenticated,
 )
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from account.models import SearchHistory, User
+from account.models import User
+from account.trending import top_keywords
 from account.utils import send_email
 from sales.models import Saled_Products
+from server.utils.cache import (
+    cached_response,
+    conditional_response,
+    tagged_versions,
+)
 from server.utils.encryption import encrypt_response
+from server.utils.idempotency import idempotent
+from server.utils.pagination import CursorOptInMixin
 
 from .models import *
+from .cart import SET, CartSyncError, sync_cart
+from .catalog import FORMATS, CatalogImport, catalog_format, export_chunks, read_rows
+from .cache import (
+    CATALOG_TAG,
+    CATEGORY_TAG,
+    catalog_versions,
+    detail_versions,
+    get_cached_detail,
+    set_cached_detail,
+    trending_versions,
+)
+from .facets import bitmap_ids, get_facet_index, ids_bitmap
+from .recommendations import get_recommendation_model
+from .search import search_products
+from .suggest import suggest
 from .serializers import *
+from .snapshots import category_snapshot, color_snapshot
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -37,6 +60,10 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class CursorResultsSetPagination(CursorOptInMixin, StandardResultsSetPagination):
+    pass
+
+
 class CustomReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
@@ -60,7 +87,16 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return CategoryViewSerializer
         return CategorySerializer
 
+    @conditional_response(tagged_versions(CATEGORY_TAG))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response(tagged_versions(CATEGORY_TAG))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(methods=["get"], detail=False, permission_classes=[AllowAny])
+    @conditional_response(tagged_versions(CATEGORY_TAG))
     def get_category(self, request, *args, **kwargs):
         self.pagination_class = StandardResultsSetPagination
         name_filter = request.query_params.get("name", None)
@@ -117,12 +153,9 @@ class ProductColorViewSet(viewsets.ModelViewSet):
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Product.objects.select_related("category")
-        .prefetch_related("productvariant_set__color", "reviews")
-        .all()
-        .order_by("-id")
-    )
+    # Variants, images and ratings are loaded by ProductSerializer for just
+    # the fields a request renders (see prefetch_product_listing)
+    queryset = Product.objects.select_related("category").all().order_by("-id")
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
@@ -161,6 +194,52 @@ class ProductViewSet(viewsets.ModelViewSet):
                 transaction.set_rollback(True)
                 return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+    )
+    def import_catalog(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Upload a CSV or JSONL file as 'file'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        file_format = catalog_format(request.data.get("type"), upload.name)
+        if file_format is None:
+            return Response(
+                {"error": "Only CSV and JSONL files can be imported."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        dry_run = request.data.get("dry_run", "false").lower() == "true"
+        fh = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        report = CatalogImport(dry_run=dry_run).run(read_rows(fh, file_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export_catalog(self, request):
+        # "format" is taken by DRF's content negotiation
+        file_format = request.query_params.get("type", "csv")
+        if file_format not in FORMATS:
+            return Response(
+                {"error": "type must be csv or jsonl."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response = StreamingHttpResponse(
+            export_chunks(file_format), content_type=FORMATS[file_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="catalog.{file_format}"'
+        )
+        return response
+
     def _extract_variants_data(self, data):
         variants_data = []
         index = 0
@@ -214,6 +293,10 @@ class ProductViewSet(viewsets.ModelViewSet):
         if not normalized:
             return None, color_name, None
 
+        color_obj = color_snapshot.get(normalized)
+        if color_obj and color_name in (None, "", color_obj.color_name):
+            return normalized, color_obj.color_name, color_obj
+
         defaults = {"color_name": color_name or "Color"}
         color_obj, created = ProductColor.objects.get_or_create(
             color_code=normalized,
@@ -293,27 +376,23 @@ class ProductViewSet(viewsets.ModelViewSet):
             if not queryset.exists():
                 raise Http404("Product not found")
             return queryset
-        filters = Q()
-
-        if search:
-            filters &= Q(product_name__icontains=search) | Q(
-                description__icontains=search
-            )
-
-        filters &= self._build_category_filters(params)
+        filters = self._build_category_filters(params)
         filters &= self._build_price_filters(params)
-        filters &= self._build_attribute_filters(params)
 
-        queryset = queryset.annotate(
-            min_variant_price=Min("productvariant__price"),
-            max_variant_price=Max("productvariant__price"),
-            sales_count=Sum("productvariant__saled_products__qty"),
-            total_variant_stock=Sum("productvariant__stock"),
-        )
-
-        queryset = self._apply_ordering(queryset, params.get("filter"))
+        ordering = params.get("filter")
+        if search:
+            ranked_ids = search_products(search)
+            filters &= Q(id__in=ranked_ids)
+        if search and not ordering:
+            queryset = queryset.order_by(self._relevance_ordering(ranked_ids))
+        else:
+            queryset = self._apply_ordering(queryset, ordering)
 
-        queryset = queryset.filter(filters).distinct()
+        queryset = queryset.filter(filters)
+        selections = self._facet_selections(params)
+        if any(selections.values()):
+            matched = get_facet_index().match(selections)
+            queryset = queryset.filter(id__in=bitmap_ids(matched))
         return queryset
 
     def _build_category_filters(self, params):
@@ -321,10 +400,23 @@ class ProductViewSet(viewsets.ModelViewSet):
         category = params.get("category")
         categoryslug = params.get("categoryslug")
 
+        # Resolve category matches against the snapshot to skip the join
         if category:
-            filters &= Q(category__name__icontains=category)
+            needle = category.lower()
+            filters &= Q(
+                category_id__in=[
+                    c.pk for c in category_snapshot.all() if needle in c.name.lower()
+                ]
+            )
         if categoryslug:
-            filters &= Q(category__categoryslug__icontains=categoryslug)
+            needle = categoryslug.lower()
+            filters &= Q(
+                category_id__in=[
+                    c.pk
+                    for c in category_snapshot.all()
+                    if c.categoryslug and needle in c.categoryslug.lower()
+                ]
+            )
 
         return filters
 
@@ -334,66 +426,62 @@ class ProductViewSet(viewsets.ModelViewSet):
         price_filter = Q()
 
         if min_price:
-            price_filter &= Q(productvariant__price__gte=min_price)
+            price_filter &= Q(summary__max_price__gte=min_price)
         if max_price:
-            price_filter &= Q(productvariant__price__lte=max_price)
+            price_filter &= Q(summary__min_price__lte=max_price)
 
         return price_filter
 
-    def _build_attribute_filters(self, params):
-        """Build attribute-related filters like color, size, and metal."""
-        filters = Q()
-
-        # Color filter prioritizes variant fields; falls back to description markers
-        color_param = params.get("color", "")
-        color_values = [v.strip() for v in color_param.split(",") if v.strip()]
-        color_values += [v.strip() for v in params.getlist("color") if v.strip()]
-        if color_values:
-            color_filter = Q()
-            for value in color_values:
-                normalized = value.upper()
-                if not normalized.startswith("#"):
-                    normalized = (
-                        f"#{normalized}" if len(normalized) in (3, 6, 7) else normalized
-                    )
-                color_filter |= Q(productvariant__color_code__iexact=normalized)
-                color_filter |= Q(productvariant__color_name__iexact=value)
-                color_filter |= Q(description__icontains=f"#{value}")
-            filters &= color_filter
-
-        size_param = params.get("size", "")
-        size_values = [v.strip() for v in size_param.split(",") if v.strip()]
-        size_values += [v.strip() for v in params.getlist("size") if v.strip()]
-        if size_values:
-            size_filter = Q()
-            for value in size_values:
-                size_filter |= Q(productvariant__size__iexact=value)
-                size_filter |= Q(description__icontains=f"#{value}")
-            filters &= size_filter
-
-        metal_param = params.get("metal", "")
-        metal_values = [v.strip() for v in metal_param.split(",") if v.strip()]
-        metal_values += [v.strip() for v in params.getlist("metal") if v.strip()]
-        if metal_values:
-            metal_filter = Q()
-            for value in metal_values:
-                metal_filter |= Q(description__icontains=f"#{value}")
-            filters &= metal_filter
+    def _param_values(self, params, key):
+        values = []
+        for raw in params.getlist(key):
+            values += [v.strip() for v in raw.split(",") if v.strip()]
+        return list(dict.fromkeys(values))
 
+    def _facet_selections(self, params):
+        """
+        Color, size, metal (description hashtags) and stock filters, resolved
+        against the in-memory facet index instead of variant joins.
+        """
         stock_filter = params.get("stock")
-        if stock_filter == "in":
-            filters &= Q(total_variant_stock__gt=0)
-        elif stock_filter == "out":
-            filters &= Q(total_variant_stock__lte=0)
+        return {
+            "color": self._param_values(params, "color"),
+            "size": self._param_values(params, "size"),
+            "tag": self._param_values(params, "metal"),
+            "stock": [stock_filter] if stock_filter in ("in", "out") else [],
+        }
 
-        return filters
+    def _facet_counts(self, params):
+        facet_index = get_facet_index()
+        user = self.request.user
+        base = facet_index.all if user.is_staff else facet_index.active
+        if params.get("search") or any(
+            params.get(key)
+            for key in ("category", "categoryslug", "min_price", "max_price")
+        ):
+            queryset = Product.objects.filter(
+                self._build_category_filters(params)
+                & self._build_price_filters(params)
+            )
+            if params.get("search"):
+                queryset = queryset.filter(id__in=search_products(params["search"]))
+            base &= ids_bitmap(queryset.values_list("id", flat=True))
+        return facet_index.counts(self._facet_selections(params), base)
+
+    def _relevance_ordering(self, ranked_ids):
+        if not ranked_ids:
+            return "-id"
+        return Case(
+            *[When(id=pk, then=rank) for rank, pk in enumerate(ranked_ids)],
+            output_field=IntegerField(),
+        )
 
     def _apply_ordering(self, queryset, order_by):
         ordering_map = {
-            "bestselling": "-sales_count",
+            "bestselling": "-summary__units_sold",
             "newin": "-id",
-            "hightolow": "-min_variant_price",
-            "lowtohigh": "min_variant_price",
+            "hightolow": "-summary__min_price",
+            "lowtohigh": "summary__min_price",
         }
         return queryset.order_by(ordering_map.get(order_by, "-id"))
 
@@ -501,15 +589,9 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def get_trending_products(self):
-        past_week = timezone.now() - timezone.timedelta(days=7)
-        trending_keywords = (
-            SearchHistory.objects.filter(search_date__gte=past_week)
-            .values("keyword")
-            .annotate(count=Count("keyword"))
-            .order_by("-count")[:5]
-        )
+        trending_keywords = top_keywords(days=7, limit=5)
         if trending_keywords:
-            keyword = trending_keywords[0]["keyword"]
+            keyword = trending_keywords[0]
             trending_products = Product.objects.filter(
                 Q(product_name__icontains=keyword)
             ).distinct()[:10]
@@ -517,94 +599,65 @@ class ProductViewSet(viewsets.ModelViewSet):
             trending_products = Product.objects.none()
         return trending_products
 
-    @action(detail=False, methods=["get"], permission_classes=[AllowAny])
-    def get_products_by_ids(self, request):
+    def _products_by_ids(self, request):
+        """
+        Render the products named by ``?ids=`` in the order they were
+        requested, listing ids that match no product under ``missing``.
+        """
         ids = request.query_params.get("ids", None)
-        all_flag = request.query_params.get("all", "false").lower() == "true"
-        if ids:
-            ids_list = ids.split(",")
-            queryset = self.queryset.filter(id__in=ids_list)
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                serializer = (
-                    self.get_serializer(
-                        page,
-                        many=True,
-                        context={"request": request, "is_detail": False},
-                    )
-                    if all_flag
-                    else ProductByIdsSerializer(
-                        page,
-                        many=True,
-                        context={"request": request, "is_detail": False},
-                    )
-                )
-                return self.get_paginated_response(serializer.data)
-            serializer = (
-                self.get_serializer(
-                    queryset,
-                    many=True,
-                    context={"request": request, "is_detail": False},
-                )
-                if all_flag
-                else ProductByIdsSerializer(
-                    queryset,
-                    many=True,
-                    context={"request": request, "is_detail": False},
-                )
-            )
-            return Response(serializer.data)
-        else:
+        if not ids:
             return Response(
                 {"error": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST
             )
+        requested = list(
+            dict.fromkeys(pk.strip() for pk in ids.split(",") if pk.strip())
+        )
+        ids_list = [int(pk) for pk in requested if pk.isdigit()]
+        queryset = self.queryset.filter(id__in=ids_list).order_by(
+            self._relevance_ordering(ids_list)
+        )
+        found = set(queryset.values_list("id", flat=True))
+        missing = [
+            int(pk) if pk.isdigit() else pk
+            for pk in requested
+            if not pk.isdigit() or int(pk) not in found
+        ]
+
+        all_flag = request.query_params.get("all", "false").lower() == "true"
+        serializer_class = (
+            self.get_serializer_class() if all_flag else ProductByIdsSerializer
+        )
+        context = {"request": request, "is_detail": False}
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = serializer_class(page, many=True, context=context)
+            response = self.get_paginated_response(serializer.data)
+            response.data["missing"] = missing
+            return response
+        serializer = serializer_class(queryset, many=True, context=context)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["get"], permission_classes=[AllowAny])
+    def get_products_by_ids(self, request):
+        return self._products_by_ids(request)
 
     @encrypt_response
     @action(detail=False, methods=["get"], permission_classes=[IsAuthenticated])
     def checkout_products(self, request):
-        ids = request.query_params.get("ids", None)
-        all_flag = request.query_params.get("all", "false").lower() == "true"
-        if ids:
-            ids_list = ids.split(",")
-            queryset = self.queryset.filter(id__in=ids_list)
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                serializer = (
-                    self.get_serializer(
-                        page,
-                        many=True,
-                        context={"request": request, "is_detail": False},
-                    )
-                    if all_flag
-                    else ProductByIdsSerializer(
-                        page,
-                        many=True,
-                        context={"request": request, "is_detail": False},
-                    )
-                )
-                return self.get_paginated_response(serializer.data)
-            serializer = (
-                self.get_serializer(
-                    queryset,
-                    many=True,
-                    context={"request": request, "is_detail": False},
-                )
-                if all_flag
-                else ProductByIdsSerializer(
-                    queryset,
-                    many=True,
-                    context={"request": request, "is_detail": False},
-                )
-            )
-            return Response(serializer.data)
-        else:
-            return Response(
-                {"error": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST
-            )
+        return self._products_by_ids(request)
+
+    def _detail_response(self, request, productslug=None):
+        """
+        Serve product detail from the cache, keyed by product and version.
+        Staff bypass it since they also see deactivated products.
+        """
+        pk = None if productslug else self.kwargs.get(self.lookup_field)
+        use_cache = not request.user.is_staff
+        if use_cache:
+            data = get_cached_detail(request, productslug=productslug, pk=pk)
+            if data is not None:
+                return Response(data, headers={"X-Cache": "HIT"})
 
-    @method_decorator(cache_page(60 * 15))
-    def retrieve(self, request, *args, **kwargs):
-        productslug = request.query_params.get("productslug")
         if productslug:
             instance = get_object_or_404(self.get_queryset(), productslug=productslug)
         else:
@@ -612,16 +665,23 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(
             instance, context={"request": request, "is_detail": True}
         )
-        return Response(serializer.data)
+        if use_cache:
+            set_cached_detail(request, instance, serializer.data)
+        return Response(
+            serializer.data, headers={"X-Cache": "MISS" if use_cache else "BYPASS"}
+        )
+
+    @conditional_response(detail_versions)
+    def retrieve(self, request, *args, **kwargs):
+        return self._detail_response(
+            request, productslug=request.query_params.get("productslug")
+        )
 
+    @conditional_response(catalog_versions)
     def list(self, request, *args, **kwargs):
         productslug = request.query_params.get("productslug")
         if productslug:
-            instance = get_object_or_404(self.get_queryset(), productslug=productslug)
-            serializer = self.get_serializer(
-                instance, context={"request": request, "is_detail": True}
-            )
-            return Response(serializer.data)
+            return self._detail_response(request, productslug=productslug)
         else:
             queryset = self.filter_queryset(self.get_queryset())
             page = self.paginate_queryset(queryset)
@@ -629,7 +689,10 @@ class ProductViewSet(viewsets.ModelViewSet):
                 serializer = self.get_serializer(
                     page, many=True, context={"request": request, "is_detail": False}
                 )
-                return self.get_paginated_response(serializer.data)
+                response = self.get_paginated_response(serializer.data)
+                if request.query_params.get("facets") == "true":
+                    response.data["facets"] = self._facet_counts(request.query_params)
+                return response
 
             serializer = self.get_serializer(
                 queryset, many=True, context={"request": request, "is_detail": False}
@@ -645,39 +708,46 @@ class ProductViewSet(viewsets.ModelViewSet):
         )
 
 
-def get_recommended_products(self, user):
-    search_history = SearchHistory.objects.filter(user=user).values_list(
-        "keyword", flat=True
-    )
-    if not search_history:
-        return Product.objects.order_by("?")[:5]
-    keyword_counter = Counter(search_history)
-    most_searched_keywords = [keyword for keyword, _ in keyword_counter.most_common(3)]
-    query = Q()
-    for keyword in most_searched_keywords:
-        query |= Q(product_name__icontains=keyword)
-    recommended_products = Product.objects.filter(query).distinct()[:10]
-    return recommended_products
+RECOMMENDATION_LIMIT = 10
 
 
-class TrendingView(APIView):
-    def get(self, request, format=None):
-        past_week = timezone.now() - timezone.timedelta(days=7)
-        trending_keywords = (
-            SearchHistory.objects.filter(search_date__gte=past_week)
-            .values("keyword")
-            .annotate(count=Count("keyword"))
-            .order_by("-count")[:5]
+def _products_in_order(product_ids):
+    if not product_ids:
+        return Product.objects.none()
+    return Product.objects.filter(id__in=product_ids).order_by(
+        Case(
+            *[When(id=pk, then=rank) for rank, pk in enumerate(product_ids)],
+            output_field=IntegerField(),
         )
-        if not trending_keywords:
-            trending_keywords = (
-                SearchHistory.objects.values("keyword")
-                .annotate(count=Count("keyword"))
-                .order_by("-count")[:5]
+    )
+
+
+def get_recommended_products(user, product_id=None, limit=RECOMMENDATION_LIMIT):
+    """
+    Products bought together with ``product_id`` or, without one, with
+    what ``user`` ordered recently, looked up in the offline co-purchase
+    model and topped up from its popularity list.
+    """
+    if product_id:
+        seeds = [product_id]
+    else:
+        seeds = list(
+            Saled_Products.objects.filter(
+                transition__costumer_name=user, product__isnull=False
             )
+            .order_by("-id")
+            .values_list("product_id", flat=True)[:20]
+        )
+    return _products_in_order(get_recommendation_model().recommend(seeds, limit))
 
+
+class TrendingView(APIView):
+    @conditional_response(trending_versions)
+    @cached_response(tags=[CATALOG_TAG], timeout=60 * 5)
+    def get(self, request, format=None):
+        trending_keywords = top_keywords(days=7, limit=5, fallback=True)
         if trending_keywords:
-            keyword = trending_keywords[0]["keyword"]
+            keyword = trending_keywords[0]
             trending_products = Product.objects.filter(
                 Q(product_name__icontains=keyword)
             ).distinct()
@@ -693,6 +763,18 @@ class TrendingView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class SuggestView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, format=None):
+        query = request.query_params.get("q", "")
+        try:
+            limit = min(max(int(request.query_params.get("limit", 5)), 1), 10)
+        except ValueError:
+            limit = 5
+        return Response(suggest(query, limit), status=status.HTTP_200_OK)
+
+
 class RecommendationView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -722,32 +804,28 @@ class RecommendationView(APIView):
     def get_similar_products(self, product_id):
         try:
             product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
+        except (Product.DoesNotExist, ValueError):
             return Response(
                 {"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND
             )
-        similar_products = Product.objects.filter(category=product.category).exclude(
-            id=product_id
-        )[:10]
-        return similar_products
+        similar_ids = get_recommendation_model().similar(
+            product.id, RECOMMENDATION_LIMIT
+        )
+        # Products nobody bought with this one yet fall back to its category
+        if len(similar_ids) < RECOMMENDATION_LIMIT:
+            similar_ids += (
+                Product.objects.filter(category=product.category)
+                .exclude(id__in=[product.id, *similar_ids])
+                .values_list("id", flat=True)[: RECOMMENDATION_LIMIT - len(similar_ids)]
+            )
+        return _products_in_order(similar_ids)
 
     def get_recommended_products(self, user, product_id=None):
-        search_history = SearchHistory.objects.filter(user=user).values_list(
-            "keyword", flat=True
-        )
-        if not search_history:
-            return Product.objects.order_by("?")[:5]
-        keyword_counter = Counter(search_history)
-        most_searched_keywords = [
-            keyword for keyword, _ in keyword_counter.most_common(3)
-        ]
-        query = Q()
-        for keyword in most_searched_keywords:
-            query |= Q(product_name__icontains=keyword)
-        recommended_products = Product.objects.filter(query).distinct()
-        if product_id:
-            recommended_products = recommended_products.exclude(id=product_id)
-        return recommended_products[:10]
+        try:
+            product_id = int(product_id) if product_id else None
+        except ValueError:
+            product_id = None
+        return get_recommended_products(user, product_id)
 
 
 class ProductVariantViewSet(viewsets.ModelViewSet):
@@ -767,6 +845,10 @@ class ProductVariantViewSet(viewsets.ModelViewSet):
         normalized = self._normalize_color_code(color_code)
         if not normalized:
             return None, None
+        color_obj = color_snapshot.get(normalized)
+        if color_obj and color_name in (None, "", color_obj.color_name):
+            return normalized, color_obj
+
         defaults = {"color_name": color_name or "Color"}
         color_obj, _ = ProductColor.objects.get_or_create(
             color_code=normalized, defaults=defaults
@@ -1048,10 +1130,10 @@ class ReviewPostViewSet(viewsets.ModelViewSet):
 class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.select_related("product", "user").all().order_by("-id")
     serializer_class = ReviewSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CursorResultsSetPagination
 
     def get_permissions(self):
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "summary"]:
             return [permissions.AllowAny()]
         if self.action in ["get_user_reviews", "pending_reviews"]:
             return [IsAuthenticated()]
@@ -1107,6 +1189,21 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def summary(self, request, *args, **kwargs):
+        """Verified rating histogram of a product, read from ProductRating."""
+        product_slug = self.kwargs.get("product_slug")
+        ratings = ProductRating.objects.filter(
+            product__productslug=product_slug
+        ).first()
+        if ratings is None:
+            if not Product.objects.filter(productslug=product_slug).exists():
+                return Response(
+                    {"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND
+                )
+            ratings = ProductRating()
+        return Response(ProductRatingSerializer(ratings).data)
+
     @action(detail=False, methods=["get"])
     def get_user_reviews(self, request, *args, **kwargs):
         user = request.user
@@ -1298,25 +1395,39 @@ class AddToCartViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return self.queryset.filter(user=self.request.user)
 
+    @idempotent("cart.create")
     def create(self, request, *args, **kwargs):
-        items = request.data.get("items", [])
-        user = request.user
-        cart_items = []
-
-        for item in items:
-            product = get_object_or_404(Product, id=item["id"])
-            variant = get_object_or_404(ProductVariant, id=item["variantId"])
-            pcs = item["pcs"]
-            existing_cart_item = Cart.objects.filter(
-                user=user, product=product, variant=variant
+        try:
+            items = sync_cart(request.user, request.data.get("items", []))
+        except CartSyncError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        failed = ("out_of_stock", "not_found")
+        if items and all(item["status"] in failed for item in items):
+            return Response(
+                {"error": "Not enough stock available", "items": items},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            if existing_cart_item.exists():
-                existing_cart_item.delete()
-            cart_item = Cart(user=user, product=product, variant=variant, pcs=pcs)
-            cart_items.append(cart_item)
+        return Response(
+            {"msg": "Added to Cart", "items": items}, status=status.HTTP_201_CREATED
+        )
 
-        Cart.objects.bulk_create(cart_items)
-        return Response({"msg": "Added to Cart"}, status=status.HTTP_201_CREATED)
+    @action(detail=False, methods=["post"], url_path="sync")
+    @idempotent("cart.sync")
+    def sync(self, request):
+        """
+        Upsert the whole client cart in one request: ``items`` as
+        ``{product, variant, pcs}`` and ``mode`` set, merge (carry a guest
+        cart over at login) or replace. Returns each line's status.
+        """
+        try:
+            items = sync_cart(
+                request.user,
+                request.data.get("items", []),
+                request.data.get("mode", SET),
+            )
+        except CartSyncError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"items": items}, status=status.HTTP_200_OK)
 
     def perform_create(self, serializer):
         serializer.save()
@@ -1329,7 +1440,7 @@ class AddToCartViewSet(viewsets.ModelViewSet):
         )
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        if serializer.validated_data["pcs"] > instance.variant.stock:
+        if serializer.validated_data["pcs"] > instance.variant.available:
             return Response(
                 {"error": "Not enough stock available"},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -1382,9 +1493,11 @@ class StocksView(APIView):
             self.permission_denied(request, message="Admin access required.")
 
     def get(self, request, *args, **kwargs):
-        low_stock_products = Product.objects.filter(
-            productvariant__stock__lt=5
-        ).distinct()
+        low_stock_products = (
+            Product.objects.filter(productvariant__stock__lt=5)
+            .distinct()
+            .prefetch_related("images")
+        )
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(low_stock_products, request)
         serializer = LowStockProductSerializer(
@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.http import Http404
+
+from product.models import Product, ProductVariant, StockHold
+from product.reservations import clear_holds, hold_stock, lock_variants, token_variants
+from product.signals import facet_batch, suggest_batch, summary_batch, version_batch
+
+from .models import Saled_Products
+
+
+class CheckoutError(Exception):
+    """A line item the order can't be placed with."""
+
+    def __init__(self, message, items=()):
+        super().__init__(message)
+        self.message = message
+        self.items = list(items)
+
+
+def _quantities(items):
+    """
+    ``{variant_id: (product_id, qty)}`` in first-seen order, merging lines
+    that repeat a variant.
+    """
+    lines = {}
+    for item in items:
+        try:
+            variant_id = int(item["variant"])
+            product_id = int(item["product"])
+            qty = int(item["pcs"])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError("Every item needs a product, a variant and pcs.")
+        if qty <= 0:
+            raise CheckoutError("Quantities must be positive.")
+        if variant_id in lines and lines[variant_id][0] != product_id:
+            raise Http404("No ProductVariant matches the given query.")
+        previous = lines.get(variant_id, (product_id, 0))[1]
+        lines[variant_id] = (product_id, previous + qty)
+    return lines
+
+
+def _variant_label(product_name, variant):
+    return f"{product_name} ({variant.size or variant.color_name})"
+
+
+def _products_changed(product_ids):
+    # Stock and sales moved through bulk queries, which send no signals
+    summary_batch.add(*product_ids)
+    facet_batch.add(*product_ids)
+    version_batch.add(*product_ids)
+    suggest_batch.add(*product_ids)
+
+
+def _prepare(lines, token, user=None):
+    """
+    Lock the variants of ``lines`` (and of ``token``'s current holds) in
+    primary key order, so concurrent checkouts queue on the same rows in
+    the same order instead of deadlocking. Expired holds and ``token``'s
+    own are dropped, then every line short of available stock is reported
+    at once. Returns the variants by id.
+    """
+    if not lines:
+        raise CheckoutError("The order has no items.")
+    locked = lock_variants(set(lines) | token_variants(token, user))
+    clear_holds(locked, token, user)
+
+    variants = ProductVariant.objects.in_bulk(lines)
+    product_names = dict(
+        Product.objects.filter(
+            id__in={product_id for product_id, _ in lines.values()}
+        ).values_list("id", "product_name")
+    )
+    for variant_id, (product_id, _) in lines.items():
+        variant = variants.get(variant_id)
+        if product_id not in product_names:
+            raise Http404("No Product matches the given query.")
+        if variant is None or variant.product_id != product_id:
+            raise Http404("No ProductVariant matches the given query.")
+
+    short = [
+        {
+            "product": product_id,
+            "variant": variant_id,
+            "name": _variant_label(product_names[product_id], variants[variant_id]),
+            "requested": qty,
+            "available": variants[variant_id].available,
+        }
+        for variant_id, (product_id, qty) in lines.items()
+        if variants[variant_id].available < qty
+    ]
+    if short:
+        names = ", ".join(item["name"] for item in short)
+        raise CheckoutError(f"Not enough stock for {names}.", short)
+    return variants
+
+
+def reserve_stock(token, user, items):
+    """
+    Hold ``items`` for the checkout ``token`` (the order's transactionuid)
+    and return when the hold expires. Reserving again replaces the
+    checkout's previous holds, which also extends them.
+    """
+    lines = _quantities(items)
+    with transaction.atomic():
+        if StockHold.objects.filter(token=token).exclude(user=user).exists():
+            raise CheckoutError("This checkout belongs to another user.")
+        _prepare(lines, token, user)
+        return hold_stock(token, user, lines)
+
+
+def deduct_stock(sale, items):
+    """
+    Deduct stock for ``items`` and record them as lines of ``sale``.
+
+    Runs inside the caller's transaction. Holds taken with reserve_stock
+    under the sale's transactionuid are turned into the sale, and other
+    checkouts' holds are left untouched. Stock then drops with a single
+    conditional UPDATE that only applies where enough is left, and the
+    order lines are inserted with one bulk_create.
+    """
+    lines = _quantities(items)
+    variants = _prepare(lines, sale.transactionuid, sale.costumer_name)
+
+    enough = Q()
+    for variant_id, (_, qty) in lines.items():
+        enough |= Q(pk=variant_id, stock__gte=F("held") + qty)
+    updated = ProductVariant.objects.filter(enough).update(
+        stock=Case(
+            *(
+                When(pk=variant_id, then=F("stock") - qty)
+                for variant_id, (_, qty) in lines.items()
+            ),
+            default=F("stock"),
+            output_field=ProductVariant._meta.get_field("stock"),
+        )
+    )
+    if updated != len(lines):
+        # Only reachable where the database has no row locks; the
+        # transaction is rolled back by the caller
+        raise CheckoutError("Stock changed while placing the order, try again.")
+
+    Saled_Products.objects.bulk_create(
+        [
+            Saled_Products(
+                transition=sale,
+                product_id=product_id,
+                variant_id=variant_id,
+                price=variants[variant_id].price,
+                qty=qty,
+                total=variants[variant_id].price * qty,
+            )
+            for variant_id, (product_id, qty) in lines.items()
+        ]
+    )
+    _products_changed({product_id for product_id, _ in lines.values()})
+
+
+def restore_stock(sale):
+    """Put the stock of ``sale``'s lines back with relative UPDATEs."""
+    with transaction.atomic():
+        lines = sale.products.filter(variant__isnull=False).values_list(
+            "product_id", "variant_id", "qty"
+        )
+        product_ids = set()
+        for product_id, variant_id, qty in lines:
+            ProductVariant.objects.filter(pk=variant_id).update(
+                stock=F("stock") + int(qty)
+            )
+            product_ids.add(product_id)
+        _products_changed(product_ids)
@@ -13,6 +13,11 @@ from account.models import SiteViewLog, User
 from booking.models import Booking
 from product.models import Category, Product, ProductVariant, Review
 from sales.models import Saled_Products, Sales
+from server.utils.cache import cached_response
+
+DASHBOARD_TAG = "dashboard"
+# Visitor numbers only ever expire; order and booking writes expire the tag
+DASHBOARD_CACHE_TTL = 60
 
 
 class DashboardStatsView(APIView):
@@ -24,6 +29,7 @@ class DashboardStatsView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         today = timezone.now().date()
 
@@ -173,6 +179,7 @@ class SalesChartView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         today = timezone.now().date()
 
@@ -262,6 +269,7 @@ class TopProductsView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         limit = int(request.query_params.get("limit", 10))
 
@@ -300,6 +308,7 @@ class RecentOrdersView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         limit = int(request.query_params.get("limit", 10))
 
@@ -334,6 +343,7 @@ class RecentBookingsView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         limit = int(request.query_params.get("limit", 5))
 
@@ -365,6 +375,7 @@ class VisitorStatsView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         today = timezone.now().date()
         last_7_days = today - timedelta(days=7)
@@ -423,6 +434,7 @@ class CategoryPerformanceView(APIView):
 
     permission_classes = [permissions.IsAdminUser]
 
+    @cached_response(tags=[DASHBOARD_TAG], timeout=DASHBOARD_CACHE_TTL)
     def get(self, request):
         # Sales by category
         category_sales = (
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from sales.models import Redeem_Code
+from sales.redeem import reconcile_redeem_code, reconcile_redeem_codes
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll redeem code usage shards into Redeem_Code.used and share what is "
+        "left of each limit out across the shards again. Run it every few "
+        "minutes; --all also rebalances codes with no new uses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            code_ids = list(Redeem_Code.objects.values_list("pk", flat=True))
+            for code_id in code_ids:
+                reconcile_redeem_code(code_id)
+            total = len(code_ids)
+        else:
+            total = reconcile_redeem_codes()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {total} redeem codes"))
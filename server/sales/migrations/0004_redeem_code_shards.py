@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_add_delivery_delay_reason'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RedeemCodeShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(blank=True, null=True)),
+                ('code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='sales.redeem_code')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('code', 'shard'), name='unique_redeem_code_shard')],
+            },
+        ),
+    ]
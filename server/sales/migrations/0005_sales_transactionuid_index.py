@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_redeem_code_shards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sales',
+            name='transactionuid',
+            field=models.CharField(blank=True, db_index=True, max_length=225, null=True),
+        ),
+    ]
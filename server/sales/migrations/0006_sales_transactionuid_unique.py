@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_transactionuids(apps, schema_editor):
+    Sales = apps.get_model('sales', 'Sales')
+    # Orders saved without a uid share the empty string; NULLs never collide
+    Sales.objects.filter(transactionuid='').update(transactionuid=None)
+    duplicates = list(
+        Sales.objects.exclude(transactionuid=None)
+        .values('transactionuid')
+        .annotate(orders=Count('id'))
+        .filter(orders__gt=1)
+        .values_list('transactionuid', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            'Resolve orders sharing a transactionuid before making it unique: '
+            + ', '.join(duplicates)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0005_sales_transactionuid_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_transactionuids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sales',
+            name='transactionuid',
+            field=models.CharField(blank=True, max_length=225, null=True, unique=True),
+        ),
+    ]
@@ -21,9 +21,35 @@ class Redeem_Code(models.Model):
     is_active = models.BooleanField(null=True, blank=True)
 
 
+class RedeemCodeShard(models.Model):
+    """
+    One slice of a redeem code's usage counter. Orders count a use on a
+    random shard instead of the code's own row, so a busy code doesn't
+    serialize checkouts; sales.redeem rolls the shards into ``used``.
+    For limited codes each shard counts at most ``capacity`` uses, its
+    share of what was left of the limit at the last reconciliation.
+    """
+
+    code = models.ForeignKey(
+        Redeem_Code, on_delete=models.CASCADE, related_name="shards"
+    )
+    shard = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["code", "shard"], name="unique_redeem_code_shard"
+            ),
+        ]
+
+
 class Sales(models.Model):
     costumer_name = models.ForeignKey(User, on_delete=models.SET_DEFAULT, default=None)
-    transactionuid = models.CharField(max_length=225, null=True, blank=True)
+    transactionuid = models.CharField(
+        max_length=225, null=True, blank=True, unique=True
+    )
     status = models.CharField(
         max_length=10,
         choices=[
@@ -0,0 +1,129 @@
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from .models import Redeem_Code, RedeemCodeShard
+from .snapshots import redeem_code_snapshot
+
+# Shards that can still count a use
+OPEN_SHARD = Q(capacity__isnull=True) | Q(count__lt=F("capacity"))
+
+
+def shard_count():
+    return max(getattr(settings, "REDEEM_CODE_SHARDS", 8), 1)
+
+
+def _capacities(remaining, shards):
+    """Share ``remaining`` uses out across ``shards``, None for no limit."""
+    if remaining is None:
+        return [None] * shards
+    base, extra = divmod(max(remaining, 0), shards)
+    return [base + (1 if shard < extra else 0) for shard in range(shards)]
+
+
+def reconcile_redeem_code(code_id):
+    """
+    Add the shards' counts to the code's ``used``, zero them and share out
+    what is left of the limit as shard capacities. Locks the code and its
+    shards briefly; checkouts wait on it only for that long.
+    """
+    with transaction.atomic():
+        code = Redeem_Code.objects.select_for_update().filter(pk=code_id).first()
+        if code is None:
+            return
+        shards = {
+            shard.shard: shard
+            for shard in RedeemCodeShard.objects.select_for_update()
+            .filter(code=code)
+            .order_by("shard")
+        }
+        counted = sum(shard.count for shard in shards.values())
+        used = (code.used or 0) + counted
+        remaining = None if code.limit is None else code.limit - used
+        capacities = _capacities(remaining, shard_count())
+
+        RedeemCodeShard.objects.filter(code=code, shard__gte=len(capacities)).delete()
+        changed = []
+        for number, capacity in enumerate(capacities):
+            shard = shards.get(number)
+            if shard is None:
+                continue
+            if shard.count or shard.capacity != capacity:
+                shard.count, shard.capacity = 0, capacity
+                changed.append(shard)
+        RedeemCodeShard.objects.bulk_update(changed, ["count", "capacity"])
+        RedeemCodeShard.objects.bulk_create(
+            [
+                RedeemCodeShard(code=code, shard=number, capacity=capacity)
+                for number, capacity in enumerate(capacities)
+                if number not in shards
+            ]
+        )
+        if counted:
+            # update() sends no post_save, which would reconcile all over again
+            Redeem_Code.objects.filter(pk=code.pk).update(used=used)
+            transaction.on_commit(redeem_code_snapshot.invalidate)
+
+
+def reconcile_redeem_codes():
+    """Reconcile every code with uses counted since the last run."""
+    code_ids = list(
+        RedeemCodeShard.objects.filter(count__gt=0)
+        .order_by("code_id")
+        .values_list("code_id", flat=True)
+        .distinct()
+    )
+    for code_id in code_ids:
+        reconcile_redeem_code(code_id)
+    return len(code_ids)
+
+
+def _count_use(code, shard):
+    return (
+        RedeemCodeShard.objects.filter(code=code, shard=shard)
+        .filter(OPEN_SHARD)
+        .update(count=F("count") + 1)
+    )
+
+
+def claim_redeem_code(code):
+    """
+    Count one use of ``code``; False once its limit is used up.
+
+    Runs in the caller's transaction, so a failed order gives the use
+    back. The use lands on a random shard with one conditional UPDATE,
+    which only locks that shard. When it's full the open shards are tried
+    in ascending order, the same order for every checkout, so fallbacks
+    never take shard locks in opposite orders. The limit stays exact
+    because no shard counts past its capacity and the capacities add up
+    to what was left.
+    """
+    for _ in range(2):
+        picked = random.randrange(shard_count())
+        if _count_use(code, picked):
+            return True
+        open_shards = list(
+            RedeemCodeShard.objects.filter(code=code)
+            .filter(OPEN_SHARD)
+            .order_by("shard")
+            .values_list("shard", flat=True)
+        )
+        for shard in open_shards:
+            if _count_use(code, shard):
+                return True
+        if RedeemCodeShard.objects.filter(code=code).exists():
+            return False
+        # A code from before sharding, or saved outside the ORM
+        reconcile_redeem_code(code.pk)
+    return False
+
+
+def redeem_code_usage(code):
+    """Uses of ``code``: ``used`` plus what the shards counted since."""
+    if hasattr(code, "pending_uses"):
+        pending = code.pending_uses
+    else:
+        pending = code.shards.aggregate(total=Sum("count"))["total"]
+    return (code.used or 0) + (pending or 0)
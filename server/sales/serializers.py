@@ -1,30 +1,76 @@
 from rest_framework import serializers
 from .models import *
 from account.serializers import DeliveryAddressSerializer
+from server.utils.fieldsets import SparseFieldsetMixin
+from .redeem import redeem_code_usage
+
+SALES_FIELD_PROFILES = {
+    "card": ["id", "transactionuid", "status", "total_amt", "created"],
+    "admin": [
+        "id",
+        "costumer_name",
+        "transactionuid",
+        "status",
+        "total_amt",
+        "sub_total",
+        "discount",
+        "payment_method",
+        "shipping",
+        "created",
+        "updated_at",
+        "expected_delivery_date",
+    ],
+}
 
 class RedeemSerializer(serializers.ModelSerializer):
     class Meta:
         model = Redeem_Code
         fields = "__all__"
+        # Counted by checkouts and reconciliation; see sales.redeem
+        read_only_fields = ("used",)
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        # Include uses counted on the shards since the last reconciliation
+        representation["used"] = redeem_code_usage(instance)
+        return representation
 
 class Saled_ProductsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Saled_Products
         fields = "__all__"
 
-class SaleQuertSetSerializer(serializers.ModelSerializer):
+class SaleQuertSetSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     shipping = DeliveryAddressSerializer(read_only=True)
     class Meta:
         model = Sales
         fields = "__all__"
+        field_profiles = SALES_FIELD_PROFILES
 
-class SalesDataSerializer(serializers.ModelSerializer):
+class SalesDataSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     products = Saled_ProductsSerializer(many=True, read_only=True)
     costumer_name = serializers.SlugRelatedField(read_only=True, slug_field='username')
     shipping = DeliveryAddressSerializer(read_only=True)
     class Meta:
         model = Sales
         fields = "__all__"
+        field_profiles = {
+            **SALES_FIELD_PROFILES,
+            "detail": [
+                "id",
+                "transactionuid",
+                "status",
+                "total_amt",
+                "sub_total",
+                "discount",
+                "redeem_data",
+                "products",
+                "shipping",
+                "created",
+                "expected_delivery_date",
+                "delivery_delay_reason",
+            ],
+        }
 
 class SalesPostDataSerializer(serializers.ModelSerializer):
     products = Saled_ProductsSerializer(many=True, read_only=True)
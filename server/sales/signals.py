@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from server.utils.cache import invalidate_tags
+
+from . import snapshots  # noqa: F401  (connects snapshot invalidation)
+from .dashboard_views import DASHBOARD_TAG
+from .models import Redeem_Code, Saled_Products, Sales
+from .redeem import reconcile_redeem_code
+
+
+@receiver(post_save, sender=Sales)
+@receiver(post_delete, sender=Sales)
+@receiver(post_save, sender=Saled_Products)
+@receiver(post_delete, sender=Saled_Products)
+@receiver(post_save, sender="booking.Booking")
+@receiver(post_delete, sender="booking.Booking")
+def dashboard_source_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_tags(DASHBOARD_TAG))
+
+
+@receiver(post_save, sender=Redeem_Code)
+def redeem_code_saved(sender, instance, **kwargs):
+    # Create the usage shards, or share a changed limit out across them
+    pk = instance.pk
+    transaction.on_commit(lambda: reconcile_redeem_code(pk))
@@ -0,0 +1,5 @@
+from server.utils.snapshot import TableSnapshot
+
+from .models import Redeem_Code
+
+redeem_code_snapshot = TableSnapshot(Redeem_Code, keys=("pk", "code"))
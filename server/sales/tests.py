@@ -1,3 +1,349 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import uuid
 
-# Create your tests here.
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from account.models import DeliveryAddress, IdempotencyKey, User
+from product.models import (
+    Category,
+    Product,
+    ProductColor,
+    ProductVariant,
+    StockHold,
+)
+from product.reservations import expire_holds, release_holds
+
+from .checkout import CheckoutError, deduct_stock, reserve_stock
+from .models import Saled_Products, Sales
+
+
+class CheckoutFixtures:
+    STOCK = 5
+
+    def setUp(self):
+        self.user = User.objects.create_user("buyer@example.com", "Buy", "Er", "pw")
+        self.address = DeliveryAddress.objects.create(
+            user=self.user, address="Street 1", country="NP", city="KTM", zipcode="1"
+        )
+        color = ProductColor.objects.create(color_code="#000000", color_name="Black")
+        self.product = Product.objects.create(
+            product_name="Wool Suit",
+            description="A wool suit",
+            category=Category.objects.create(name="Suits"),
+        )
+        self.variant = ProductVariant.objects.create(
+            product=self.product,
+            color=color,
+            color_code=color.color_code,
+            color_name=color.color_name,
+            size="M",
+            price=100,
+            stock=self.STOCK,
+        )
+
+
+class ConcurrentCheckoutTests(CheckoutFixtures, TransactionTestCase):
+    """Checkouts racing for the last units of a variant never oversell it."""
+
+    BUYERS = 12
+
+    def _checkout(self, pcs):
+        """
+        Place one order the way SalesViewSet.create does. Returns True when
+        it went through and False when stock ran out; attempts that SQLite
+        turns away with its database lock are rolled back and retried.
+        """
+        items = [{"product": self.product.pk, "variant": self.variant.pk, "pcs": pcs}]
+        for _ in range(500):
+            try:
+                with transaction.atomic():
+                    sale = Sales.objects.create(
+                        costumer_name=self.user,
+                        transactionuid=uuid.uuid4().hex,
+                        total_amt=100,
+                        sub_total=100,
+                        shipping=self.address,
+                    )
+                    deduct_stock(sale, items)
+                return True
+            except CheckoutError:
+                return False
+            except OperationalError:
+                time.sleep(0.005)
+        return None
+
+    def _race(self, quantities):
+        outcomes = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(quantities))
+
+        def buyer(pcs):
+            try:
+                barrier.wait()
+                placed = self._checkout(pcs)
+                with lock:
+                    outcomes.append((pcs, placed))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(pcs,)) for pcs in quantities]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertNotIn(None, [placed for _, placed in outcomes])
+        return outcomes
+
+    def test_last_units_are_sold_exactly_once(self):
+        outcomes = self._race([1] * self.BUYERS)
+
+        placed = [placed for _, placed in outcomes]
+        self.assertEqual(placed.count(True), self.STOCK)
+        self.assertEqual(placed.count(False), self.BUYERS - self.STOCK)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.stock, 0)
+        self.assertEqual(Sales.objects.count(), self.STOCK)
+        self.assertEqual(Saled_Products.objects.count(), self.STOCK)
+
+    def test_stock_never_goes_below_zero(self):
+        outcomes = self._race([2, 3, 2, 1, 3, 2, 1, 2])
+
+        placed = [pcs for pcs, ok in outcomes if ok]
+        self.variant.refresh_from_db()
+        self.assertGreaterEqual(self.variant.stock, 0)
+        self.assertEqual(self.variant.stock, self.STOCK - sum(placed))
+        self.assertEqual(Sales.objects.count(), len(placed))
+        self.assertEqual(
+            sum(Saled_Products.objects.values_list("qty", flat=True)), sum(placed)
+        )
+        # Every checkout that was turned away asked for more than was left
+        for pcs, ok in outcomes:
+            if not ok:
+                self.assertGreater(pcs, self.variant.stock)
+
+
+class IdempotentOrderTests(CheckoutFixtures, TransactionTestCase):
+    """Retried order POSTs are answered from the stored first response."""
+
+    URL = "/api/sales/sales/"
+
+    def _post(self, url, payload, user=None, **headers):
+        token = RefreshToken.for_user(user or self.user).access_token
+        return self.client.post(
+            url,
+            json.dumps(payload),
+            content_type="application/json",
+            HTTP_ORIGIN=settings.FRONTEND_URL,
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+            **headers,
+        )
+
+    def _order(self, transactionuid="order-1", pcs=1, **headers):
+        payload = {
+            "transactionuid": transactionuid,
+            "products": [
+                {"product": self.product.pk, "variant": self.variant.pk, "pcs": pcs}
+            ],
+            "shipping": self.address.pk,
+            "sub_total": 100 * pcs,
+            "total_amt": 100 * pcs,
+            "payment_method": "COD",
+        }
+        return self._post(self.URL, payload, **headers)
+
+    def _stock(self):
+        self.variant.refresh_from_db()
+        return self.variant.stock
+
+    def test_retry_replays_the_first_response(self):
+        first = self._order()
+        retry = self._order()
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Sales.objects.count(), 1)
+        self.assertEqual(self._stock(), self.STOCK - 1)
+
+    def test_transactionuid_keys_the_order_whatever_the_header(self):
+        self._order(HTTP_IDEMPOTENCY_KEY="first")
+        retry = self._order(HTTP_IDEMPOTENCY_KEY="second")
+
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Sales.objects.count(), 1)
+
+    def test_duplicate_while_the_first_is_in_flight_gets_409(self):
+        self._order()
+        # As if the first request had claimed the key and were still running
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+
+        response = self._order()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Sales.objects.count(), 1)
+
+    def test_abandoned_key_is_taken_over(self):
+        self._order()
+        IdempotencyKey.objects.update(response_status=None, response_body=None)
+        # The claim outlived IDEMPOTENCY_LOCK_TIMEOUT and its order rolled back
+        Sales.objects.all().delete()
+        IdempotencyKey.objects.update(
+            created=timezone.now() - timezone.timedelta(days=1)
+        )
+
+        response = self._order()
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Sales.objects.count(), 1)
+
+    def test_same_key_with_a_different_body_is_422(self):
+        self._order(pcs=1)
+        response = self._order(pcs=2)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Sales.objects.count(), 1)
+        self.assertEqual(self._stock(), self.STOCK - 1)
+
+    def test_failed_order_releases_its_key(self):
+        response = self._order(pcs=self.STOCK + 1)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(Sales.objects.count(), 0)
+
+        ProductVariant.objects.filter(pk=self.variant.pk).update(stock=self.STOCK * 2)
+        retry = self._order(pcs=self.STOCK + 1)
+
+        self.assertEqual(retry.status_code, 201, retry.content)
+        self.assertEqual(self._stock(), self.STOCK - 1)
+
+    def test_keys_belong_to_their_user(self):
+        other = User.objects.create_user("other@example.com", "Oth", "Er", "pw")
+        payload = {
+            "items": [
+                {"product": self.product.pk, "variant": self.variant.pk, "pcs": 1}
+            ]
+        }
+        for user in (self.user, other):
+            response = self._post(
+                "/api/products/cart/sync/",
+                payload,
+                user=user,
+                HTTP_IDEMPOTENCY_KEY="cart-1",
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+
+class StockHoldTests(CheckoutFixtures, TransactionTestCase):
+    """Reserving, ordering, releasing and expiring keep ``held`` in step."""
+
+    def _items(self, pcs):
+        return [{"product": self.product.pk, "variant": self.variant.pk, "pcs": pcs}]
+
+    def _held(self):
+        self.variant.refresh_from_db()
+        held = sum(StockHold.objects.values_list("qty", flat=True))
+        self.assertEqual(self.variant.held, held)
+        return held
+
+    def test_reserving_again_replaces_the_hold(self):
+        reserve_stock("checkout-1", self.user, self._items(2))
+        self.assertEqual(self._held(), 2)
+
+        reserve_stock("checkout-1", self.user, self._items(3))
+        self.assertEqual(self._held(), 3)
+        self.assertEqual(self.variant.available, self.STOCK - 3)
+
+    def test_held_units_are_not_sold_to_other_checkouts(self):
+        reserve_stock("checkout-1", self.user, self._items(4))
+
+        with self.assertRaises(CheckoutError):
+            reserve_stock("checkout-2", self.user, self._items(2))
+        reserve_stock("checkout-2", self.user, self._items(1))
+        self.assertEqual(self._held(), self.STOCK)
+
+    def test_order_turns_its_hold_into_the_sale(self):
+        reserve_stock("checkout-1", self.user, self._items(2))
+        reserve_stock("checkout-2", self.user, self._items(1))
+
+        with transaction.atomic():
+            sale = Sales.objects.create(
+                costumer_name=self.user,
+                transactionuid="checkout-1",
+                total_amt=200,
+                sub_total=200,
+                shipping=self.address,
+            )
+            deduct_stock(sale, self._items(2))
+
+        self.assertEqual(self._held(), 1)
+        self.assertEqual(self.variant.stock, self.STOCK - 2)
+        self.assertEqual(StockHold.objects.get().token, "checkout-2")
+
+    def test_release_gives_the_units_back(self):
+        reserve_stock("checkout-1", self.user, self._items(2))
+        other = User.objects.create_user("other@example.com", "Oth", "Er", "pw")
+
+        self.assertEqual(release_holds("checkout-1", other), 0)
+        self.assertEqual(self._held(), 2)
+        self.assertEqual(release_holds("checkout-1", self.user), 1)
+        self.assertEqual(self._held(), 0)
+        self.assertEqual(self.variant.stock, self.STOCK)
+
+    def test_expire_holds_releases_only_expired_holds(self):
+        reserve_stock("checkout-1", self.user, self._items(2))
+        reserve_stock("checkout-2", self.user, self._items(1))
+        StockHold.objects.filter(token="checkout-1").update(
+            expires_at=timezone.now() - timezone.timedelta(seconds=1)
+        )
+
+        self.assertEqual(expire_holds(), 1)
+        self.assertEqual(self._held(), 1)
+        self.assertEqual(expire_holds(), 0)
+
+    def test_concurrent_reservations_never_hold_more_than_stock(self):
+        checkouts = 12
+        outcomes = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(checkouts)
+
+        def checkout(token):
+            try:
+                barrier.wait()
+                held = None
+                for _ in range(500):
+                    try:
+                        reserve_stock(token, self.user, self._items(1))
+                        held = True
+                        break
+                    except CheckoutError:
+                        held = False
+                        break
+                    except OperationalError:
+                        time.sleep(0.005)
+                with lock:
+                    outcomes.append(held)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=checkout, args=(f"checkout-{n}",))
+            for n in range(checkouts)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertNotIn(None, outcomes)
+        self.assertEqual(outcomes.count(True), self.STOCK)
+        self.assertEqual(self._held(), self.STOCK)
@@ -2,8 +2,8 @@ import logging
 from datetime import timedelta
 
 from django.conf import settings
-from django.db import transaction
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Sum
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -16,16 +16,21 @@ from rest_framework.response import Response
 from account.models import DeliveryAddress
 from account.renderers import UserRenderer
 from account.utils import send_email
-from product.models import Product, ProductVariant
+from product.reservations import release_holds
 from server.utils.encryption import encrypt_response
+from server.utils.idempotency import idempotent
+from server.utils.pagination import CursorOptInMixin
 
+from .checkout import CheckoutError, deduct_stock, reserve_stock, restore_stock
 from .models import *
+from .redeem import claim_redeem_code, redeem_code_usage
 from .serializers import *
+from .snapshots import redeem_code_snapshot
 
 logger = logging.getLogger(__name__)
 
 
-class StandardResultsSetPagination(PageNumberPagination):
+class StandardResultsSetPagination(CursorOptInMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
@@ -96,7 +101,7 @@ class SalesViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         transactionuid = kwargs.get("transactionuid")
         instance = get_object_or_404(Sales, transactionuid=transactionuid)
-        serializer = SalesDataSerializer(instance)
+        serializer = SalesDataSerializer(instance, context={"request": request})
         return Response(serializer.data)
 
     def get_queryset(self):
@@ -114,13 +119,14 @@ class SalesViewSet(viewsets.ModelViewSet):
             return queryset.filter(costumer_name=user)
         return queryset
 
+    @idempotent("sales.create", key_field="transactionuid")
     def create(self, request, *args, **kwargs):
         """Override create instead of perform_create so we can return proper responses."""
         data = request.data
         invoice_data = data.get("products", [])
         user = request.user
 
-        # --- Idempotency check: reject duplicate transactionuid ---
+        # --- Reject reuse of a transactionuid after its stored response expired ---
         transactionuid = data.get("transactionuid")
         if not transactionuid:
             return Response(
@@ -153,14 +159,6 @@ class SalesViewSet(viewsets.ModelViewSet):
                         {"error": "Redeem code is expired."},
                         status=status.HTTP_400_BAD_REQUEST,
                     )
-                if (
-                    redeem_code_obj.limit is not None
-                    and redeem_code_obj.used >= redeem_code_obj.limit
-                ):
-                    return Response(
-                        {"error": "Redeem code usage limit reached."},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
             except Redeem_Code.DoesNotExist:
                 return Response(
                     {"error": "Invalid redeem code."},
@@ -168,51 +166,56 @@ class SalesViewSet(viewsets.ModelViewSet):
                 )
 
         # --- Atomic transaction: create sale, deduct stock, send invoice ---
-        with transaction.atomic():
-            if redeem_code_obj:
-                redeem_code_obj.used = (redeem_code_obj.used or 0) + 1
-                redeem_code_obj.save()
-
-            post_serializer = self.get_serializer(data=data)
-            post_serializer.is_valid(raise_exception=True)
-
-            sale = post_serializer.save(
-                costumer_name=user,
-                redeem_data=redeem_code_obj.name if redeem_code_obj else None,
-                shipping=shipping_instance,
-                discount=data.get("discount", 0),
-                sub_total=data.get("sub_total"),
-                total_amt=data.get("total_amt"),
-                transactionuid=data.get("transactionuid"),
-                payment_method=data.get("payment_method"),
-                expected_delivery_date=timezone.now().date() + timedelta(days=2),
-            )
+        try:
+            with transaction.atomic():
+                # Checked here rather than up front so the limit holds under load
+                if redeem_code_obj and not claim_redeem_code(redeem_code_obj):
+                    return Response(
+                        {"error": "Redeem code usage limit reached."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
 
-            for item in invoice_data:
-                product = get_object_or_404(Product, id=item["product"])
-                variant = get_object_or_404(ProductVariant, id=item["variant"])
-                quantity_sold = item["pcs"]
+                post_serializer = self.get_serializer(data=data)
+                post_serializer.is_valid(raise_exception=True)
+
+                sale = post_serializer.save(
+                    costumer_name=user,
+                    redeem_data=redeem_code_obj.name if redeem_code_obj else None,
+                    shipping=shipping_instance,
+                    discount=data.get("discount", 0),
+                    sub_total=data.get("sub_total"),
+                    total_amt=data.get("total_amt"),
+                    transactionuid=data.get("transactionuid"),
+                    payment_method=data.get("payment_method"),
+                    expected_delivery_date=timezone.now().date() + timedelta(days=2),
+                )
 
-                if variant.stock < quantity_sold:
-                    raise serializers.ValidationError(
-                        {
-                            "error": f"Not enough stock for {product.product_name} ({variant.size or variant.color_name})."
-                        }
+                try:
+                    deduct_stock(sale, invoice_data)
+                except CheckoutError as e:
+                    transaction.set_rollback(True)
+                    return Response(
+                        {"error": e.message, "items": e.items},
+                        status=status.HTTP_400_BAD_REQUEST,
                     )
+        except IntegrityError:
+            # Another request placed this transactionuid first
+            if not Sales.objects.filter(transactionuid=transactionuid).exists():
+                raise
+            return Response(
+                {"error": "This order has already been placed."},
+                status=status.HTTP_409_CONFLICT,
+            )
 
-                variant.stock -= quantity_sold
-                variant.save()
+        # --- Send invoice email once the order is committed ---
+        transaction.on_commit(lambda: self._send_invoice(sale, user))
 
-                Saled_Products.objects.create(
-                    transition=sale,
-                    product=product,
-                    variant=variant,
-                    price=variant.price,
-                    qty=quantity_sold,
-                    total=variant.price * quantity_sold,
-                )
+        return Response(
+            {"success": "Order created and invoice sent."},
+            status=status.HTTP_201_CREATED,
+        )
 
-        # --- Send invoice email (outside atomic so DB is committed) ---
+    def _send_invoice(self, sale, user):
         try:
             context = get_invoice_details(sale, user.email)
             subject = f"Order Confirmation – #{sale.transactionuid}"
@@ -221,11 +224,6 @@ class SalesViewSet(viewsets.ModelViewSet):
         except Exception as e:
             logger.error(f"Failed to send invoice email for {sale.transactionuid}: {e}")
 
-        return Response(
-            {"success": "Order created and invoice sent."},
-            status=status.HTTP_201_CREATED,
-        )
-
     def perform_update(self, serializer):
         instance = self.get_object()
         old_status = instance.status
@@ -313,20 +311,62 @@ class SalesViewSet(viewsets.ModelViewSet):
 
         transactionuid = instance.transactionuid
 
-        # Restore stock for cancelled orders that had stock deducted
-        if instance.status == "cancelled":
-            for sp in instance.products.select_related("variant").all():
-                if sp.variant:
-                    sp.variant.stock += int(sp.qty)
-                    sp.variant.save(update_fields=["stock"])
-
-        instance.delete()
+        with transaction.atomic():
+            # Restore stock for cancelled orders that had stock deducted
+            if instance.status == "cancelled":
+                restore_stock(instance)
+            instance.delete()
 
         return Response(
             {"msg": f"Order #{transactionuid} deleted successfully."},
             status=status.HTTP_200_OK,
         )
 
+    @action(detail=False, methods=["post"], url_path="reserve")
+    def reserve(self, request):
+        """
+        Hold the checkout's items for STOCK_HOLD_TTL seconds, keyed by the
+        transactionuid the order will be placed with. Calling it again
+        replaces the held items and extends the hold.
+        """
+        transactionuid = request.data.get("transactionuid")
+        if not transactionuid:
+            return Response(
+                {"error": "Transaction UID is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if Sales.objects.filter(transactionuid=transactionuid).exists():
+            return Response(
+                {"error": "This order has already been placed."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        try:
+            expires_at = reserve_stock(
+                transactionuid, request.user, request.data.get("products", [])
+            )
+        except CheckoutError as e:
+            return Response(
+                {"error": e.message, "items": e.items},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {"transactionuid": transactionuid, "expires_at": expires_at.isoformat()},
+            status=status.HTTP_200_OK,
+        )
+
+    @reserve.mapping.delete
+    def release(self, request):
+        """Give the checkout's held items back before their hold expires."""
+        transactionuid = request.query_params.get("transactionuid")
+        transactionuid = transactionuid or request.data.get("transactionuid")
+        if not transactionuid:
+            return Response(
+                {"error": "Transaction UID is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        release_holds(transactionuid, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(detail=False, methods=["get"], url_path="status/(?P<status_param>[^/.]+)")
     def filter_by_status(self, request, status_param=None):
         status_map = {
@@ -372,9 +412,10 @@ class RedeemCodeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         code = self.request.query_params.get("code")
+        queryset = super().get_queryset()
         if code:
-            return Redeem_Code.objects.filter(code=code)
-        return super().get_queryset()
+            queryset = Redeem_Code.objects.filter(code=code)
+        return queryset.annotate(pending_uses=Sum("shards__count"))
 
     def perform_create(self, serializer):
         name = self.request.data.get("name")
@@ -402,9 +443,8 @@ class RedeemCodeViewSet(viewsets.ModelViewSet):
                 {"error": "Code is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            redeem_code = Redeem_Code.objects.get(code=code)
-        except Redeem_Code.DoesNotExist:
+        redeem_code = redeem_code_snapshot.get(code, key="code")
+        if redeem_code is None:
             return Response({"error": "Invalid code"}, status=status.HTTP_404_NOT_FOUND)
 
         if redeem_code.valid_until < timezone.now().date():
@@ -412,7 +452,10 @@ class RedeemCodeViewSet(viewsets.ModelViewSet):
                 {"error": "Code is expired"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        if redeem_code.limit is not None and redeem_code.used >= redeem_code.limit:
+        if (
+            redeem_code.limit is not None
+            and redeem_code_usage(redeem_code) >= redeem_code.limit
+        ):
             return Response(
                 {"error": "Code usage limit reached"},
                 status=status.HTTP_400_BAD_REQUEST,
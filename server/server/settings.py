@@ -118,6 +118,47 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Who sends media bytes (server.utils.media): "accel" for nginx
+# X-Accel-Redirect, "sendfile" for X-Sendfile, "direct" streams from Django
+MEDIA_SERVE_MODE = config("MEDIA_SERVE_MODE", default="direct")
+# Internal nginx location aliased to MEDIA_ROOT, used by "accel"
+MEDIA_ACCEL_PREFIX = config("MEDIA_ACCEL_PREFIX", default="/protected-media/")
+# Cache lifetime of media whose names aren't content-hashed
+MEDIA_MAX_AGE = 60 * 60 * 24
+
+# On-disk BM25 product search index shared by all workers (product.search)
+SEARCH_INDEX_PATH = os.path.join(BASE_DIR, "search_index.bin")
+
+# Co-purchase recommendation model, rebuilt offline with
+# ``manage.py rebuild_recommendations`` (product.recommendations)
+RECOMMENDATIONS_PATH = os.path.join(BASE_DIR, "recommendations.bin")
+
+# Two-tier cache: a per-process LRU in front of a shared backend. Set
+# REDIS_URL in production (needs the redis package); without it the
+# workers share a file cache on local disk.
+REDIS_URL = config("REDIS_URL", default="")
+CACHES = {
+    "default": {
+        "BACKEND": "server.utils.cache.TwoTierCache",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "MAX_ENTRIES": 2000,
+            "LOCAL_TIMEOUT": 60,
+            "POLL_INTERVAL": 1,
+        },
+    },
+    "shared": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+        if REDIS_URL
+        else {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": config("CACHE_DIR", default=os.path.join(BASE_DIR, "cache")),
+        }
+    ),
+}
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
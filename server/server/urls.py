@@ -1,8 +1,8 @@
-from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
 
+from server.utils.media import serve_media
 from server.views import custom_404_view, security_monitor_beacon
 
 urlpatterns = [
@@ -17,12 +17,10 @@ urlpatterns = [
         "api/security/monitor/", security_monitor_beacon, name="security-monitor-beacon"
     ),
 ]
-# static() only works when DEBUG=True, so always serve media in development
-from django.urls import re_path
-from django.views.static import serve
-
+# static() only works when DEBUG=True; serve_media hands the file to the
+# front proxy in production (MEDIA_SERVE_MODE) and streams it in development
 urlpatterns += [
-    re_path(r"^media/(?P<path>.*)$", serve, {"document_root": settings.MEDIA_ROOT}),
+    re_path(r"^media/(?P<path>.*)$", serve_media),
 ]
 
 # Custom 404 handler — scary security monitoring page
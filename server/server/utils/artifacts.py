@@ -0,0 +1,135 @@
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX hosts fall back to no locking
+    fcntl = None
+
+# What a torn, truncated or outdated artifact file fails to load with
+LOAD_ERRORS = (OSError, ValueError, EOFError, pickle.UnpicklingError)
+
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def file_lock(path):
+    """Serialize writers of ``path`` across worker processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def dump_atomic(payload, path):
+    """
+    Pickle ``payload`` into a temp file of its own next to ``path`` and
+    move it into place, so readers only ever see a complete file.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix=f"{os.path.basename(path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+class ArtifactHolder:
+    """
+    Per-process handle on something every worker shares through one
+    pickled file, such as a search index or a recommendation model.
+
+    Workers load the file and reload it whenever another worker has
+    replaced it. A missing or unreadable file is built by one worker at a
+    time: the others wait on the file lock and then load what it wrote.
+    Anything that writes the file holds ``file_lock(path)``.
+
+    Subclasses implement ``path()``, ``build()`` and ``read(path)``; the
+    value they hold writes itself with ``dump(path)``.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def path(self):
+        raise NotImplementedError
+
+    def build(self):
+        raise NotImplementedError
+
+    def read(self, path):
+        raise NotImplementedError
+
+    def is_current(self, path):
+        return self.value is not None and file_mtime(path) == self.mtime
+
+    def _read(self, path):
+        # Taken first: if the file is replaced mid-read the next check
+        # sees a newer mtime and loads it again.
+        mtime = file_mtime(path)
+        if mtime is None:
+            return False
+        try:
+            self.value = self.read(path)
+        except LOAD_ERRORS:
+            return False
+        self.mtime = mtime
+        return True
+
+    def load(self, path, locked=False):
+        """Load the file, building it first when it is missing or broken."""
+        if self._read(path):
+            return
+        if locked:
+            self.rebuild(path)
+            return
+        with file_lock(path):
+            # Another worker may have built it while this one waited
+            if not self._read(path):
+                self.rebuild(path)
+
+    def save(self, path):
+        self.value.dump(path)
+        self.mtime = file_mtime(path)
+
+    def rebuild(self, path):
+        """Build from scratch and write the file; hold ``file_lock(path)``."""
+        self.value = self.build()
+        self.save(path)
+
+    def get(self):
+        path = self.path()
+        if not self.is_current(path):
+            with self.lock:
+                if not self.is_current(path):
+                    self.load(path)
+        return self.value
+
+    def refresh(self):
+        """Rebuild from scratch for every worker."""
+        path = self.path()
+        with self.lock, file_lock(path):
+            self.rebuild(path)
+        return self.value
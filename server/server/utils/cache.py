@@ -0,0 +1,455 @@
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+SEQ_KEY = "two-tier:seq"
+LOG_PREFIX = "two-tier:log:"
+TAG_PREFIX = "tag:"
+CLEAR_ALL = "*"
+
+
+class _LRU:
+    """
+    Bounded in-process map of key -> (expires_at, pickled value). Values
+    are pickled like LocMemCache does so callers never share a mutable
+    object with the cache.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0], pickle.loads(entry[1])
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class _Stamped:
+    """An L2 value with its expiry, so an L1 copy never outlives it."""
+
+    __slots__ = ("expires_at", "value")
+
+    def __init__(self, expires_at, value):
+        self.expires_at = expires_at
+        self.value = value
+
+
+class TwoTierCache(BaseCache):
+    """
+    Django cache backend with a bounded per-process LRU (L1) in front of a
+    shared cache (L2, another CACHES alias such as Redis or a file cache).
+
+    Every write goes to L2. Deletes, incr() and set_many() (which is how
+    tag versions are bumped) also append the touched keys to an
+    invalidation log kept in L2 itself. Each worker reads the log at most
+    every POLL_INTERVAL seconds and drops those keys from its L1, so an
+    invalidation made by one worker reaches the others without any extra
+    infrastructure. If a worker falls too far behind the log, or a log
+    entry has expired, it clears its whole L1. Plain set() and add() are
+    not logged: callers cache under versioned or tagged keys, and an
+    overwritten key can be served from another worker's L1 until it
+    expires there.
+
+    An L1 entry lives for LOCAL_TIMEOUT at most, and never longer than
+    the L2 entry it was copied from. L2 values carry their expiry for
+    that; ints are stored bare so incr() stays atomic in L2.
+
+    The same log carries change feeds: broadcast(channel, items) appends a
+    message that ChangeFeed readers of ``channel`` pick up, so in-memory
+    indexes stay current the way L1 does.
+
+    Keys starting with a LOCAL_EXCLUDE prefix (throttle history by
+    default) are written on every request, so they skip L1 and the log.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED", "shared")
+        self._local = _LRU(options.get("MAX_ENTRIES", 1000))
+        self._local_timeout = options.get("LOCAL_TIMEOUT", 60)
+        self._poll_interval = options.get("POLL_INTERVAL", 1)
+        self._log_window = options.get("LOG_WINDOW", 500)
+        self._local_exclude = tuple(options.get("LOCAL_EXCLUDE", ("throttle_",)))
+        self._origin = uuid.uuid4().hex
+        self._seen_seq = None
+        self._next_poll = 0
+        self._poll_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return not key.startswith(self._local_exclude)
+
+    def _local_ttl(self, expires_at):
+        if expires_at is None:
+            return self._local_timeout
+        return min(max(expires_at - time.time(), 0), self._local_timeout)
+
+    def _stamp(self, local_key, value, expires_at):
+        """The form ``value`` is stored in L2."""
+        if not self._is_local(local_key) or type(value) is int:
+            return value
+        return _Stamped(expires_at, value)
+
+    # -- invalidation log ------------------------------------------------
+
+    def log_position(self):
+        """The sequence number of the newest log message."""
+        return self.shared.get(SEQ_KEY, 0)
+
+    def _publish(self, keys, changes=None):
+        keys = [key for key in keys if key == CLEAR_ALL or self._is_local(key)]
+        if not keys and not changes:
+            return
+        ttl = max(self._poll_interval * 60, 300)
+        message = (self._origin, keys, changes or {})
+        # Backends without an atomic incr can hand two writers one number;
+        # add() refuses the second claim so it moves on to the next slot.
+        for _ in range(5):
+            self.shared.add(SEQ_KEY, 0, None)
+            seq = self.shared.incr(SEQ_KEY)
+            if self.shared.add(f"{LOG_PREFIX}{seq}", message, ttl):
+                return
+
+    def read_log(self, since):
+        """
+        Return ``(seq, messages)`` with the log messages written after
+        ``since``, oldest first. ``messages`` is None when some of them
+        are gone, so the reader has to start over from scratch.
+        """
+        seq = self.log_position()
+        if seq == since:
+            return seq, []
+        if seq < since or seq - since > self._log_window:
+            return seq, None
+        log_keys = [f"{LOG_PREFIX}{n}" for n in range(since + 1, seq + 1)]
+        messages = self.shared.get_many(log_keys)
+        if len(messages) < len(log_keys):
+            return seq, None
+        return seq, [messages[key] for key in log_keys]
+
+    def broadcast(self, channel, items):
+        """Announce through the log that ``items`` of ``channel`` changed."""
+        items = list(items)
+        if items:
+            self._publish([], {channel: items})
+
+    def _poll(self):
+        now = time.monotonic()
+        if now < self._next_poll or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + self._poll_interval
+            seen = self._seen_seq
+            if seen is None:
+                self._seen_seq = self.log_position()
+                return
+            self._seen_seq, messages = self.read_log(seen)
+            if messages is None:
+                self._local.clear()
+                return
+            for origin, keys, _ in messages:
+                if origin == self._origin:
+                    continue
+                if CLEAR_ALL in keys:
+                    self._local.clear()
+                    return
+                for key in keys:
+                    self._local.delete(key)
+        finally:
+            self._poll_lock.release()
+
+    # -- cache API -------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if self._is_local(local_key):
+            self._poll()
+            entry = self._local.get(local_key)
+            if entry is not None:
+                return entry[1]
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        expires_at = None
+        if isinstance(value, _Stamped):
+            expires_at, value = value.expires_at, value.value
+        if self._is_local(local_key):
+            self._local.set(local_key, value, self._local_ttl(expires_at))
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        expires_at = self.get_backend_timeout(timeout)
+        stored = self._stamp(local_key, value, expires_at)
+        self.shared.set(key, stored, timeout, version=version)
+        if self._is_local(local_key):
+            self._local.set(local_key, value, self._local_ttl(expires_at))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        expires_at = self.get_backend_timeout(timeout)
+        stored = self._stamp(local_key, value, expires_at)
+        added = self.shared.add(key, stored, timeout, version=version)
+        if added and self._is_local(local_key):
+            self._local.set(local_key, value, self._local_ttl(expires_at))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        deleted = self.shared.delete(key, version=version)
+        self._local.delete(local_key)
+        self._publish([local_key])
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.shared.incr(key, delta, version=version)
+        self._local.delete(local_key)
+        self._publish([local_key])
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires_at = self.get_backend_timeout(timeout)
+        local_keys = {}
+        stored = {}
+        for key, value in data.items():
+            local_keys[key] = self.make_and_validate_key(key, version=version)
+            stored[key] = self._stamp(local_keys[key], value, expires_at)
+        failed = self.shared.set_many(stored, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed and self._is_local(local_keys[key]):
+                self._local.set(local_keys[key], value, self._local_ttl(expires_at))
+        self._publish(list(local_keys.values()))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        local_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        for local_key in local_keys:
+            self._local.delete(local_key)
+        self._publish(local_keys)
+
+    def has_key(self, key, version=None):
+        sentinel = object()
+        return self.get(key, sentinel, version=version) is not sentinel
+
+    def clear(self):
+        # Carry the log position over so readers notice the clear
+        seq = self.log_position()
+        self.shared.clear()
+        self.shared.add(SEQ_KEY, seq, None)
+        self._local.clear()
+        self._publish([CLEAR_ALL])
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+# -- tagged entries --------------------------------------------------------
+
+
+def tag_versions(tags):
+    keys = {f"{TAG_PREFIX}{tag}": tag for tag in tags}
+    found = cache.get_many(keys)
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, tag in keys.items():
+        if tag not in versions:
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[tag] = version
+    return versions
+
+
+def get_tagged(key, default=None):
+    """Return ``key`` unless one of the tags it was stored with moved on."""
+    entry = cache.get(key)
+    if entry is None:
+        return default
+    versions, value = entry
+    if tag_versions(versions) != versions:
+        return default
+    return value
+
+
+def set_tagged(key, value, tags, timeout=DEFAULT_TIMEOUT):
+    cache.set(key, (tag_versions(tags), value), timeout)
+
+
+def invalidate_tags(*tags):
+    """Expire every entry stored with any of ``tags``, in every worker."""
+    version = time.time_ns()
+    cache.set_many({f"{TAG_PREFIX}{tag}": version for tag in tags}, None)
+
+
+def broadcast(channel, items):
+    """Tell every worker's ChangeFeed for ``channel`` that ``items`` changed."""
+    cache.broadcast(channel, items)
+
+
+class ChangeFeed:
+    """
+    A worker's position in one channel of the TwoTierCache invalidation
+    log. Call start() before building whatever the channel describes,
+    then changes() for what was published since.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.seq = None
+
+    def start(self):
+        self.seq = cache.log_position()
+
+    def changes(self):
+        """
+        Return the set of items published since the last call, or None
+        when part of the log was missed or the cache was cleared, and the
+        reader must rebuild.
+        """
+        self.seq, messages = cache.read_log(self.seq)
+        if messages is None:
+            return None
+        items = set()
+        for _, keys, changes in messages:
+            if CLEAR_ALL in keys:
+                return None
+            items.update(changes.get(self.channel, ()))
+        return items
+
+
+def cached_response(tags, timeout=DEFAULT_TIMEOUT):
+    """
+    Cache a DRF view method's 200 response data per host and full path,
+    stored under ``tags`` so model changes can expire it.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            url = f"{request.get_host()}{request.get_full_path()}"
+            key = "response:{}.{}:{}".format(
+                type(self).__qualname__,
+                method.__name__,
+                hashlib.md5(url.encode()).hexdigest(),
+            )
+            data = get_tagged(key)
+            if data is not None:
+                return Response(data, headers={"X-Cache": "HIT"})
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                set_tagged(key, response.data, tags, timeout)
+                response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_response(versions_func):
+    """
+    Answer conditional GETs for a DRF view method from version tokens.
+
+    ``versions_func(view, request, *args, **kwargs)`` returns the version
+    tokens (``time.time_ns()`` values) the response depends on, or None
+    when they can't be known up front. The strong ETag hashes those
+    tokens with the host, full path and audience. Last-Modified is the
+    newest token. A matching If-None-Match (or, failing that,
+    If-Modified-Since) returns 304 before the view runs any query or
+    serializer.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = versions_func(self, request, *args, **kwargs)
+            if versions is None:
+                return method(self, request, *args, **kwargs)
+
+            audience = "staff" if request.user.is_staff else "public"
+            vary = "|".join(
+                [request.get_host(), request.get_full_path(), audience]
+                + [str(version) for version in versions]
+            )
+            etag = '"%s"' % hashlib.sha1(vary.encode()).hexdigest()
+            last_modified = int(max(versions, default=0) // 1_000_000_000)
+            headers = {"ETag": etag, "Last-Modified": http_date(last_modified)}
+
+            if_none_match = request.headers.get("If-None-Match")
+            if_modified_since = parse_http_date_safe(
+                request.headers.get("If-Modified-Since", "")
+            )
+            if if_none_match:
+                not_modified = etag in parse_etags(if_none_match) or (
+                    if_none_match.strip() == "*"
+                )
+            else:
+                not_modified = (
+                    if_modified_since is not None
+                    and last_modified <= if_modified_since
+                )
+            if not_modified:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                for header, value in headers.items():
+                    response[header] = value
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def tagged_versions(*tags):
+    """``versions_func`` for conditional_response over cache tags."""
+
+    def versions_func(view, request, *args, **kwargs):
+        return list(tag_versions(tags).values())
+
+    return versions_func
@@ -0,0 +1,55 @@
+def _split(value):
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Trim a serializer to the fields a request asks for:
+
+    - ``?fields=a,b`` renders only those fields
+    - ``?omit=c`` drops fields from whatever would otherwise render
+    - ``?profile=card`` picks a named set from ``Meta.field_profiles``
+
+    A view can pass ``context["profile"]`` as its default profile.
+    Dropped fields are removed before rendering, so their
+    SerializerMethodField getters never run. Names in
+    ``Meta.on_demand_fields`` render only when a fieldset asks for them.
+    A serializer built from another serializer's context should pass
+    ``"apply_fieldset": False`` so the outer request's fieldset does not
+    trim it. Writes always see the full field set.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        self._only, self._omit = self._requested_fieldset()
+        for name in list(fields):
+            if not self.wants(name):
+                fields.pop(name)
+        return fields
+
+    def _requested_fieldset(self):
+        if not self.context.get("apply_fieldset", True):
+            return None, set()
+        request = self.context.get("request")
+        if request is not None and request.method not in ("GET", "HEAD"):
+            return None, set()
+        params = getattr(request, "query_params", {})
+        only = _split(params.get("fields"))
+        if not only:
+            profiles = getattr(self.Meta, "field_profiles", {})
+            profile = params.get("profile") or self.context.get("profile")
+            if profile in profiles:
+                only = set(profiles[profile])
+        return only or None, _split(params.get("omit"))
+
+    def wants(self, name):
+        """Whether ``name`` (a field or extra payload key) is rendered."""
+        if not hasattr(self, "_only"):
+            self.fields  # resolves the requested fieldset
+        if name in self._omit:
+            return False
+        if self._only is None:
+            return name not in getattr(self.Meta, "on_demand_fields", ())
+        return name in self._only
@@ -0,0 +1,162 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from account.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    return timezone.timedelta(
+        seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+    )
+
+
+def _stale_after():
+    # A request that never finished, e.g. its worker was killed
+    return timezone.timedelta(
+        seconds=getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60 * 5)
+    )
+
+
+def _fingerprint(request):
+    data = request.data
+    if hasattr(data, "lists"):
+        data = {key: [str(value) for value in values] for key, values in data.lists()}
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(scope, key, user, fingerprint):
+    """
+    Insert the key's row, or return ``(None, existing)`` when another
+    request already holds it. Expired and abandoned rows are taken over.
+    """
+    now = timezone.now()
+    owner = str(user.pk) if user else ""
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return (
+                    IdempotencyKey.objects.create(
+                        scope=scope,
+                        owner=owner,
+                        key=key,
+                        user=user,
+                        fingerprint=fingerprint,
+                        expires_at=now + _ttl(),
+                    ),
+                    None,
+                )
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(
+                scope=scope, owner=owner, key=key
+            ).first()
+            if existing is None:
+                continue
+            abandoned = (
+                existing.response_status is None
+                and existing.created <= now - _stale_after()
+            )
+            if existing.expires_at > now and not abandoned:
+                return None, existing
+            IdempotencyKey.objects.filter(pk=existing.pk).delete()
+    return None, None
+
+
+def idempotent(scope, key_field=None):
+    """
+    Replay the first successful response to a POST for retries that send
+    the same ``Idempotency-Key`` header, for IDEMPOTENCY_KEY_TTL seconds.
+    With ``key_field`` the value of that request field is the key
+    instead, whatever header comes with it.
+
+    Keys belong to the user sending them and are claimed with a unique
+    insert before the view runs, so a concurrent duplicate gets 409
+    instead of running the view twice. Reusing a key for a different
+    body is a 422.
+
+    The view runs in one transaction with the write of its response, so
+    only a request that rolled back is ever taken over; views send mail
+    and the like from transaction.on_commit. Only 2xx responses are
+    kept: a failed request releases its key and may simply be retried.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(self, request, *args, **kwargs):
+            if key_field:
+                key = request.data.get(key_field)
+            else:
+                key = request.headers.get(HEADER)
+            if not key:
+                return view_func(self, request, *args, **kwargs)
+            key = str(key)[:MAX_KEY_LENGTH]
+            user = request.user if request.user.is_authenticated else None
+            fingerprint = _fingerprint(request)
+
+            record, existing = _claim(scope, key, user, fingerprint)
+            if record is None:
+                if existing is None:
+                    return Response(
+                        {"error": "This request is already being processed."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                if existing.fingerprint != fingerprint:
+                    return Response(
+                        {
+                            "error": f"{key_field or HEADER} was already used "
+                            "for another request."
+                        },
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                if existing.response_status is None:
+                    return Response(
+                        {"error": "This request is already being processed."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+                response = Response(
+                    existing.response_body, status=existing.response_status
+                )
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            try:
+                # The view's writes and the stored response commit together,
+                # so a key left without a response never had side effects.
+                with transaction.atomic():
+                    response = view_func(self, request, *args, **kwargs)
+                    if status.is_success(response.status_code):
+                        IdempotencyKey.objects.filter(pk=record.pk).update(
+                            response_status=response.status_code,
+                            response_body=response.data,
+                        )
+            except Exception:
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+                raise
+            if not status.is_success(response.status_code):
+                IdempotencyKey.objects.filter(pk=record.pk).delete()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def purge_idempotency_keys(batch_size=1000):
+    """Delete expired keys in batches. Returns the number deleted."""
+    deleted = 0
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+    while True:
+        pks = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import posixpath
+import re
+import stat as stat_mode
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# Renditions are named after a digest of their bytes (see server.utils.renditions)
+HASHED_NAME = re.compile(r"-[0-9a-f]{12}\.\w+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def _mode():
+    return getattr(settings, "MEDIA_SERVE_MODE", "direct")
+
+
+def _cache_control(path):
+    if HASHED_NAME.search(path):
+        return IMMUTABLE_CACHE
+    max_age = getattr(settings, "MEDIA_MAX_AGE", 60 * 60 * 24)
+    return f"public, max-age={max_age}"
+
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in [
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ]
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(mtime) <= since
+
+
+def _byte_range(request, size, etag, mtime):
+    """
+    ``(start, end)`` of a satisfiable single-range request, None to send
+    the whole file, or ``False`` when the range can't be satisfied.
+    Multi-range requests get the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_HEADER.match(request.META.get("HTTP_RANGE", "").strip())
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.META.get("HTTP_IF_RANGE", "").strip()
+    if if_range and if_range != etag:
+        # A date validator only matches a file unchanged since then
+        if parse_http_date_safe(if_range) != int(mtime):
+            return None
+    first, last = match.groups()
+    if not first:
+        # "bytes=-N" is the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(path, full_path, content_type):
+    """Let the front proxy send the file; it handles ranges and revalidation."""
+    # nginx and mod_xsendfile keep the Content-Type set here
+    response = HttpResponse(content_type=content_type)
+    if _mode() == "accel":
+        prefix = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = posixpath.join(prefix, quote(path))
+    else:
+        response["X-Sendfile"] = full_path
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT.
+
+    MEDIA_SERVE_MODE picks who sends the bytes: "accel" hands the file to
+    nginx with X-Accel-Redirect (MEDIA_ACCEL_PREFIX must be an internal
+    location aliased to MEDIA_ROOT), "sendfile" does the same through
+    X-Sendfile for Apache or lighttpd, and "direct" streams it from
+    Django with ETag/Last-Modified revalidation and single byte ranges,
+    for local development. Content-hashed names are cached as immutable.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("File not found")
+    if not stat_mode.S_ISREG(stat.st_mode):
+        raise Http404("File not found")
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+    if _mode() in ("accel", "sendfile"):
+        response = _offload(path, full_path, content_type)
+        response["Cache-Control"] = _cache_control(path)
+        return response
+
+    etag = _etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": _cache_control(path),
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return HttpResponseNotModified(headers=headers)
+
+    byte_range = _byte_range(request, stat.st_size, etag, stat.st_mtime)
+    if byte_range is False:
+        headers["Content-Range"] = f"bytes */{stat.st_size}"
+        return HttpResponse(status=416, headers=headers)
+    if byte_range is None:
+        response = FileResponse(
+            open(full_path, "rb"), content_type=content_type, headers=headers
+        )
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(full_path, start, length),
+            status=206,
+            content_type=content_type,
+            headers=headers,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = str(length)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,197 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+COUNT_CACHE_PREFIX = "pagination:count:"
+
+
+def cached_count(queryset):
+    """
+    Total rows for ``queryset``, cached for PAGINATION_COUNT_TTL seconds so
+    walking a long listing page by page does not re-run COUNT(*) each time.
+    """
+    queryset = queryset.order_by()
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = COUNT_CACHE_PREFIX + hashlib.md5(sql.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, getattr(settings, "PAGINATION_COUNT_TTL", 60))
+    return count
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the queryset's own ordering
+    (``-id``, ``-created_at``, ``-rating`` ...) instead of OFFSET, so a
+    deep page costs the same as the first one.
+
+    The primary key is appended to the ordering as a tiebreaker and the
+    cursor carries a value for every ordering field, so rows that tie on
+    a non-unique field (every 5-star review) are still reached with a
+    seek rather than DRF's offset into the run of equal values.
+    """
+
+    ordering = "-id"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.queryset = queryset
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = self._seek(queryset, ordering, position)
+
+        # One extra row tells whether there is a page after this one
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None
+            self.next_position, self.previous_position = following, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by
+        if ordering and all(
+            isinstance(field, str) and "__" not in field for field in ordering
+        ):
+            self.ordering = tuple(ordering)
+        ordering = super().get_ordering(request, queryset, view)
+
+        pk = queryset.model._meta.pk.name
+        if not {field.lstrip("-") for field in ordering} & {pk, "pk"}:
+            ordering += (f"-{pk}" if ordering[0].startswith("-") else pk,)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if isinstance(instance, dict):
+                values.append(str(instance[name]))
+            else:
+                values.append(str(getattr(instance, name)))
+        return json.dumps(values)
+
+    def _seek(self, queryset, ordering, position):
+        """Rows after ``position`` in ``ordering``, compared field by field."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        seek = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            seek |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        try:
+            return queryset.filter(seek)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_count(self):
+        return cached_count(self.queryset)
+
+
+class CursorOptInMixin:
+    """
+    Keep page-number pagination by default and switch to keyset pagination
+    when the request carries ``?cursor=``. An empty cursor starts at the
+    first page; the ``next``/``previous`` links carry opaque cursors.
+    """
+
+    cursor_query_param = "cursor"
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = None
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.keyset = KeysetPagination()
+        self.keyset.cursor_query_param = self.cursor_query_param
+        self.keyset.page_size = self.get_page_size(request)
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_count(self):
+        if self.keyset is not None:
+            return self.keyset.get_count()
+        return self.page.paginator.count
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
+
+    def get_paginated_response(self, data):
+        if self.keyset is None:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "count": self.get_count(),
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+
+class CursorOnlyPagination(CursorOptInMixin, PageNumberPagination):
+    """For listings that return every row unless a cursor is requested."""
+
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
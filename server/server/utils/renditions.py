@@ -0,0 +1,254 @@
+import base64
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PROCESSING = "processing"
+READY = "ready"
+FAILED = "failed"
+STATUS_CHOICES = [
+    (PENDING, "Pending"),
+    (PROCESSING, "Processing"),
+    (READY, "Ready"),
+    (FAILED, "Failed"),
+]
+
+# Longest edge of each rendition, in pixels
+DEFAULT_RENDITIONS = {"thumbnail": 160, "card": 480, "detail": 1024, "zoom": 2048}
+RENDITION_FORMAT = "WEBP"
+RENDITION_QUALITY = 82
+# Blurred stand-in shown while the real image loads, inlined as a data URI
+PLACEHOLDER_EDGE = 16
+PLACEHOLDER_QUALITY = 40
+
+# Sent with ``instance_pk`` and ``field`` once renditions have been stored
+renditions_ready = Signal()
+
+
+def rendition_sizes():
+    return getattr(settings, "IMAGE_RENDITIONS", DEFAULT_RENDITIONS)
+
+
+def verify_image(file):
+    """Reject uploads Pillow can't read, without decoding the pixels."""
+    try:
+        position = file.tell()
+        Image.open(file).verify()
+        file.seek(position)
+    except Exception as e:
+        raise ValidationError(f"Error processing image: {e}")
+
+
+def _placeholder(image):
+    image = image.copy()
+    image.thumbnail((PLACEHOLDER_EDGE, PLACEHOLDER_EDGE))
+    image = image.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    image.save(buffer, RENDITION_FORMAT, quality=PLACEHOLDER_QUALITY)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return f"data:image/webp;base64,{encoded}"
+
+
+def render_renditions(name, sizes):
+    """
+    Write one WebP per entry of ``sizes`` next to the stored original
+    ``name``. Returns the original's ``width`` and ``height``, a blurred
+    ``placeholder`` data URI and ``sizes``, mapping each rendition to its
+    ``name``, ``width`` and ``height``. Runs in a pool process, so it only
+    takes and returns plain data.
+    """
+    with default_storage.open(name, "rb") as fh:
+        original = Image.open(fh)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ("RGB", "RGBA"):
+        has_alpha = original.mode in ("LA", "PA") or "transparency" in original.info
+        original = original.convert("RGBA" if has_alpha else "RGB")
+
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    renditions = {}
+    for rendition, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        image = original.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, RENDITION_FORMAT, quality=RENDITION_QUALITY, method=4)
+        content = buffer.getvalue()
+        # Named after the bytes, so the URL can be cached as immutable
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        path = os.path.join(
+            directory, "renditions", f"{stem}-{rendition}-{digest}.webp"
+        )
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        renditions[rendition] = {
+            "name": path,
+            "width": image.width,
+            "height": image.height,
+        }
+    return {
+        "width": original.width,
+        "height": original.height,
+        "placeholder": _placeholder(original),
+        "sizes": renditions,
+    }
+
+
+def delete_renditions(renditions):
+    for rendition in (renditions or {}).get("sizes", {}).values():
+        try:
+            default_storage.delete(rendition["name"])
+        except Exception:
+            pass
+
+
+def _absolute(url, request):
+    return request.build_absolute_uri(url) if request else url
+
+
+def rendition_url(name, renditions, rendition, request=None):
+    """URL of the ``rendition`` size once rendered, else of the original."""
+    if not name:
+        return None
+    size = (renditions or {}).get("sizes", {}).get(rendition)
+    return _absolute(default_storage.url(size["name"] if size else name), request)
+
+
+def rendition_set(renditions, request=None):
+    """
+    What a client needs for a responsive ``<img>``: ``widths`` maps each
+    rendered width to its URL, ``srcset`` is the same list as an HTML
+    attribute, plus the original ``width``/``height`` (to reserve layout
+    space) and the ``placeholder``. None until the renditions exist.
+    """
+    if not renditions or not renditions.get("sizes"):
+        return None
+    widths = {}
+    for size in sorted(renditions["sizes"].values(), key=lambda size: size["width"]):
+        url = default_storage.url(size["name"])
+        widths[str(size["width"])] = _absolute(url, request)
+    return {
+        "widths": widths,
+        "srcset": ", ".join(f"{url} {width}w" for width, url in widths.items()),
+        "width": renditions["width"],
+        "height": renditions["height"],
+        "placeholder": renditions["placeholder"],
+    }
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+class RenditionPool:
+    """
+    Process pool that renders image renditions off the request thread.
+
+    ``submit`` marks the row as processing and hands the stored original
+    to a worker process; the result is written back with a conditional
+    UPDATE (so a newer upload is never overwritten) and announced through
+    ``renditions_ready``. IMAGE_WORKERS sets the pool size; 0 renders in
+    the calling thread instead, which suits development and tests.
+    Rows left pending or processing by a crash are picked up again by
+    ``manage.py process_images``.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def _workers(self):
+        return getattr(settings, "IMAGE_WORKERS", min(os.cpu_count() or 1, 4))
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # Spawned children don't inherit the parent's DB sockets
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self._workers(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self.executor
+
+    def submit(self, model, pk, field):
+        name = (
+            model._default_manager.filter(pk=pk).values_list(field, flat=True).first()
+        )
+        if not name:
+            return None
+        _set_status(model, pk, field, name, PROCESSING)
+        sizes = rendition_sizes()
+        if not self._workers():
+            try:
+                _store(model, pk, field, name, render_renditions(name, sizes))
+            except Exception:
+                logger.exception("Rendering %s failed", name)
+                _set_status(model, pk, field, name, FAILED)
+            return None
+        future = self._get_executor().submit(render_renditions, name, sizes)
+        future.add_done_callback(
+            lambda done: self._finished(done, model, pk, field, name)
+        )
+        return future
+
+    def _finished(self, future, model, pk, field, name):
+        # Runs on the pool's result thread, which has its own connections
+        try:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                self._discard()
+            if error is not None:
+                logger.error("Rendering %s failed: %s", name, error)
+                _set_status(model, pk, field, name, FAILED)
+            else:
+                _store(model, pk, field, name, future.result())
+        except Exception:
+            logger.exception("Storing renditions of %s failed", name)
+        finally:
+            connections.close_all()
+
+    def _discard(self):
+        # A worker died; start a fresh pool on the next submit
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+
+
+def _set_status(model, pk, field, name, status, **extra):
+    model._default_manager.filter(pk=pk, **{field: name}).update(
+        **{f"{field}_status": status}, **extra
+    )
+
+
+def _store(model, pk, field, name, renditions):
+    _set_status(model, pk, field, name, READY, **{f"{field}_renditions": renditions})
+    renditions_ready.send(sender=model, instance_pk=pk, field=field)
+
+
+pool = RenditionPool()
+
+
+def queue_renditions(instance, field):
+    """Render ``instance.<field>`` once the current transaction commits."""
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: pool.submit(model, pk, field))
@@ -0,0 +1,54 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .cache import invalidate_tags, tag_versions
+
+
+class TableSnapshot:
+    """
+    Per-worker in-memory copy of a small, read-mostly table, indexed by the
+    given fields for dictionary lookups.
+
+    The snapshot is versioned through a cache tag. Saving or deleting a row
+    bumps the tag once the transaction commits, and every worker reloads
+    the whole table the next time it reads a newer version. Instances are
+    shared between requests, so treat them as read-only and go to the
+    database for anything that writes.
+    """
+
+    def __init__(self, model, keys=("pk",)):
+        self.model = model
+        self.keys = keys
+        self.tag = f"snapshot:{model._meta.label_lower}"
+        self.version = None
+        self.indexes = None
+        self.lock = threading.Lock()
+        post_save.connect(self._changed, sender=model, weak=False)
+        post_delete.connect(self._changed, sender=model, weak=False)
+
+    def _changed(self, sender, instance, **kwargs):
+        transaction.on_commit(self.invalidate)
+
+    def invalidate(self):
+        invalidate_tags(self.tag)
+
+    def _load(self):
+        version = tag_versions([self.tag])[self.tag]
+        if self.indexes is not None and version == self.version:
+            return self.indexes
+        with self.lock:
+            if self.indexes is None or version != self.version:
+                rows = list(self.model._default_manager.all())
+                self.indexes = {
+                    key: {getattr(row, key): row for row in rows} for key in self.keys
+                }
+                self.version = version
+        return self.indexes
+
+    def get(self, value, key="pk"):
+        return self._load()[key].get(value)
+
+    def all(self):
+        return list(self._load()[self.keys[0]].values())